@@ -0,0 +1,76 @@
+# Load test for the HTTP endpoints, through the Flask test client.
+# By default this runs against mongomock (an in-memory Mongo stand-in), so it measures our
+# own request handling rather than the database. Point MONGODB_HOST at a real server to include it.
+# Usage: python -m benchmarks.bench_http [--games N] [--output results.json]
+import argparse
+import os
+import random
+import time
+
+from benchmarks.common import summarize, write_results
+
+
+def timed(samples, fn, *args, **kwargs):
+    start = time.perf_counter()
+    res = fn(*args, **kwargs)
+    samples.append(time.perf_counter() - start)
+    return res
+
+
+def run(client, num_games, num_cols, num_rows, seed=0):
+    rng = random.Random(seed)
+    samples = { 'create': [], 'move': [], 'list': [], 'detail': [], 'moves_list': [], 'move_detail': [] }
+    params = { 'games': num_games, 'columns': num_cols, 'rows': num_rows }
+
+    game_ids = []
+    for i in range(num_games):
+        res = timed(samples['create'], client.post, '/drop-token', json={
+            'players': [f'p{i}a', f'p{i}b'], 'columns': num_cols, 'rows': num_rows,
+        })
+        assert res.status_code == 200, res.json
+        game_ids.append(res.json['gameId'])
+
+    # play every game to the end, interleaving games like concurrent players would
+    live = { gid: (f'p{i}a', f'p{i}b') for i, gid in enumerate(game_ids) }
+    turn = { gid: 0 for gid in game_ids }
+    heights = { gid: [0] * num_cols for gid in game_ids }
+    while live:
+        for gid in list(live):
+            col = rng.choice([c for c in range(num_cols) if heights[gid][c] < num_rows])
+            player = live[gid][turn[gid] % 2]
+            res = timed(samples['move'], client.post, f'/drop-token/{gid}/{player}', json={'column': col + 1})
+            assert res.status_code == 200, res.json
+            heights[gid][col] += 1
+            turn[gid] += 1
+            if client.get(f'/drop-token/{gid}').json['state'] == 'DONE':
+                del live[gid]
+
+    for gid in game_ids:
+        timed(samples['detail'], client.get, f'/drop-token/{gid}')
+        timed(samples['moves_list'], client.get, f'/drop-token/{gid}/moves')
+        timed(samples['move_detail'], client.get, f'/drop-token/{gid}/moves/0')
+        timed(samples['list'], client.get, '/drop-token')
+
+    return [summarize(name, s, **params) for name, s in samples.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=50, help='number of games to create and play')
+    parser.add_argument('--columns', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    from droptoken.app import create_app
+
+    config = {}
+    if 'MONGODB_HOST' not in os.environ:
+        import mongomock
+        config['MONGODB_SETTINGS'] = { 'db': 'droptokendb', 'mongo_client_class': mongomock.MongoClient }
+    results = run(create_app(config).test_client(), args.games, args.columns, args.rows)
+    write_results('http', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# Microbenchmarks for the board engines in droptoken.logic.
+# Usage: python -m benchmarks.bench_logic [--repeat N] [--output results.json]
+import argparse
+import random
+
+from droptoken.logic import ENGINES
+
+from benchmarks.common import summarize, time_calls, write_results
+
+BOARD_SIZES = [(4, 4), (7, 6), (15, 15), (50, 50)]
+
+
+def random_game(num_cols, num_rows, seed=0):
+    """
+        A random sequence of legal moves that fills the board, for two tokens.
+        Win checks are ignored, so the board always gets filled.
+    """
+    rng = random.Random(seed)
+    heights = [0] * num_cols
+    moves = []
+    for i in range(num_cols * num_rows):
+        col = rng.choice([c for c in range(num_cols) if heights[c] < num_rows])
+        heights[col] += 1
+        moves.append({'token': i % 2 + 1, 'column': col + 1})
+    return moves
+
+
+def bench_engine(name, engine, num_cols, num_rows, repeat):
+    params = { 'engine': name, 'columns': num_cols, 'rows': num_rows }
+    moves = random_game(num_cols, num_rows)
+    results = []
+
+    # drop_token: fill a fresh board
+    def fill():
+        board = engine(num_cols, num_rows)
+        for m in moves:
+            board.drop_token(m['column'], m['token'])
+    samples = time_calls(fill, repeat)
+    results.append(summarize('drop_token', [s / len(moves) for s in samples], **params))
+
+    # check_win: every cell of a full board
+    full = engine(num_cols, num_rows)
+    full.apply_moves(moves)
+    cells = [(c, r) for c in range(1, num_cols + 1) for r in range(1, num_rows + 1)]
+    def check_all():
+        for c, r in cells:
+            full.check_win(c, r)
+    samples = time_calls(check_all, repeat)
+    results.append(summarize('check_win', [s / len(cells) for s in samples], **params))
+
+    # apply_moves: replay a whole game
+    results.append(summarize(
+        'apply_moves',
+        time_calls(lambda: engine(num_cols, num_rows).apply_moves(moves), repeat),
+        moves=len(moves), **params))
+
+    # one move the way Moves.post plays it: load snapshot, drop, check win, store snapshot
+    half = moves[:len(moves) // 2]
+    snapshot = engine(num_cols, num_rows)
+    snapshot.apply_moves(half)
+    cells, heights = snapshot.snapshot()
+    next_move = moves[len(half)]
+    def move_cycle():
+        board = engine.from_snapshot(num_cols, num_rows, cells, heights)
+        row = board.drop_token(next_move['column'], next_move['token'])
+        board.check_win(next_move['column'], row)
+        board.snapshot()
+    results.append(summarize('move_cycle_snapshot', time_calls(move_cycle, repeat), **params))
+
+    # same, replaying the history instead (the pre-snapshot way)
+    def replay_cycle():
+        board = engine(num_cols, num_rows)
+        board.apply_moves(half)
+        row = board.drop_token(next_move['column'], next_move['token'])
+        board.check_win(next_move['column'], row)
+    results.append(summarize('move_cycle_replay', time_calls(replay_cycle, repeat), moves=len(half), **params))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200, help='samples per case')
+    parser.add_argument('--engine', action='append', choices=list(ENGINES), help='engines to run (default: all)')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.engine or list(ENGINES):
+        for num_cols, num_rows in BOARD_SIZES:
+            # big boards are slow to fill, scale the sample count down with the board
+            repeat = max(5, args.repeat * 42 // (num_cols * num_rows))
+            results.extend(bench_engine(name, ENGINES[name], num_cols, num_rows, repeat))
+    write_results('logic', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
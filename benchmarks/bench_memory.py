@@ -0,0 +1,89 @@
+# Memory held by live boards (what the memory/log stores and the board cache keep around),
+# for each board engine: 10k half-played games kept alive at once, measured with tracemalloc.
+# Also the memory allocated to replay a game's history, feeding moves as a dict per move
+# (apply_moves) or as a column sequence (apply_columns).
+# Usage: python -m benchmarks.bench_memory [--games N] [--columns 7] [--rows 6] [--output results.json]
+import argparse
+import gc
+import random
+import tracemalloc
+
+from droptoken.logic import ENGINES
+
+from benchmarks.common import write_results
+
+
+def half_played(num_cols, num_rows, seed):
+    """
+        Columns for a random game that fills half the board (win checks are ignored).
+    """
+    rng = random.Random(seed)
+    heights = [0] * num_cols
+    columns = bytearray()
+    for _ in range(num_cols * num_rows // 2):
+        col = rng.choice([c for c in range(num_cols) if heights[c] < num_rows])
+        heights[col] += 1
+        columns.append(col + 1)
+    return bytes(columns)
+
+
+def traced(fn):
+    """
+        Return: (result of fn(), bytes still allocated after it, peak bytes allocated during it)
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current - before, peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=10000, help='live boards per engine')
+    parser.add_argument('--columns', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    nc, nr = args.columns, args.rows
+    games = [ half_played(nc, nr, seed) for seed in range(args.games) ]
+    results = []
+    for name, engine in ENGINES.items():
+        params = { 'engine': name, 'games': args.games, 'columns': nc, 'rows': nr }
+
+        def build():
+            boards = []
+            for columns in games:
+                board = engine(nc, nr)
+                board.apply_columns(columns)
+                boards.append(board)
+            return boards
+        boards, held, _ = traced(build)
+        results.append({ 'name': 'live_boards', 'params': params,
+            'total_bytes': held, 'bytes_per_board': held / args.games })
+        del boards
+
+        # the history feed, on one board (only the allocations of the feed itself show up)
+        def replay_dicts():
+            for columns in games:
+                board = engine(nc, nr)
+                board.apply_moves([ { 'token': i % 2 + 1, 'column': c } for i, c in enumerate(columns) ])
+        def replay_columns():
+            for columns in games:
+                board = engine(nc, nr)
+                board.apply_columns(columns)
+        for feed, replay in (('dicts', replay_dicts), ('columns', replay_columns)):
+            _, _, peak = traced(replay)
+            results.append({ 'name': 'replay_peak', 'params': dict(params, feed=feed), 'peak_bytes': peak })
+
+    write_results('memory', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
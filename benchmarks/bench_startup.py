@@ -0,0 +1,80 @@
+# Cold start of a worker: importing droptoken.app, create_app(), and the first request served,
+# each timed in a fresh interpreter (STORAGE=memory, so no database is involved).
+# Also reports an import-time profile (python -X importtime) of a cold start: the modules
+# that take longest to import, and whether droptoken.logic still imports without Flask or
+# the db driver.
+# Usage: python -m benchmarks.bench_startup [--runs N] [--top N] [--output results.json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import summarize, write_results
+
+COLD_START = '''
+import json, time
+start = time.perf_counter()
+from droptoken.app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+res = app.test_client().get('/drop-token')
+assert res.status_code == 200, res.json
+served = time.perf_counter()
+print(json.dumps({ 'import': imported - start, 'create_app': created - imported,
+    'first_request': served - created, 'total': served - start }))
+'''
+
+LEAN_IMPORT = '''
+import json, sys
+import droptoken.logic
+heavy = ('flask', 'flask_restful', 'werkzeug', 'mongoengine', 'pymongo', 'bson', 'numpy')
+print(json.dumps(sorted({ m.split('.')[0] for m in sys.modules } & set(heavy))))
+'''
+
+
+def run_python(code, *flags):
+    env = dict(os.environ, STORAGE='memory', METRICS_ENABLED='0')
+    return subprocess.run([sys.executable, *flags, '-c', code], env=env, check=True,
+        capture_output=True, text=True)
+
+
+def import_profile(top):
+    """
+        Return: the `top` modules with the highest cumulative import time during a cold start,
+                as [{ "module", "self_us", "cumulative_us" }]
+    """
+    stderr = run_python(COLD_START, '-X', 'importtime').stderr
+    rows = []
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append({ 'module': module.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us) })
+    rows.sort(key=lambda r: r['cumulative_us'], reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to time')
+    parser.add_argument('--top', type=int, default=25, help='modules to list in the import profile')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    samples = { 'import': [], 'create_app': [], 'first_request': [], 'total': [] }
+    for _ in range(args.runs):
+        times = json.loads(run_python(COLD_START).stdout)
+        for name, seconds in times.items():
+            samples[name].append(seconds)
+
+    results = [ summarize(f'cold_start_{name}', s, runs=args.runs) for name, s in samples.items() ]
+    results.append({ 'name': 'import_profile', 'modules': import_profile(args.top) })
+    results.append({ 'name': 'logic_heavy_imports', 'modules': json.loads(run_python(LEAN_IMPORT).stdout) })
+    write_results('startup', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Request argument parsing: the schemas in droptoken/validation.py next to the reqparse
+# parsers they replaced, on the same requests (valid and rejected), inside a Flask request context.
+# Usage: python -m benchmarks.bench_validation [--repeat N] [--output results.json]
+import argparse
+
+from flask import Flask
+from flask_restful import reqparse
+from werkzeug.exceptions import HTTPException
+
+from droptoken.resources.game import list_get_schema, post_schema
+from droptoken.resources.moves import move_list_get_schema, moves_post_schema
+
+from benchmarks.common import summarize, time_calls, write_results
+
+# (case, schema, request context arguments)
+CASES = [
+    ('post_game', post_schema, { 'json': { 'players': ['player1', 'player2'], 'columns': 7, 'rows': 6 } }),
+    ('post_game_rejected', post_schema, { 'json': { 'players': ['player1', 'player2'], 'columns': 'x', 'rows': 6 } }),
+    ('post_move', moves_post_schema, { 'json': { 'column': 3 } }),
+    ('post_move_missing', moves_post_schema, { 'json': {} }),
+    ('list_games', list_get_schema, { 'query_string': 'limit=50&state=DONE' }),
+    ('list_moves', move_list_get_schema, { 'query_string': 'start=1&until=10' }),
+]
+
+
+def request_parser(schema):
+    # the reqparse parser the schema replaced
+    parser = reqparse.RequestParser()
+    for f in schema.fields:
+        parser.add_argument(
+            f.name, type=f.type, required=f.required, default=f.default, choices=f.choices,
+            action='append' if f.many else 'store', location=schema.location, help=f.help,
+        )
+    return parser
+
+
+def parse(fn):
+    try:
+        fn()
+    except HTTPException:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10000, help='parses per case')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    results = []
+    for case, schema, request in CASES:
+        old = request_parser(schema)
+        with app.test_request_context('/', **request):
+            results.append(summarize('reqparse', time_calls(lambda: parse(old.parse_args), args.repeat), case=case))
+            results.append(summarize('schema', time_calls(lambda: parse(schema.parse_request), args.repeat), case=case))
+    write_results('validation', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
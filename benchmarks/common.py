@@ -0,0 +1,73 @@
+# Shared helpers for the benchmark scripts: timing, summary stats and JSON output.
+# Every script prints a list of results, one JSON object per measured case, so runs
+# from different commits can be diffed or compared with a script.
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+
+def time_calls(fn, repeat):
+    """
+        Call fn() `repeat` times.
+        Return: list of per-call durations, in seconds
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(sorted_samples, p):
+    # nearest-rank percentile, samples must be sorted
+    if not sorted_samples:
+        return None
+    k = max(0, min(len(sorted_samples) - 1, int(round(p / 100 * len(sorted_samples))) - 1))
+    return sorted_samples[k]
+
+
+def summarize(name, samples, **params):
+    """
+        Summary of a list of durations (seconds), as a JSON-friendly dict. Times are in microseconds.
+    """
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'name': name,
+        'params': params,
+        'count': len(ordered),
+        'ops_per_sec': len(ordered) / total if total else None,
+        'mean_us': total / len(ordered) * 1e6 if ordered else None,
+        'p50_us': percentile(ordered, 50) * 1e6 if ordered else None,
+        'p99_us': percentile(ordered, 99) * 1e6 if ordered else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(suite, results, output=None):
+    """
+        Dump results as JSON, to a file or stdout.
+    """
+    report = {
+        'suite': suite,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,151 @@
+# Deeper move analysis on several CPU cores. A Python search is bound to one core by the GIL,
+# so the work is spread over a pool of processes:
+#   * ParallelSolver splits one position at the root: every move is searched in a different
+#     process, the root picks the best of them exactly like Search.root would.
+#   * analyze_games searches many stored games at once, one game per process.
+# Each process keeps its own transposition table (droptoken.solver.solver) between tasks.
+# Since a search result only depends on the position (see Search.root/negamax), both give the
+# same best move and score as a serial search to the same depth.
+import os
+from time import monotonic
+
+from droptoken.logic import GameBoard
+from droptoken.solver import WIN_BOUND, WIN_SCORE, Result, layout, solver
+
+
+def process_pool(processes=None):
+    """
+        Return: a ProcessPoolExecutor with `processes` workers (default: one per CPU)
+    """
+    # imported here, the web app only needs multiprocessing once somebody asks for a deep hint
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+    # spawn, not fork: the web app has threads (and db connections) that must not be copied
+    return ProcessPoolExecutor(processes or os.cpu_count(), mp_context=get_context('spawn'))
+
+
+def search_child(task):
+    """
+        Pool task: score of the position after one root move, for the player who made it.
+        Input: (num_cols, num_rows, cells, heights, token to move, depth, deadline)
+            deadline: time.monotonic() to stop at, or None for no limit. Tasks can wait in the
+            pool's queue, so the time left is only worked out once the task starts.
+        Return: (score or None if the deadline passed, nodes)
+    """
+    num_cols, num_rows, cells, heights, token, depth, deadline = task
+    time_limit = None
+    if deadline is not None:
+        # monotonic() is system-wide (CLOCK_MONOTONIC), so the parent's deadline holds here
+        time_limit = deadline - monotonic()
+        if time_limit <= 0:
+            return None, 0
+    board = GameBoard.from_snapshot(num_cols, num_rows, cells, heights)
+    score, nodes = solver.value(board, token, depth, ply=1, time_limit=time_limit)
+    return (None if score is None else -score), nodes
+
+
+def solve_game(task):
+    """
+        Pool task: Solver.solve() a stored position to a fixed depth.
+        Input: (game_id, num_cols, num_rows, cells, heights, token to move, depth)
+        Return: (game_id, Result)
+    """
+    game_id, num_cols, num_rows, cells, heights, token, depth = task
+    board = GameBoard.from_snapshot(num_cols, num_rows, cells, heights)
+    return game_id, solver.solve(board, token, time_limit=0, max_depth=depth)
+
+
+class ParallelSolver(object):
+    """
+        Root-split search over a process pool. The pool is started on first use.
+    """
+
+    def __init__(self, processes=None, time_limit=2.0):
+        self.processes = processes or os.cpu_count()
+        self.time_limit = time_limit
+        self._pool = None
+
+    def pool(self):
+        if self._pool is None:
+            self._pool = process_pool(self.processes)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def solve(self, board, token, time_limit=None, max_depth=None):
+        """
+            Same as Solver.solve(), with every root move searched in parallel.
+            An iteration that doesn't finish within time_limit (seconds, 0 for no limit) is thrown
+            away, like in Search.run.
+        """
+        time_limit = self.time_limit if time_limit is None else time_limit
+        deadline = monotonic() + time_limit if time_limit else None
+        L = layout(board.num_cols, board.num_rows)
+
+        moves = [ c for c in L.order if board.can_drop(c + 1) ]
+        if not moves:
+            return Result(None, 0, 0, 0)
+
+        children = {}
+        for c in moves:
+            child = board.copy()
+            row = child.drop_token(c + 1, token)
+            if child.check_win(c + 1, row):
+                # the first winning move in search order, like Search.root at depth 1
+                return Result(c + 1, WIN_SCORE - 1, 1, 0)
+            children[c] = child.snapshot()
+
+        empty = board.num_cols * board.num_rows - sum(board.snapshot()[1])
+        limit = empty if max_depth is None else min(max_depth, empty)
+        best = Result(moves[0] + 1, 0, 0, 0)
+        column, nodes = None, 0
+        for depth in range(1, limit + 1):
+            if deadline is not None and monotonic() >= deadline:
+                break
+
+            order = moves if column is None else [column] + [ c for c in moves if c != column ]
+            tasks = [
+                (board.num_cols, board.num_rows) + children[c] + (3 - token, depth - 1, deadline)
+                for c in order
+            ]
+            results = list(self.pool().map(search_child, tasks))
+            nodes += sum(n for _, n in results)
+            if any(score is None for score, _ in results):
+                break
+
+            best_score = -WIN_SCORE - 1
+            for c, (score, _) in zip(order, results):
+                if score > best_score:
+                    best_score, column = score, c
+            best = Result(column + 1, best_score, depth, nodes)
+            if abs(best_score) > WIN_BOUND:
+                break
+        return best._replace(nodes=nodes)
+
+
+# shared by the whole process, for deep hints
+parallel_solver = ParallelSolver()
+
+
+def analyze_games(depth, processes=None, batch_size=1000):
+    """
+        Search the position of every stored IN_PROGRESS game, to a fixed depth, one game per process.
+        Yield: (game_id, Result) for every game, as they finish
+    """
+    from droptoken.boards import load_board
+    from droptoken.models.game import GameModel
+
+    query = GameModel.objects(state='IN_PROGRESS').batch_size(batch_size)
+    with process_pool(processes) as pool:
+        # a batch at a time, so we never hold every game in memory
+        batch = []
+        for game in query:
+            cells, heights = load_board(game).snapshot()
+            batch.append((game.id, game.num_cols, game.num_rows, cells, heights, game.current_token, depth))
+            if len(batch) >= batch_size:
+                yield from pool.map(solve_game, batch, chunksize=8)
+                batch = []
+        yield from pool.map(solve_game, batch, chunksize=8)
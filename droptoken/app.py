@@ -1,17 +1,108 @@
-from flask import Flask
-from flask_mongoengine import MongoEngine
-from flask_restful import Api
-from droptoken.resources.game import GameList, GameDetail
-from droptoken.resources.moves import Moves, MoveDetail
+# App factory. `create_app()` builds a configured Flask app; settings come from the environment
+# (see below) and can be overridden with the `config` argument.
+# Importing this module is cheap: Flask, the resources and the db driver are only imported by
+# create_app(), and the database client is only created by the first query (see connect_db).
+# `app` is still here for `flask run` (FLASK_APP=app.py) and older imports; it's built on first use.
+import os
+from time import perf_counter
 
 
-app = Flask(__name__)
-# this mongodb is running locally in a docker container
-app.config['MONGODB_SETTINGS'] = {
-    "db": "droptokendb",
-}
-db = MongoEngine(app)
-api = Api(app) # TODO: use prefix='drop-token' to clean up the routes below
+def load_config(app):
+    # this mongodb is running locally in a docker container
+    app.config['MONGODB_SETTINGS'] = {
+        "db": "droptokendb",
+        # for an in-memory stand-in (tests, benchmarks), pass "mongo_client_class": mongomock.MongoClient
+        # in create_app(config={'MONGODB_SETTINGS': ...}) instead
+        "host": os.environ.get('MONGODB_HOST', 'localhost'),
+    }
+    # max number of live games kept in the in-process board cache (see boards.BoardCache)
+    app.config['BOARD_CACHE_SIZE'] = 1024
+    # request timing histograms on /metrics. Set METRICS_ENABLED=0 to switch off (timers become no-ops)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'
+    # where GameStream hears about moves: 'local' (in-process, only sees this worker's writes) or
+    # 'changestream' (MongoDB change stream, needs a replica set; use it with several workers)
+    app.config['EVENTS_BACKEND'] = os.environ.get('EVENTS_BACKEND', 'local')
+    # where games are stored (see droptoken/storage): 'mongo', 'memory' (this process only, lost on restart)
+    # or 'log' (the append-only file STORAGE_PATH, memory-mapped and read on demand)
+    # or 'writebehind' (in memory and journaled to STORAGE_PATH, written to MongoDB every STORAGE_FLUSH_INTERVAL seconds)
+    app.config['STORAGE'] = os.environ.get('STORAGE', 'mongo')
+    app.config['STORAGE_PATH'] = os.environ.get('STORAGE_PATH', 'droptoken.log')
+    app.config['STORAGE_FLUSH_INTERVAL'] = float(os.environ.get('STORAGE_FLUSH_INTERVAL', '1'))
+    # for 'log' and 'writebehind', STORAGE_FSYNC=1 syncs STORAGE_PATH to disk before a write is acknowledged.
+    # Off by default: acknowledged writes survive the process crashing, but not the machine
+    # (power loss, kernel panic), which can lose the moves of the last few seconds
+    app.config['STORAGE_FSYNC'] = os.environ.get('STORAGE_FSYNC', '0') != '0'
+    # move search for hints and AI players: default seconds per search, and transposition table entries
+    app.config['SOLVER_TIME_LIMIT'] = float(os.environ.get('SOLVER_TIME_LIMIT', '0.5'))
+    app.config['SOLVER_TABLE_SIZE'] = 2**18
+    # deep hints (?deep=true) search on SOLVER_PROCESSES processes (default: one per CPU) for this long
+    app.config['SOLVER_DEEP_TIME_LIMIT'] = float(os.environ.get('SOLVER_DEEP_TIME_LIMIT', '2'))
+    app.config['SOLVER_PROCESSES'] = int(os.environ.get('SOLVER_PROCESSES', '0')) or None
+    # opening book file (see `flask build-book`), searched before any hint or AI move
+    app.config['OPENING_BOOK'] = os.environ.get('OPENING_BOOK')
+    # `flask archive-games` moves DONE games untouched for ARCHIVE_RETENTION_DAYS out of the game
+    # collection, ARCHIVE_BATCH_SIZE games per write (see droptoken/archive.py)
+    app.config['ARCHIVE_RETENTION_DAYS'] = float(os.environ.get('ARCHIVE_RETENTION_DAYS', '7'))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+
+
+def connect_db(settings):
+    """
+        Register the MongoDB connection for mongoengine. No client is created (and nothing is
+        sent over the network) until the first query, so workers that fork after create_app()
+        don't inherit a live client.
+    """
+    from mongoengine import register_connection
+    from mongoengine.connection import DEFAULT_CONNECTION_NAME
+    register_connection(DEFAULT_CONNECTION_NAME, **settings)
+
+
+def create_app(config=None):
+    """
+        Input: config - dict of settings, applied over the ones from the environment
+        Return: a new Flask app serving the API
+    """
+    from flask import Flask
+    from flask_restful import Api
+    from droptoken.boards import board_cache
+    from droptoken.book import book
+    from droptoken.commands import register_commands
+    from droptoken.metrics import metrics
+    from droptoken.solver import solver
+    from droptoken.analysis import parallel_solver
+    from droptoken.storage import make_store, set_store
+
+    app = Flask(__name__)
+    load_config(app)
+    app.config.update(config or {})
+
+    if app.config['STORAGE'] in ('mongo', 'writebehind'):
+        connect_db(app.config['MONGODB_SETTINGS'])
+    set_store(make_store(app.config['STORAGE'], app.config['STORAGE_PATH'], app.config['STORAGE_FLUSH_INTERVAL'],
+        app.config['STORAGE_FSYNC']))
+    metrics.enabled = app.config['METRICS_ENABLED']
+    board_cache.resize(app.config['BOARD_CACHE_SIZE'])
+    solver.time_limit = app.config['SOLVER_TIME_LIMIT']
+    solver.resize(app.config['SOLVER_TABLE_SIZE'])
+    parallel_solver.time_limit = app.config['SOLVER_DEEP_TIME_LIMIT']
+    if app.config['SOLVER_PROCESSES']:
+        parallel_solver.processes = app.config['SOLVER_PROCESSES']
+    if app.config['OPENING_BOOK']:
+        book.open(app.config['OPENING_BOOK'])
+
+    api = Api(app) # TODO: use prefix='drop-token' to clean up the routes below
+    register_resources(api)
+    register_monitoring(app)
+    register_commands(app)
+
+    if app.config['EVENTS_BACKEND'] == 'changestream' and app.config['STORAGE'] == 'mongo':
+        from droptoken.events import start_change_stream
+        from droptoken.models.game import GameModel
+        start_change_stream(GameModel._get_collection())
+
+    # api.init_app(app) # TODO: flask is working without this??
+    return app
+
 
 # NOTE: This snippet is useful for debugging routing issues
 ### Begin Diagnosing routing issues
@@ -28,25 +119,82 @@ api = Api(app) # TODO: use prefix='drop-token' to clean up the routes below
 ### End Diagnosing routing issues
 
 
-# NOTE: Repeat routes with and without '/' at the end for resources handling POST.
-# This is just in case: Flask should redirect automatically, however, 
-# Flask Debug-mode informed me that forwarding may lose the payload in some cases.
-# I am choosing to heed that warning.
-api.add_resource(GameList, '/drop-token', '/drop-token/')
-api.add_resource(GameDetail, '/drop-token/<string:game_id>')
-api.add_resource(Moves, '/drop-token/<string:game_id>/<string:player_id>', 
-    '/drop-token/<string:game_id>/<string:player_id>/')
-api.add_resource(MoveDetail, '/drop-token/<string:game_id>/moves/<int:move_id>')
+def register_resources(api):
+    from droptoken.resources.game import GameList, GameDetail, GameBulk
+    from droptoken.resources.moves import Moves, MoveDetail, MovesBatch
+    from droptoken.resources.stream import GameStream
+    from droptoken.resources.hint import GameHint
+    from droptoken.resources.export import GameExport, GameImport
+
+    # NOTE: Repeat routes with and without '/' at the end for resources handling POST.
+    # This is just in case: Flask should redirect automatically, however, 
+    # Flask Debug-mode informed me that forwarding may lose the payload in some cases.
+    # I am choosing to heed that warning.
+    api.add_resource(GameList, '/drop-token', '/drop-token/')
+    api.add_resource(GameBulk, '/drop-token/bulk')
+    api.add_resource(GameExport, '/drop-token/export')
+    api.add_resource(GameImport, '/drop-token/import')
+    api.add_resource(GameDetail, '/drop-token/<string:game_id>')
+    api.add_resource(Moves, '/drop-token/<string:game_id>/<string:player_id>', 
+        '/drop-token/<string:game_id>/<string:player_id>/')
+    api.add_resource(MoveDetail, '/drop-token/<string:game_id>/moves/<int:move_id>')
+    api.add_resource(GameStream, '/drop-token/<string:game_id>/stream')
+    api.add_resource(GameHint, '/drop-token/<string:game_id>/hint')
+    api.add_resource(MovesBatch, '/drop-token/<string:game_id>/moves/batch', 
+        '/drop-token/<string:game_id>/moves/batch/')
+
+    # TODO: this route '/drop_token/<string:game_id>/moves' is currently in conflict with 
+    #   '/drop-token/<string:game_id>/<string:player_id>', because player_id a string 
+    #   and Flask cannot distinguish between is and 'moves' string literal.
+    #   I am merging the two, for now. However, there is a way to make regex matching happen: 
+    #   see https://gist.github.com/ekayxu/5743138 
+    # api.add_resource(MovesList, '/drop_token/<string:game_id>/moves')
+
+
+def register_monitoring(app):
+    from flask import Response, g, request
+    from droptoken.boards import board_cache
+    from droptoken.metrics import metrics
+
+    # Hit/miss/eviction counters for the board cache, to help size BOARD_CACHE_SIZE.
+    @app.route('/cache-stats')
+    def cache_stats():
+        return board_cache.stats()
+
+    # Per-endpoint request timing, in Prometheus text format.
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = perf_counter()
+
+    @app.after_request
+    def stop_request_timer(response):
+        if 'request_start' in g and request.endpoint:
+            metrics.observe(request.endpoint, 'total', perf_counter() - g.request_start)
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        cache = board_cache.stats()
+        counters = [
+            ('droptoken_board_cache_hits_total', 'Board cache lookups that were served from the cache.', cache['hits']),
+            ('droptoken_board_cache_misses_total', 'Board cache lookups that had to load the game.', cache['misses']),
+            ('droptoken_board_cache_evictions_total', 'Games evicted from the board cache to make room.', cache['evictions']),
+            ('droptoken_board_cache_size', 'Games currently in the board cache.', cache['size']),
+        ]
+        return Response(metrics.render(counters), mimetype='text/plain; version=0.0.4')
 
-# TODO: this route '/drop_token/<string:game_id>/moves' is currently in conflict with 
-#   '/drop-token/<string:game_id>/<string:player_id>', because player_id a string 
-#   and Flask cannot distinguish between is and 'moves' string literal.
-#   I am merging the two, for now. However, there is a way to make regex matching happen: 
-#   see https://gist.github.com/ekayxu/5743138 
-# api.add_resource(MovesList, '/drop_token/<string:game_id>/moves')
 
+def __getattr__(name):
+    # `app`, built on first access
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# api.init_app(app) # TODO: flask is working without this??
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
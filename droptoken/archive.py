@@ -0,0 +1,120 @@
+# Archive of finished games: DONE games are moved out of the game collection, once they haven't
+# changed for a while, into a separate collection with one small document per game.
+# That keeps the game collection (and its indexes) down to the games still being played.
+#
+# An archived game is its game document without the board snapshot (it's rebuilt from the
+# moves when needed, see boards.load_board), BSON-encoded and zlib-compressed:
+#   { _id, archived_at, data }
+# Moves are already packed one byte each (see droptoken/packing.py), so `data` is mostly the
+# players and the game's fields.
+#
+# The stores fall back to the archive when a game isn't in the game collection, so GameDetail
+# and the moves endpoints keep answering for archived ids. GameList only lists games that are
+# still in the game collection.
+import zlib
+from datetime import datetime
+
+import bson
+from bson import Binary, ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
+
+from droptoken.models.game import GameModel
+
+ARCHIVE_COLLECTION = 'game_model_archive'
+# MongoDB's error code for a duplicate _id
+DUPLICATE_KEY = 11000
+
+
+def pack_game(doc):
+    """
+        Input: a raw game document (as stored in the game collection)
+        Return: its archive document
+    """
+    doc = { k: v for k, v in doc.items() if k not in ('board_cells', 'heights') }
+    return {
+        '_id': doc['_id'],
+        'archived_at': datetime.utcnow(),
+        'data': Binary(zlib.compress(bson.encode(doc))),
+    }
+
+
+def unpack_game(archived):
+    """
+        Input: an archive document, as written by pack_game()
+        Return: the GameModel, without a board snapshot
+    """
+    return GameModel._from_son(bson.decode(zlib.decompress(archived['data'])))
+
+
+class GameArchive(object):
+    """
+        Moves DONE games from the game collection to the archive collection, and reads them back.
+        `games` defaults to GameModel's collection, `archive` to ARCHIVE_COLLECTION in the same database.
+    """
+
+    def __init__(self, games=None, archive=None):
+        self._games = games
+        self._archive = archive
+
+    @property
+    def games(self):
+        if self._games is None:
+            self._games = GameModel._get_collection()
+        return self._games
+
+    @property
+    def archive(self):
+        if self._archive is None:
+            self._archive = self.games.database[ARCHIVE_COLLECTION]
+        return self._archive
+
+    def archive_games(self, retention, batch_size=1000, now=None):
+        """
+            Archive every DONE game that hasn't changed in `retention` (a timedelta),
+            `batch_size` games at a time: each batch is read, written to the archive in one
+            insert and then deleted from the game collection. Safe to re-run after a failure.
+            Yield: number of games archived, per batch
+        """
+        cutoff = (now or datetime.utcnow()) - retention
+        query = { 'state': 'DONE', 'last_modified': { '$lt': cutoff } }
+        after = None
+        while True:
+            if after is not None:
+                query['_id'] = { '$gt': after }
+            docs = list(self.games.find(query).sort('_id', 1).limit(batch_size))
+            if not docs:
+                return
+            try:
+                self.archive.insert_many([ pack_game(doc) for doc in docs ], ordered=False)
+            except BulkWriteError as e:
+                # archived by an earlier run that stopped before deleting them
+                if any(err['code'] != DUPLICATE_KEY for err in e.details['writeErrors']):
+                    raise
+            ids = [ doc['_id'] for doc in docs ]
+            # DONE games are never written again (see storage.mongo.move_update), nothing is lost
+            self.games.delete_many({ '_id': { '$in': ids }, 'state': 'DONE' })
+            after = ids[-1]
+            yield len(docs)
+
+    def iter_games(self, batch_size=1000):
+        """
+            Yield: every archived GameModel, read `batch_size` documents at a time
+        """
+        for archived in self.archive.find().batch_size(batch_size):
+            yield unpack_game(archived)
+
+    def get_game(self, game_id):
+        """
+            Return: the archived GameModel (without a board snapshot), or None if it isn't archived
+        """
+        try:
+            game_id = ObjectId(game_id)
+        except (InvalidId, TypeError):
+            return None
+        archived = self.archive.find_one({ '_id': game_id })
+        return unpack_game(archived) if archived is not None else None
+
+
+# shared by the whole process, see storage.mongo.MongoStore
+game_archive = GameArchive()
@@ -0,0 +1,355 @@
+# Async (ASGI) serving mode: the same routes and response shapes as the Flask app
+# (GameList, GameDetail, Moves, MoveDetail, GameHint), on Starlette with the motor async Mongo driver,
+# so a worker doesn't block on Mongo round trips and can hold thousands of open connections.
+# Game rules are shared with the Flask app: documents are loaded into GameModel (without
+# touching mongoengine's connection) and played with the same play_move/GameBoard code,
+# and moves are written with the same conditional update as storage.mongo.MongoStore.
+# This mode always stores games in MongoDB, whatever STORAGE is set to.
+#
+# Run with an ASGI server, e.g.:
+#   uvicorn droptoken.asgi:app --workers 4
+import os
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from werkzeug.exceptions import BadRequest
+
+from droptoken.analysis import parallel_solver
+from droptoken.archive import ARCHIVE_COLLECTION, unpack_game
+from droptoken.book import book
+from droptoken.boards import load_board, store_board
+from droptoken.logic import new_board
+from droptoken.models.game import GameModel, MoveModel, PlayerModel, unpack_move_docs
+from droptoken.resources.game import BULK_AI_PLAYERS_MESSAGE, MAX_BULK_GAMES, MAX_PAGE_SIZE, bulk_post_schema, list_get_schema, post_schema
+from droptoken.resources.hint import MAX_HINT_TIME, hint_get_schema, outcome
+from droptoken.resources.moves import ALL_MOVES, format_move, move_list_get_schema, moves_post_schema, play_ai_move, play_move
+from droptoken.solver import solver
+from droptoken.storage.mongo import finish_commit, move_update
+from droptoken.validation import Invalid
+
+MONGODB_HOST = os.environ.get('MONGODB_HOST', 'localhost')
+MONGODB_DB = os.environ.get('MONGODB_DB', 'droptokendb')
+# connections per process; requests queue for a free one instead of opening more
+MONGODB_POOL_SIZE = int(os.environ.get('MONGODB_POOL_SIZE', '100'))
+# opening book file for hints, see droptoken/book.py
+OPENING_BOOK = os.environ.get('OPENING_BOOK')
+if OPENING_BOOK:
+    book.open(OPENING_BOOK)
+
+# created on first use, inside the event loop that serves requests
+_client = None
+
+
+def games_collection():
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(MONGODB_HOST, maxPoolSize=MONGODB_POOL_SIZE)
+    return _client[MONGODB_DB][GameModel._get_collection_name()]
+
+
+def archive_collection():
+    # finished games moved out of games_collection(), see droptoken/archive.py
+    return games_collection().database[ARCHIVE_COLLECTION]
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        self.status = status
+        self.message = message
+
+
+def abort(status, message):
+    # same error body as flask_restful.abort
+    raise HTTPError(status, message)
+
+
+def object_id(game_id):
+    try:
+        return ObjectId(game_id)
+    except (InvalidId, TypeError):
+        abort(404, f"Game {game_id} not found.")
+
+
+def parse(schema, source):
+    # same 400s as the Flask resources, see droptoken/validation.py
+    try:
+        return schema.parse(source)
+    except Invalid as e:
+        abort(400, e.message)
+
+
+async def json_body(request):
+    # same as Flask's request.json: a 400 unless the body is JSON, sent as JSON
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if mimetype != 'application/json' and not (mimetype.startswith('application/') and mimetype.endswith('+json')):
+        abort(400, BadRequest.description)
+    try:
+        return await request.json()
+    except ValueError:
+        abort(400, BadRequest.description)
+
+
+# Handlers. Docstrings for the routes are on the matching Flask resources.
+
+async def list_games(request):
+    args = parse(list_get_schema, request.query_params)
+    limit = args['limit']
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        abort(400, f"limit must be between 1 and {MAX_PAGE_SIZE}. Received {limit}")
+
+    query = {}
+    after = args['after']
+    if after is not None:
+        try:
+            query['_id'] = { '$gt': ObjectId(after) }
+        except (InvalidId, TypeError):
+            abort(400, f"after must be a game id. Received {after}")
+    if args['state'] is not None:
+        query['state'] = args['state']
+    if args['player'] is not None:
+        query['players.name'] = args['player']
+
+    cursor = games_collection().find(query, { '_id': 1 }).sort('_id', 1).limit(limit)
+    res = [ str(doc['_id']) async for doc in cursor ]
+    return { "games": res, "next": res[-1] if len(res) == limit else None }
+
+
+def parse_game(body):
+    """
+        Arguments of a new game (see GameList.post), checked.
+        Return: a new GameModel, without its board
+    """
+    args = parse(post_schema, body)
+    players, ai_players = args['players'], args['ai_players']
+
+    if len(players) != 2:
+        abort(400, f"The game can only support 2 players at this time. Received {len(players)}")
+    if players[0] == players[1]:
+        abort(400, f"Player names must be unique. Received {players}")
+    for name in ai_players:
+        if name not in players:
+            abort(400, f"AI player {name} is not one of the players. Received {players}")
+    if all(name in ai_players for name in players):
+        abort(400, f"At least one player must not be an AI. Received {ai_players}")
+
+    return GameModel(
+        players=[ PlayerModel(token=i, name=name, is_ai=name in ai_players) for i, name in enumerate(players, start=1) ],
+        num_cols=args['columns'],
+        num_rows=args['rows'],
+        engine=args['engine'],
+    )
+
+
+def set_up_game(g):
+    gb = new_board(g.num_cols, g.num_rows, g.engine)
+    play_ai_move(g, gb)
+    store_board(g, gb)
+    g.validate()
+
+
+async def create_game(request):
+    g = parse_game(await json_body(request))
+    # the search is CPU-bound, keep it off the event loop
+    await run_in_threadpool(set_up_game, g)
+    result = await games_collection().insert_one(g.to_mongo())
+    return { "gameId": f"{result.inserted_id}" }
+
+
+async def create_games(request):
+    body = await json_body(request)
+    specs = parse(bulk_post_schema, body)['games']
+    if len(specs) > MAX_BULK_GAMES:
+        abort(400, f"At most {MAX_BULK_GAMES} games can be created at once. Received {len(specs)}")
+
+    games = []
+    for i, spec in enumerate(specs):
+        try:
+            g = parse_game(spec)
+            ai_players = [ p.name for p in g.players if p.is_ai ]
+            if ai_players:
+                abort(400, BULK_AI_PLAYERS_MESSAGE.format(ai_players))
+            games.append(g)
+        except HTTPError as e:
+            abort(400, { str(i): e.message })
+
+    for g in games:
+        await run_in_threadpool(set_up_game, g)
+    result = await games_collection().insert_many([ g.to_mongo() for g in games ])
+    return { "gameIds": [ f"{game_id}" for game_id in result.inserted_ids ] }
+
+
+async def game_detail(request):
+    game_id = request.path_params['game_id']
+    doc = await games_collection().find_one({ '_id': object_id(game_id) }, { 'players': 1, 'state': 1, 'winner': 1 })
+    if doc is None:
+        g = await load_archived_game(game_id)
+        doc = { 'players': [ { 'name': p.name } for p in g.players ], 'state': g.state, 'winner': g.winner }
+
+    res = { 'players': [ p['name'] for p in doc['players'] ], 'state': doc['state'] }
+    if doc['state'] == 'DONE':
+        res['winner'] = doc.get('winner')
+    return res
+
+
+async def get_matching_moves(game_id, skip, limit):
+    doc = await games_collection().find_one(
+        { '_id': object_id(game_id) },
+        { '_id': 1, 'players': 1, 'packed_moves': 1, 'moves': { '$slice': [skip, limit] } })
+    if doc is None:
+        g = await load_archived_game(game_id)
+        return [ format_move(m) for m in g.moves[skip:skip + limit] ]
+    if doc.get('packed_moves') is not None:
+        moves = unpack_move_docs(doc['packed_moves'][skip:skip + limit], doc['players'], first_turn=skip + 1)
+    else:
+        moves = doc.get('moves', [])
+    return [ format_move(MoveModel._from_son(m)) for m in moves ]
+
+
+async def load_archived_game(game_id):
+    doc = await archive_collection().find_one({ '_id': object_id(game_id) })
+    if doc is None:
+        abort(404, f"Game {game_id} not found.")
+    return unpack_game(doc)
+
+
+async def load_game(game_id):
+    doc = await games_collection().find_one({ '_id': object_id(game_id) })
+    g = GameModel._from_son(doc) if doc is not None else await load_archived_game(game_id)
+    return g, load_board(g)
+
+
+async def commit_moves(g, gb, new_moves, expected_version, expected_token=None):
+    query, update = move_update(g, gb, new_moves, expected_version, expected_token)
+    result = await games_collection().update_one(query, update)
+    return finish_commit(g, gb, expected_version, result.modified_count == 1)
+
+
+async def list_moves(request):
+    game_id = request.path_params['game_id']
+    args = parse(move_list_get_schema, request.query_params)
+    start, until = args['start'], args['until']
+
+    skip = max(start, 0)
+    limit = until - skip + 1 if until > -1 else ALL_MOVES
+    moves = await get_matching_moves(game_id, skip, max(limit, 1))
+    if not moves:
+        abort(404, f"No moves found for game {game_id}, starting at move {start}.")
+    return moves if limit > 0 else []
+
+
+async def post_move(request):
+    game_id, player_id = request.path_params['game_id'], request.path_params['player_id']
+    body = await json_body(request)
+    column = parse(moves_post_schema, body)['column']
+
+    g, gb = await load_game(game_id)
+    p = next((p for p in g.players if p.name == player_id), None)
+    if p is None:
+        abort(404, f"Player {player_id} does not belong to game {game_id}.")
+    if g.state == 'DONE':
+        abort(410, f"The game is already DONE.")
+    if g.current_token != p.token:
+        abort(409, f"Player {player_id} tried to post when it’s not their turn.")
+    if not gb.can_drop(column):
+        abort(400, f"Illegal move. Unable to drop token in column {column}")
+
+    m = play_move(g, gb, p, column)
+    played = [m]
+    ai_move = await run_in_threadpool(play_ai_move, g, gb)
+    if ai_move is not None:
+        played.append(ai_move)
+    if not await commit_moves(g, gb, played, expected_version=g.version, expected_token=p.token):
+        abort(409, f"Game {game_id} was changed by another request. Reload the game and try again.")
+    return { "move": f"{game_id}/moves/{m.turn}" }
+
+
+async def quit_game(request):
+    game_id, player_id = request.path_params['game_id'], request.path_params['player_id']
+
+    g, gb = await load_game(game_id)
+    p = next((p for p in g.players if p.name == player_id), None)
+    if p is None:
+        abort(404, f"Player {player_id} does not belong to game {game_id}.")
+    if g.state == 'DONE':
+        abort(410, f"The game is already DONE.")
+
+    m = g.moves.create(turn=g.moves.count() + 1, move_type='QUIT', player_name=p.name)
+    g.state = 'DONE'
+    g.winner = next(other.name for other in g.players if other.name != player_id)
+    if not await commit_moves(g, gb, [m], expected_version=g.version):
+        abort(409, f"Game {game_id} was changed by another request. Reload the game and try again.")
+    return {}
+
+
+async def game_hint(request):
+    game_id = request.path_params['game_id']
+    args = parse(hint_get_schema, request.query_params)
+    time_limit, deep = args['time_limit'], args['deep']
+    if time_limit is not None:
+        time_limit = min(max(time_limit, 0.001), MAX_HINT_TIME)
+
+    g, gb = await load_game(game_id)
+    if g.state == 'DONE':
+        abort(410, f"The game is already DONE.")
+
+    result = book.lookup(gb, g.current_token)
+    if result is None:
+        result = await run_in_threadpool((parallel_solver if deep else solver).solve, gb, g.current_token, time_limit)
+    return {
+        'player': next(p.name for p in g.players if p.token == g.current_token),
+        'column': result.column,
+        'score': result.score,
+        'outcome': outcome(result.score),
+        'depth': result.depth,
+    }
+
+
+async def moves(request):
+    # same HACK as Moves: /drop-token/{gameId}/moves shares the route with /drop-token/{gameId}/{playerId}
+    if request.method == 'GET':
+        if request.path_params['player_id'] != 'moves':
+            game_id, player_id = request.path_params['game_id'], request.path_params['player_id']
+            abort(404, f"URL /drop_token/{game_id}/{player_id} not found.")
+        return await list_moves(request)
+    if request.method == 'POST':
+        return await post_move(request)
+    return await quit_game(request)
+
+
+async def move_detail(request):
+    game_id, move_id = request.path_params['game_id'], request.path_params['move_id']
+    moves = await get_matching_moves(game_id, move_id, 1)
+    if not moves:
+        abort(404, f"Move number {move_id} not found for game {game_id}")
+    return moves[0]
+
+
+def endpoint(handler):
+    async def wrapper(request: Request):
+        try:
+            return JSONResponse(await handler(request))
+        except HTTPError as e:
+            return JSONResponse({ 'message': e.message }, status_code=e.status)
+    return wrapper
+
+
+routes = [
+    Route('/drop-token', endpoint(list_games), methods=['GET']),
+    Route('/drop-token', endpoint(create_game), methods=['POST']),
+    Route('/drop-token/', endpoint(list_games), methods=['GET']),
+    Route('/drop-token/', endpoint(create_game), methods=['POST']),
+    Route('/drop-token/bulk', endpoint(create_games), methods=['POST']),
+    Route('/drop-token/{game_id}', endpoint(game_detail), methods=['GET']),
+    Route('/drop-token/{game_id}/moves/{move_id:int}', endpoint(move_detail), methods=['GET']),
+    Route('/drop-token/{game_id}/hint', endpoint(game_hint), methods=['GET']),
+    Route('/drop-token/{game_id}/{player_id}', endpoint(moves), methods=['GET', 'POST', 'DELETE']),
+    Route('/drop-token/{game_id}/{player_id}/', endpoint(moves), methods=['GET', 'POST', 'DELETE']),
+]
+
+app = Starlette(routes=routes)
@@ -0,0 +1,152 @@
+# Vectorized (NumPy) counterpart of GameBoard, for checking many games at once,
+# e.g. re-validating the winners of stored games after a bug.
+# All games in a batch must have the same board dimensions. Boards are (games, cols, rows)
+# int arrays laid out like GameBoard.board, with 0 for an empty cell.
+import numpy as np
+
+from droptoken.logic import GameBoard
+
+# (dc, dr) scan directions: column, row and both diagonals
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def _shift(cells, dc, dr):
+    """
+        out[:, c, r] = cells[:, c + dc, r + dr], False where that's off the board.
+    """
+    out = np.zeros_like(cells)
+    _, nc, nr = cells.shape
+    if abs(dc) >= nc or abs(dr) >= nr:
+        return out
+    src_c = slice(max(dc, 0), nc + min(dc, 0))
+    dst_c = slice(max(-dc, 0), nc + min(-dc, 0))
+    src_r = slice(max(dr, 0), nr + min(dr, 0))
+    dst_r = slice(max(-dr, 0), nr + min(-dr, 0))
+    out[:, dst_c, dst_r] = cells[:, src_c, src_r]
+    return out
+
+
+def _run_starts(cells, dc, dr, winning_run):
+    # cells where a full run begins, going in direction (dc, dr)
+    starts = cells.copy()
+    for k in range(1, winning_run):
+        starts &= _shift(cells, k * dc, k * dr)
+    return starts
+
+
+def find_wins(boards, winning_run=GameBoard.WINNING_RUN):
+    """
+        Which cells are part of a winning run?
+        Input:
+            boards: int array (games, cols, rows), 0 for empty
+        Return: bool array (games, cols, rows)
+            True where GameBoard.check_win(col + 1, row + 1) would be True, for every non-empty cell
+    """
+    boards = np.asarray(boards)
+    wins = np.zeros(boards.shape, dtype=bool)
+    for token in np.unique(boards):
+        if token == 0:
+            continue
+        cells = boards == token
+        for dc, dr in DIRECTIONS:
+            starts = _run_starts(cells, dc, dr, winning_run)
+            if not starts.any():
+                continue
+            # spread the run starts back over every cell of the run. Like GameBoard, a column
+            # only counts from its top token down (the last one dropped), so only mark that one
+            first = winning_run - 1 if (dc, dr) == (0, 1) else 0
+            for k in range(first, winning_run):
+                wins |= _shift(starts, -k * dc, -k * dr)
+    return wins
+
+
+def encode_games(games):
+    """
+        Stack move lists into padded arrays for replay_games().
+        Input:
+            games: List( List( {'token': token, 'column': column}, ... ), ... ), same as GameBoard.apply_moves.
+                   Tokens must be ints in 1..127, columns are 1-indexed.
+        Return: (tokens, columns, lengths)
+            tokens: int8 array (games, max_moves), 0 as padding
+            columns: int32 array (games, max_moves), 0-indexed, -1 as padding
+            lengths: int32 array (games,), number of moves in each game
+    """
+    lengths = np.array([len(g) for g in games], dtype=np.int32)
+    max_moves = int(lengths.max()) if len(games) else 0
+    tokens = np.zeros((len(games), max_moves), dtype=np.int8)
+    columns = np.full((len(games), max_moves), -1, dtype=np.int32)
+    for i, g in enumerate(games):
+        tokens[i, :len(g)] = [m['token'] for m in g]
+        columns[i, :len(g)] = [m['column'] - 1 for m in g]
+    return tokens, columns, lengths
+
+
+def replay_games(games, num_cols, num_rows, winning_run=GameBoard.WINNING_RUN):
+    """
+        Replay many games of the same dimensions in lockstep, one move of every game per step.
+        A game stops at its first win, when its board is full, or at its first illegal move
+        (same as playing it through GameBoard with check_win after every drop).
+        Input:
+            games: List( List( {'token': token, 'column': column}, ... ), ... ), see encode_games()
+            num_cols, num_rows: board dimensions shared by all games
+        Return: dict of arrays, one entry per game
+            winner: token of the winner, 0 if none
+            final_turn: 1-indexed number of the last move applied
+            draw: True if the board filled up with no winner
+            valid: False if the game stopped on a move that could not be applied
+            boards: final boards (games, cols, rows)
+    """
+    tokens, columns, lengths = encode_games(games)
+    n = len(games)
+    index = np.arange(n)
+
+    boards = np.zeros((n, num_cols, num_rows), dtype=np.int8)
+    heights = np.zeros((n, num_cols), dtype=np.int32)
+    winner = np.zeros(n, dtype=np.int8)
+    final_turn = np.zeros(n, dtype=np.int32)
+    draw = np.zeros(n, dtype=bool)
+    valid = np.ones(n, dtype=bool)
+    done = lengths == 0
+
+    for t in range(tokens.shape[1]):
+        active = ~done & (t < lengths)
+        if not active.any():
+            break
+
+        col = columns[:, t]
+        in_bounds = (col >= 0) & (col < num_cols)
+        safe_col = np.where(in_bounds, col, 0)
+        row = heights[index, safe_col]
+        legal = in_bounds & (row < num_rows)
+
+        # illegal moves end the game where it stands
+        bad = active & ~legal
+        valid[bad] = False
+        done |= bad
+
+        moving = active & legal
+        g, c, r = index[moving], safe_col[moving], row[moving]
+        boards[g, c, r] = tokens[moving, t]
+        heights[g, c] += 1
+        final_turn[moving] = t + 1
+
+        # only the token that just moved can have won
+        cells = boards == tokens[:, t][:, None, None]
+        won = np.zeros(n, dtype=bool)
+        for dc, dr in DIRECTIONS:
+            won |= _run_starts(cells, dc, dr, winning_run).any(axis=(1, 2))
+        won &= moving
+        winner[won] = tokens[won, t]
+        done |= won
+
+        full = moving & ~won & (t + 1 == num_cols * num_rows)
+        draw[full] = True
+        done |= full
+
+    return {
+        'winner': winner,
+        'final_turn': final_turn,
+        'draw': draw,
+        'valid': valid,
+        'boards': boards,
+    }
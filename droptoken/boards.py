@@ -0,0 +1,179 @@
+# Glue between the stored GameModel and the in-memory board engines.
+# Games carry a snapshot of their board (GameModel.board_cells/heights), so a move only
+# needs to load the snapshot and drop one token instead of replaying the whole history.
+from collections import OrderedDict
+from threading import Lock
+
+from droptoken.logic import ENGINES, new_board
+from droptoken.models.game import GameModel
+from droptoken.packing import packed_columns
+
+
+def replay_board(game):
+    """
+        Build the board by replaying every stored move. This is the slow path,
+        used for games that were saved before snapshots existed.
+    """
+    gb = new_board(game.num_cols, game.num_rows, game.engine)
+    # players take turns in token order (see resources.moves.get_next_token), and a QUIT
+    # can only be the last move, so the columns are all it takes
+    tokens = sorted(p.token for p in game.players)
+    packed = game.packed_moves
+    if packed is not None and len(packed) >= len(game.moves):
+        # as stored, one byte per move: fed to the board as is. `moves` is longer once
+        # the game has been played since it was loaded
+        columns = packed_columns(packed)
+    else:
+        columns = (m.column for m in game.moves if m.move_type == 'MOVE')
+    gb.apply_columns(columns, tokens)
+    return gb
+
+
+def load_board(game):
+    """
+        Hydrate the board for a game from its snapshot, falling back to a replay for legacy games.
+    """
+    if game.board_cells is None or game.heights is None:
+        return replay_board(game)
+    engine = ENGINES[game.engine]
+    return engine.from_snapshot(game.num_cols, game.num_rows, game.board_cells, game.heights)
+
+
+def store_board(game, gb):
+    """
+        Copy the board's snapshot onto the game. Does not save the game.
+    """
+    game.board_cells, game.heights = gb.snapshot()
+
+
+def backfill_snapshots(batch_size=500):
+    """
+        Migration for games that only have `moves`: replay them once and store the snapshot.
+        Safe to re-run, it only touches games without a snapshot.
+        Return: number of games backfilled
+    """
+    count = 0
+    legacy = GameModel.objects(board_cells=None).batch_size(batch_size)
+    for game in legacy:
+        cells, heights = replay_board(game).snapshot()
+        # only write the snapshot fields, leave the rest of the document alone
+        GameModel.objects(id=game.id, board_cells=None).update_one(
+            set__board_cells=cells,
+            set__heights=heights,
+        )
+        count += 1
+    return count
+
+
+def audit_winners(batch_size=10000):
+    """
+        Re-check the state and winner of every stored game (archived ones included) by replaying
+        its moves, many games at a time with the vectorized engine in droptoken.batch (needs numpy).
+        Games are read from the configured store, see droptoken.storage.get_store().
+        Games that ended with a QUIT are skipped, their winner doesn't come from the board.
+        Yield: (game_id, (stored state, stored winner), (replayed state, replayed winner)) for every mismatch
+    """
+    from droptoken.batch import replay_games
+    from droptoken.storage import get_store
+
+    def check(dims, games):
+        res = replay_games([moves for _, moves in games], *dims)
+        for i, (game, _) in enumerate(games):
+            names = { p.token: p.name for p in game.players }
+            winner = names.get(int(res['winner'][i]))
+            state = 'DONE' if winner or res['draw'][i] else 'IN_PROGRESS'
+            if (state, winner) == ('IN_PROGRESS', None) and (game.state, game.winner) == ('DONE', None):
+                # the batch replay only calls a draw on a full board, some engines call it earlier
+                if not replay_board(game).win_possible():
+                    continue
+            if (state, winner) != (game.state, game.winner):
+                yield game.id, (game.state, game.winner), (state, winner)
+
+    # games are replayed in batches of the same board dimensions
+    pending = {}
+    for game in get_store().iter_games(batch_size):
+        if any(m.move_type == 'QUIT' for m in game.moves):
+            continue
+        tokens = { p.name: p.token for p in game.players }
+        moves = [ { 'token': tokens[m.player_name], 'column': m.column } for m in game.moves ]
+        dims = (game.num_cols, game.num_rows)
+        pending.setdefault(dims, []).append((game, moves))
+        if len(pending[dims]) >= batch_size:
+            yield from check(dims, pending.pop(dims))
+
+    for dims, games in pending.items():
+        yield from check(dims, games)
+
+
+class BoardCache(object):
+    """
+        Bounded, thread-safe LRU cache of live games: game_id -> (version, GameModel, board).
+        An entry is only served if its version matches the one asked for, so an entry that
+        another worker has since written to is never used.
+        The cached game and board are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, game_id, version):
+        """
+            Return (game, board) if cached at this version, otherwise None.
+        """
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(game_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, game_id, version, game, board):
+        with self._lock:
+            current = self._entries.get(game_id)
+            # never replace a newer entry with an older one
+            if current is not None and current[0] > version:
+                return
+            self._entries[game_id] = (version, game, board)
+            self._entries.move_to_end(game_id)
+            self._evict()
+
+    def invalidate(self, game_id):
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    def resize(self, max_size):
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _evict(self):
+        # caller holds the lock
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+# shared by the storage backends in this process. Sized from BOARD_CACHE_SIZE in app.py
+board_cache = BoardCache()
+
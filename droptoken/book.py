@@ -0,0 +1,186 @@
+# Opening book: best moves for the first plies of a game, searched ahead of time.
+# Early positions repeat across most games, so instead of searching them on every hint or AI
+# move, `flask build-book` searches every position up to a few plies deep once and writes
+# the results to a file, which the app maps into memory (mmap) and binary-searches.
+#
+# Positions are keyed by a Zobrist hash of the board (see key()), so any engine in
+# logic.ENGINES works. A board and its mirror image have the same best move (mirrored) and
+# score, so only one of the two is stored: the one with the lower hash.
+#
+# File layout: a header (magic, record count), then fixed-size records sorted by key:
+#   key (uint64), score (int32), depth (uint8), column (int8, 1-indexed, of the stored side)
+import mmap
+import os
+import random
+import struct
+from functools import lru_cache
+
+from droptoken.logic import GameBoard
+from droptoken.solver import Result
+
+MAGIC = b'DTBOOK01'
+HEADER = struct.Struct('<8sI4x')
+RECORD = struct.Struct('<QiBb2x')
+
+
+class Keys(object):
+    """
+        Random keys for every (token, cell) of a board size, the same in every process and build.
+    """
+
+    def __init__(self, num_cols, num_rows):
+        rng = random.Random(f'droptoken book {num_cols}x{num_rows}')
+        # the empty board of every size gets its own key
+        self.size = rng.getrandbits(64)
+        self.side = rng.getrandbits(64)
+        self.cells = [[rng.getrandbits(64) for _ in range(num_cols * num_rows)] for _ in range(2)]
+
+
+@lru_cache(maxsize=64)
+def keys(num_cols, num_rows):
+    return Keys(num_cols, num_rows)
+
+
+def key(board, token):
+    """
+        Canonical hash of a position: the same for a board and its mirror image.
+        Input: board (any engine), token to move
+        Return: (key, mirrored) - mirrored is True if the key is the mirror image's,
+                so columns read from the book must be mirrored for this board
+    """
+    nc, nr = board.num_cols, board.num_rows
+    K = keys(nc, nr)
+    cells, heights = board.snapshot()
+    h = m = K.size ^ (K.side if token == 2 else 0)
+    for c in range(nc):
+        for r in range(heights[c]):
+            t = cells[c * nr + r] - 1
+            h ^= K.cells[t][c * nr + r]
+            m ^= K.cells[t][(nc - 1 - c) * nr + r]
+    if m < h:
+        return m, True
+    return h, False
+
+
+class OpeningBook(object):
+    """
+        Read side of a book file. Empty (every lookup misses) until open() is called.
+    """
+
+    def __init__(self, path=None):
+        self._file = None
+        self._map = None
+        self.count = 0
+        if path:
+            self.open(path)
+
+    def open(self, path):
+        self.close()
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) != HEADER.size + self.count * RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not an opening book.")
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._file = self._map = None
+        self.count = 0
+
+    def lookup(self, board, token):
+        """
+            Input: board (any engine), token to move
+            Return: Result (nodes is always 0), or None if the position isn't in the book
+        """
+        if not self.count:
+            return None
+        k, mirrored = key(board, token)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from('<Q', self._map, HEADER.size + mid * RECORD.size)[0] < k:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count:
+            return None
+        found, score, depth, column = RECORD.unpack_from(self._map, HEADER.size + lo * RECORD.size)
+        if found != k:
+            return None
+        if mirrored:
+            column = board.num_cols + 1 - column
+        return Result(column, score, depth, 0)
+
+
+# shared by the whole process, see OPENING_BOOK in app.py
+book = OpeningBook()
+
+
+def positions(num_cols, num_rows, plies):
+    """
+        Every position reachable in up to `plies` moves (token 1 moving first) that isn't won or
+        full, once per mirror pair.
+        Yield: (key, mirrored, board, token to move)
+    """
+    seen = set()
+    level = [ GameBoard(num_cols, num_rows) ]
+    for ply in range(plies + 1):
+        token = ply % 2 + 1
+        following = []
+        for board in level:
+            k, mirrored = key(board, token)
+            if k in seen:
+                continue
+            seen.add(k)
+            yield k, mirrored, board, token
+            if ply == plies:
+                continue
+            for c in range(1, num_cols + 1):
+                if not board.can_drop(c):
+                    continue
+                child = board.copy()
+                row = child.drop_token(c, token)
+                if not child.check_win(c, row) and child.win_possible():
+                    following.append(child)
+        level = following
+
+
+def build_book(path, sizes, plies, depth, processes=None):
+    """
+        Search every position of the first `plies` moves, for every (num_cols, num_rows) in
+        `sizes`, to `depth` plies, and write the book to `path` (replacing it at the end).
+        processes=1 searches in this process, otherwise on a process pool.
+        Return: number of positions written
+    """
+    from droptoken.analysis import process_pool, solve_game
+
+    tasks, mirror = [], {}
+    for num_cols, num_rows in sizes:
+        for k, mirrored, board, token in positions(num_cols, num_rows, plies):
+            mirror[k] = mirrored
+            tasks.append((k, num_cols, num_rows) + board.snapshot() + (token, depth))
+
+    if processes == 1:
+        results = list(map(solve_game, tasks))
+    else:
+        with process_pool(processes) as pool:
+            results = list(pool.map(solve_game, tasks, chunksize=16))
+
+    records = []
+    for (k, result), task in zip(results, tasks):
+        if result.column is None:
+            continue
+        # store the move for the side with the lower hash
+        column = task[1] + 1 - result.column if mirror[k] else result.column
+        records.append((k, result.score, result.depth, column))
+    records.sort()
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records)))
+        for record in records:
+            f.write(RECORD.pack(*record))
+    os.replace(tmp, path)
+    return len(records)
@@ -0,0 +1,106 @@
+# `flask` CLI commands, registered on the app by create_app().
+# What they need is imported when they run, so serving requests never pays for it.
+import click
+
+
+def register_commands(app):
+
+    # Migration: store board snapshots for games created before snapshots existed.
+    # Usage: flask backfill-snapshots
+    @app.cli.command('backfill-snapshots')
+    def backfill_snapshots_command():
+        from droptoken.boards import backfill_snapshots
+        count = backfill_snapshots()
+        print(f"Backfilled board snapshots for {count} games.")
+
+    # Re-validate the state/winner of all stored games by replaying them in bulk (needs numpy).
+    # Usage: flask audit-winners
+    @app.cli.command('audit-winners')
+    def audit_winners_command():
+        from droptoken.boards import audit_winners
+        count = 0
+        for game_id, stored, replayed in audit_winners():
+            print(f"Game {game_id}: stored {stored}, replayed {replayed}")
+            count += 1
+        print(f"Found {count} games with a mismatched state or winner.")
+
+    # Search the position of every IN_PROGRESS game, on all CPU cores.
+    # Usage: flask analyze-games --depth 8
+    @app.cli.command('analyze-games')
+    @click.option('--depth', default=8, help='Plies to search in every game.')
+    @click.option('--processes', default=None, type=int, help='Worker processes (default: one per CPU).')
+    def analyze_games_command(depth, processes):
+        from droptoken.analysis import analyze_games
+        count = 0
+        for game_id, result in analyze_games(depth, processes=processes or app.config['SOLVER_PROCESSES']):
+            print(f"Game {game_id}: best column {result.column}, score {result.score}")
+            count += 1
+        print(f"Analyzed {count} games.")
+
+    # Search the first plies of every game ahead of time, for hints and AI players.
+    # Usage: flask build-book --sizes 7x6,4x4 --plies 6 --depth 10 --output book.bin
+    @app.cli.command('build-book')
+    @click.option('--sizes', default='7x6', help='Board sizes, as COLUMNSxROWS separated by commas.')
+    @click.option('--plies', default=4, help='Moves into the game to cover.')
+    @click.option('--depth', default=8, type=click.IntRange(1, 255), help='Plies to search in every position.')
+    @click.option('--output', default='book.bin', help='Book file to write (set OPENING_BOOK to use it).')
+    @click.option('--processes', default=None, type=int, help='Worker processes (default: one per CPU).')
+    def build_book_command(sizes, plies, depth, output, processes):
+        from droptoken.book import build_book
+        try:
+            board_sizes = [ tuple(int(n) for n in size.split('x')) for size in sizes.split(',') ]
+            if any(len(size) != 2 for size in board_sizes):
+                raise ValueError()
+        except ValueError:
+            raise click.BadParameter(f"Expected sizes like 7x6,4x4. Received {sizes}", param_hint='--sizes')
+        count = build_book(output, board_sizes, plies, depth, processes=processes or app.config['SOLVER_PROCESSES'])
+        print(f"Wrote {count} positions to {output}.")
+
+    # Move finished games out of the game collection, into the archive.
+    # Usage: flask archive-games --retention-days 7 --batch-size 1000
+    @app.cli.command('archive-games')
+    @click.option('--retention-days', default=None, type=float, help='Archive DONE games untouched for this long (default: ARCHIVE_RETENTION_DAYS).')
+    @click.option('--batch-size', default=None, type=click.IntRange(1), help='Games per write (default: ARCHIVE_BATCH_SIZE).')
+    def archive_games_command(retention_days, batch_size):
+        from datetime import timedelta
+        from droptoken.archive import game_archive
+        if retention_days is None:
+            retention_days = app.config['ARCHIVE_RETENTION_DAYS']
+        count = 0
+        for archived in game_archive.archive_games(timedelta(days=retention_days),
+                batch_size=batch_size or app.config['ARCHIVE_BATCH_SIZE']):
+            count += archived
+            print(f"Archived {count} games...")
+        print(f"Archived {count} games.")
+
+    # Write every game (archived ones too) as NDJSON, one game per line, for analytics.
+    # Usage: flask export-games --output games.ndjson
+    @app.cli.command('export-games')
+    @click.option('--output', default='-', type=click.File('w'), help='File to write (default: stdout).')
+    @click.option('--batch-size', default=1000, type=click.IntRange(1), help='Games per read from the database.')
+    def export_games_command(output, batch_size):
+        from droptoken.ndjson import export_lines
+        from droptoken.storage import get_store
+        count = 0
+        for line in export_lines(get_store().iter_games(batch_size)):
+            output.write(line)
+            count += 1
+        click.echo(f"Exported {count} games.", err=True)
+
+    # Create games from an NDJSON export (as new games), e.g. to seed a test environment.
+    # Usage: flask import-games games.ndjson
+    @app.cli.command('import-games')
+    @click.argument('input', type=click.File('r'))
+    @click.option('--batch-size', default=1000, type=click.IntRange(1), help='Games per write to the database.')
+    def import_games_command(input, batch_size):
+        from droptoken.ndjson import import_lines
+        from droptoken.storage import get_store
+        from droptoken.validation import Invalid
+        count = 0
+        try:
+            for stored in import_lines(input, get_store(), batch_size):
+                count += stored
+        except Invalid as e:
+            (line_no, message), = e.message.items()
+            raise click.ClickException(f"Line {line_no}: {message} ({count} games imported before it)")
+        print(f"Imported {count} games.")
@@ -0,0 +1,155 @@
+# In-process pub/sub of game changes, so clients can wait for the opponent's move
+# (see resources/stream.py) instead of polling the db.
+# Writers publish (turn, state, winner) for a game after every successful write, and waiters
+# block on that game's channel until it moves past the turn they've seen. The hub remembers the
+# latest state of every game it has heard of (up to max_games), so a waiter on an idle game costs
+# no db reads at all.
+# With several worker processes, each one only sees its own writes. Run start_change_stream()
+# in every worker to feed its hub from a MongoDB change stream instead (EVENTS_BACKEND in app.py).
+import logging
+from collections import OrderedDict
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep
+
+log = logging.getLogger(__name__)
+
+
+class GameState(object):
+    __slots__ = ('turn', 'state', 'winner')
+
+    def __init__(self, turn, state, winner=None):
+        self.turn = turn
+        self.state = state
+        self.winner = winner
+
+
+class _Channel(object):
+    __slots__ = ('latest', 'waiters', 'cond')
+
+    def __init__(self, lock):
+        self.latest = None
+        self.waiters = 0
+        self.cond = Condition(lock)
+
+
+class GameEvents(object):
+    def __init__(self, max_games=100000):
+        self.max_games = max_games
+        self._lock = Lock()
+        self._channels = OrderedDict()
+
+    def _channel(self, game_id):
+        # caller holds the lock
+        channel = self._channels.get(game_id)
+        if channel is None:
+            channel = self._channels[game_id] = _Channel(self._lock)
+            self._evict()
+        else:
+            self._channels.move_to_end(game_id)
+        return channel
+
+    def _evict(self):
+        # forget the least recently used games that nobody is waiting on
+        excess = len(self._channels) - self.max_games
+        if excess <= 0:
+            return
+        # from the least recently used end, only as far as it takes: this runs under the hub's lock
+        idle = []
+        for game_id, channel in self._channels.items():
+            if not channel.waiters:
+                idle.append(game_id)
+                if len(idle) == excess:
+                    break
+        for game_id in idle:
+            del self._channels[game_id]
+
+    def latest(self, game_id):
+        """
+            Last known GameState for a game, or None if we haven't heard of it.
+        """
+        with self._lock:
+            channel = self._channels.get(game_id)
+            return channel.latest if channel else None
+
+    def publish(self, game_id, turn, state, winner=None):
+        """
+            Record that a game is now at `turn` (number of moves played) and wake up its waiters.
+            Out of order (older) updates are ignored.
+        """
+        with self._lock:
+            channel = self._channel(game_id)
+            if channel.latest is not None and channel.latest.turn > turn:
+                return
+            channel.latest = GameState(turn, state, winner)
+            channel.cond.notify_all()
+
+    def wait(self, game_id, since_turn, timeout, load=None):
+        """
+            Block until the game has moved past `since_turn` or is DONE, or until `timeout` seconds pass.
+            Input:
+                load: called (without the lock) to fetch the GameState if the hub doesn't know the game yet
+            Return:
+                GameState, the latest known state (check .turn to see if anything changed)
+                None, if the game is unknown and `load` didn't find it
+        """
+        if self.latest(game_id) is None and load is not None:
+            loaded = load()
+            if loaded is None:
+                return None
+            self.publish(game_id, loaded.turn, loaded.state, loaded.winner)
+
+        deadline = monotonic() + timeout
+        with self._lock:
+            channel = self._channel(game_id)
+            channel.waiters += 1
+            try:
+                while True:
+                    latest = channel.latest
+                    if latest is not None and (latest.turn > since_turn or latest.state == 'DONE'):
+                        return latest
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return latest
+                    channel.cond.wait(remaining)
+            finally:
+                channel.waiters -= 1
+
+
+# shared by the whole process
+game_events = GameEvents()
+
+
+def start_change_stream(collection, events=game_events):
+    """
+        Feed the hub from a MongoDB change stream on the games collection (needs a replica set),
+        so waiters in this process also wake up for writes made by other workers.
+        Runs in a daemon thread. Only _id, state, winner and the number of moves (or the packed moves) are sent over.
+        Return: the thread
+    """
+    pipeline = [
+        { '$match': { 'operationType': { '$in': ['insert', 'update', 'replace'] } } },
+        { '$project': {
+            'fullDocument._id': 1,
+            'fullDocument.state': 1,
+            'fullDocument.winner': 1,
+            'fullDocument.packed_moves': 1,
+            'fullDocument.turn': { '$size': { '$ifNull': ['$fullDocument.moves', []] } },
+        } },
+    ]
+
+    def listen():
+        while True:
+            try:
+                with collection.watch(pipeline, full_document='updateLookup') as stream:
+                    for change in stream:
+                        doc = change.get('fullDocument')
+                        if doc:
+                            turn = len(doc['packed_moves']) if doc.get('packed_moves') is not None else doc['turn']
+                            events.publish(str(doc['_id']), turn, doc['state'], doc.get('winner'))
+            except Exception:
+                log.exception("Game change stream failed, reconnecting")
+                sleep(1)
+
+    thread = Thread(target=listen, name='game-change-stream', daemon=True)
+    thread.start()
+    return thread
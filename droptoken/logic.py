@@ -1,8 +1,48 @@
 # Here lives the board representation.
 # The Board is only concerned with its state, token dropping and win condition checking.
 # It is not concerned with turn order (it is unaware of players and whether some quit). 
+from functools import lru_cache
 
-class GameBoard(object):
+# Replaying a sequence of moves, shared by the board engines: they only differ in drop_token().
+class MoveFeed(object):
+    __slots__ = ()
+
+    """
+        Apply all moves to the board, in sequence.
+        Input:
+            moves: List( {'token': token, 'column': column}, ... )
+        Return:
+            True: all moves successfully applied
+            False: something went wrong
+        Side-effect:
+            the board has been updated and reflects all the moves in order.
+    """
+    def apply_moves(self, moves):
+        for m in moves:
+            if self.drop_token(m['column'], m['token']) is None:
+                return False
+        return True
+
+
+    """
+        Apply moves given as one column per move, the tokens taking turns in `tokens` order
+        (tokens[0] moves first). Same as apply_moves, without building a dict per move.
+        Input:
+            columns: iterable of int, 1-indexed columns (a bytes object will do)
+            tokens: sequence of tokens, cycled through
+        Return:
+            True: all moves successfully applied
+            False: something went wrong
+    """
+    def apply_columns(self, columns, tokens=(1, 2)):
+        num_tokens = len(tokens)
+        for i, column in enumerate(columns):
+            if self.drop_token(column, tokens[i % num_tokens]) is None:
+                return False
+        return True
+
+
+class GameBoard(MoveFeed):
     WINNING_RUN = 4
 
     def __init__(self, num_cols, num_rows):
@@ -98,20 +138,549 @@ class GameBoard(object):
 
 
     """
-        Apply all moves to the board, in sequence.
+        Can anybody still win? This engine doesn't track blocked lines, so only a full board says no.
+    """
+    def win_possible(self):
+        return any(not col[-1] for col in self.board)
+
+
+    """
+        Compact snapshot of the board, for persisting between moves.
+        Tokens must be ints in 1..255 for this.
+        Return: (cells, heights)
+            cells: bytes, one per cell, indexed by col * num_rows + row (0-indexed), 0 for empty
+            heights: list of ints, number of tokens in each column
+    """
+    def snapshot(self):
+        cells = bytes(t or 0 for col in self.board for t in col)
+        heights = [sum(1 for t in col if t) for col in self.board]
+        return cells, heights
+
+
+    """
+        Rebuild a board from a snapshot() taken on a board of the same dimensions.
+    """
+    @classmethod
+    def from_snapshot(cls, num_cols, num_rows, cells, heights):
+        gb = cls(num_cols, num_rows)
+        for c in range(num_cols):
+            for r in range(heights[c]):
+                gb.board[c][r] = cells[c * num_rows + r]
+        return gb
+
+
+    """
+        Independent copy of this board, so one can be changed without affecting the other.
+    """
+    def copy(self):
+        gb = type(self)(self.num_cols, self.num_rows)
+        gb.board = [list(col) for col in self.board]
+        return gb
+
+
+"""
+    BitBoard.check_win only looks at the line through a cell, `run` - 1 cells either side of it.
+    For each direction (column, row and both diagonals), that window is:
+        (bit shift between its cells, bits from its start to the cell, mask of its cells once
+         shifted down to bit 0)
+    Like GameBoard, a column only counts from its top token down, so its window ends there.
+    Built on first use for a column height, then shared.
+"""
+@lru_cache(maxsize=64)
+def bit_windows(col_height, run):
+    shifts = (1, col_height, col_height - 1, col_height + 1)
+    sizes = (run, 2 * run - 1, 2 * run - 1, 2 * run - 1)
+    return tuple(
+        (shift, (run - 1) * shift, sum(1 << (k * shift) for k in range(size)))
+        for shift, size in zip(shifts, sizes)
+    )
+
+
+# Alternative board engine with the same public API as GameBoard.
+# Every token gets its own integer bitboard, and a per-column height array replaces the
+# linear scan for the first empty slot. Cells are laid out column-major with one extra
+# (always empty) sentinel row on top of each column, so cell (col, row) maps to bit
+# col * (num_rows + 1) + row. The sentinel row stops runs from wrapping from the top of
+# one column into the bottom of the next, which lets check_win use shift-and-AND masks.
+class BitBoard(MoveFeed):
+    WINNING_RUN = 4
+
+    def __init__(self, num_cols, num_rows):
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self.col_height = num_rows + 1
+
+        # token -> int bitboard of the cells that token occupies
+        self.bitboards = {}
+        # number of tokens in each column (0-indexed columns)
+        self.heights = [0] * num_cols
+
+        # the part of each line through a cell that check_win looks at
+        self.windows = bit_windows(self.col_height, self.WINNING_RUN)
+
+
+    def _bit(self, column, row):
+        # 0-indexed column and row
+        return 1 << (column * self.col_height + row)
+
+
+    """
+        Which token occupies this cell?
         Input:
-            moves: List( {'token': token, 'column': column}, ... )
+            column: int, 1-indexed column position
+            row: int, 1-indexed row position
         Return:
-            True: all moves successfully applied
-            False: something went wrong
-        Side-effect:
-            self.board has been updated and reflects all the moves in order.
+            token, if the cell is taken
+            None, if the cell is empty
     """
-    def apply_moves(self, moves):
-        success = True
-        for m in moves:
-            if not self.can_drop(m['column']):
-                success = False
+    def token_at(self, column, row):
+        bit = self._bit(column - 1, row - 1)
+        for token, bb in self.bitboards.items():
+            if bb & bit:
+                return token
+        return None
+
+
+    """
+        List-of-lists view of the board, same layout as GameBoard.board (board[col][row]).
+        This is built on demand, so it's meant for debugging and tests, not for the hot path.
+    """
+    @property
+    def board(self):
+        return [
+            [self.token_at(c, r) for r in range(1, self.num_rows + 1)]
+            for c in range(1, self.num_cols + 1)
+        ]
+
+
+    """
+        Can this column accept more tokens?
+        Input:
+            column: int, column number (1-indexed)
+        Return: boolean
+            True - if yes
+            False - if full, or column does not exist
+    """
+    def can_drop(self, column):
+        if column <= 0 or column > self.num_cols:
+            return False
+        return self.heights[column - 1] < self.num_rows
+
+
+    """
+        Drop a token into a column. NOTE: token must be truthy and hashable.
+        Input:
+            column: int, column number (1-indexed)
+            token: an object representing a token (int or char will do)
+        Return: boolean
+            row - row-position of the token, if success
+            None - if could not drop
+    """
+    def drop_token(self, column, token):
+        if not self.can_drop(column):
+            return None
+
+        row = self.heights[column - 1]
+        self.bitboards[token] = self.bitboards.get(token, 0) | self._bit(column - 1, row)
+        self.heights[column - 1] = row + 1
+        return row + 1
+
+
+    """
+        Check if the token at a specific position is part of a winning run of 4 (col, row or diagonals)
+        Input:
+            column: int, 1-indexed column position
+            row: int, 1-indexed row position
+        Return:
+            True, if a winner
+            False, if not a winner
+    """
+    def check_win(self, column, row):
+        pos = (column - 1) * self.col_height + row - 1
+        bb = None
+        for token_bb in self.bitboards.values():
+            if token_bb >> pos & 1:
+                bb = token_bb
                 break
-            self.drop_token(m['column'], m['token'])
-        return success
+        if bb is None:
+            return False
+
+        for shift, span, mask in self.windows:
+            # the window around this cell, shifted down to bit 0: any run in it goes through this
+            # cell, and the sentinel rows keep it from wrapping into the next column
+            start = pos - span
+            window = (bb >> start if start >= 0 else bb << -start) & mask
+            # cells starting a pair, then a pair of pairs: a run of WINNING_RUN (4) tokens
+            window &= window >> shift
+            if window & (window >> 2 * shift):
+                return True
+
+        return False
+
+
+    """
+        Can anybody still win? This engine doesn't track blocked lines, so only a full board says no.
+    """
+    def win_possible(self):
+        return any(h < self.num_rows for h in self.heights)
+
+
+    """
+        Compact snapshot of the board, for persisting between moves. Same format as GameBoard.snapshot().
+    """
+    def snapshot(self):
+        nr, ch = self.num_rows, self.col_height
+        size = self.num_cols * ch
+        # every bitboard spread out to one byte per bit (lowest bit first), `token` where it's set.
+        # Tokens don't share cells, so OR-ing those gives one byte per cell, sentinel rows included
+        cells = 0
+        for token, bb in self.bitboards.items():
+            bits = format(bb, 'b').zfill(size)[::-1].encode('ascii')
+            cells |= int.from_bytes(bits.translate(bytes.maketrans(b'01', bytes((0, token)))), 'little')
+        cells = cells.to_bytes(size, 'little')
+        return b''.join(cells[c:c + nr] for c in range(0, size, ch)), list(self.heights)
+
+
+    """
+        Rebuild a board from a snapshot() taken on a board of the same dimensions.
+    """
+    @classmethod
+    def from_snapshot(cls, num_cols, num_rows, cells, heights):
+        bb = cls(num_cols, num_rows)
+        # the cells with an empty sentinel after each column, one byte per bit of a bitboard
+        padded = b'\0'.join(cells[c:c + num_rows] for c in range(0, num_cols * num_rows, num_rows)) + b'\0'
+        for token in set(padded) - {0}:
+            # '1' where the token is, '0' elsewhere, highest bit first
+            bits = padded.translate(b'0' * token + b'1' + b'0' * (255 - token))
+            bb.bitboards[token] = int(bits[::-1], 2)
+        bb.heights = list(heights)
+        return bb
+
+
+    """
+        Independent copy of this board, so one can be changed without affecting the other.
+    """
+    def copy(self):
+        bb = type(self)(self.num_cols, self.num_rows)
+        bb.bitboards = dict(self.bitboards)
+        bb.heights = list(self.heights)
+        return bb
+
+
+# Every possible winning line on a board of a given size, shared by all LineBoards of that size.
+# Cells are numbered col * num_rows + row (0-indexed), same as snapshot().
+class WinLines(object):
+    # directions a line runs in: up a column, along a row, and both diagonals
+    DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+    def __init__(self, num_cols, num_rows, run=4):
+        # line id -> its cells
+        self.lines = []
+        # cell -> ids of every line through it, to update counters on a drop
+        self.cell_lines = [[] for _ in range(num_cols * num_rows)]
+        # cell -> ids of the lines that count as a win for it. Like GameBoard, a column only
+        # counts from its top token down, so a vertical line is only listed under its top cell
+        self.check_lines = [[] for _ in range(num_cols * num_rows)]
+
+        for dc, dr in self.DIRECTIONS:
+            for c in range(num_cols):
+                for r in range(num_rows):
+                    end_c, end_r = c + dc * (run - 1), r + dr * (run - 1)
+                    if not (0 <= end_c < num_cols and 0 <= end_r < num_rows):
+                        continue
+                    line = len(self.lines)
+                    cells = [ (c + dc * k) * num_rows + r + dr * k for k in range(run) ]
+                    self.lines.append(cells)
+                    for cell in cells:
+                        self.cell_lines[cell].append(line)
+                    if dc == 0:
+                        self.check_lines[cells[-1]].append(line)
+                    else:
+                        for cell in cells:
+                            self.check_lines[cell].append(line)
+
+
+"""
+    The WinLines table for a board size. Built on first use, then shared.
+"""
+@lru_cache(maxsize=64)
+def win_lines(num_cols, num_rows):
+    return WinLines(num_cols, num_rows, GameBoard.WINNING_RUN)
+
+
+# a line holding tokens of more than one player, nobody can win with it anymore
+BLOCKED = object()
+
+
+# Board engine for large boards: GameBoard's cells, plus a counter per winning line, kept up
+# to date on every drop. check_win looks up the few lines through a cell instead of scanning
+# the board, and a game can be called a draw as soon as every line is blocked.
+class LineBoard(GameBoard):
+
+    def __init__(self, num_cols, num_rows):
+        super().__init__(num_cols, num_rows)
+        self.lines = win_lines(num_cols, num_rows)
+        # number of tokens in each column (0-indexed columns)
+        self.heights = [0] * num_cols
+        # line id -> None (empty), the only token in it, or BLOCKED
+        self.owner = [None] * len(self.lines.lines)
+        # line id -> number of tokens in it (only meaningful while not BLOCKED)
+        self.count = [0] * len(self.lines.lines)
+        # lines that are not BLOCKED yet
+        self.open_lines = len(self.lines.lines)
+
+
+    def _place(self, column, row, token):
+        # 0-indexed column and row
+        self.board[column][row] = token
+        owner, count = self.owner, self.count
+        for line in self.lines.cell_lines[column * self.num_rows + row]:
+            if owner[line] is None:
+                owner[line] = token
+                count[line] = 1
+            elif owner[line] == token:
+                count[line] += 1
+            elif owner[line] is not BLOCKED:
+                owner[line] = BLOCKED
+                self.open_lines -= 1
+
+
+    """
+        Drop a token into a column. NOTE: token must be truthy.
+        Input:
+            column: int, column number (1-indexed)
+            token: an object representing a token. Something truthy that implements "==" (int or char will do)
+        Return: boolean
+            row - row-position of the token, if success
+            None - if could not drop
+    """
+    def drop_token(self, column, token):
+        if not self.can_drop(column):
+            return None
+
+        row = self.heights[column - 1]
+        self._place(column - 1, row, token)
+        self.heights[column - 1] = row + 1
+        return row + 1
+
+
+    """
+        Check if the token at a specific position is part of a winning run of 4 (col, row or diagonals)
+        Input:
+            column: int, 1-indexed column position
+            row: int, 1-indexed row position
+        Return:
+            True, if a winner
+            False, if not a winner
+    """
+    def check_win(self, column, row):
+        token = self.board[column - 1][row - 1]
+        if not token:
+            return False
+        for line in self.lines.check_lines[(column - 1) * self.num_rows + row - 1]:
+            if self.owner[line] == token and self.count[line] == self.WINNING_RUN:
+                return True
+        return False
+
+
+    """
+        Can anybody still win? False as soon as every winning line holds tokens of two players,
+        which can be long before the board is full.
+    """
+    def win_possible(self):
+        return self.open_lines > 0 and any(h < self.num_rows for h in self.heights)
+
+
+    """
+        Rebuild a board from a snapshot() taken on a board of the same dimensions.
+    """
+    @classmethod
+    def from_snapshot(cls, num_cols, num_rows, cells, heights):
+        lb = cls(num_cols, num_rows)
+        for c in range(num_cols):
+            for r in range(heights[c]):
+                lb._place(c, r, cells[c * num_rows + r])
+        lb.heights = list(heights)
+        return lb
+
+
+    """
+        Independent copy of this board, so one can be changed without affecting the other.
+    """
+    def copy(self):
+        lb = super().copy()
+        lb.heights = list(self.heights)
+        lb.owner = list(self.owner)
+        lb.count = list(self.count)
+        lb.open_lines = self.open_lines
+        return lb
+
+
+# Board engine for holding many live boards: the cells of a GameBoard in one flat bytearray
+# (one byte per cell, indexed by col * num_rows + row, 0 for empty - the snapshot() format)
+# instead of a Python list per column, and no per-instance __dict__.
+# Column heights aren't stored, they're found by searching the column for its first empty
+# cell, which bytearray does in C. Tokens must be ints in 1..255.
+class CompactBoard(MoveFeed):
+    __slots__ = ('num_cols', 'num_rows', 'cells')
+    WINNING_RUN = 4
+
+    def __init__(self, num_cols, num_rows):
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self.cells = bytearray(num_cols * num_rows)
+
+
+    def _height(self, column):
+        # 0-indexed column
+        start = column * self.num_rows
+        empty = self.cells.find(0, start, start + self.num_rows)
+        return self.num_rows if empty < 0 else empty - start
+
+
+    """
+        Which token occupies this cell?
+        Input:
+            column: int, 1-indexed column position
+            row: int, 1-indexed row position
+        Return:
+            token, if the cell is taken
+            None, if the cell is empty
+    """
+    def token_at(self, column, row):
+        return self.cells[(column - 1) * self.num_rows + row - 1] or None
+
+
+    """
+        List-of-lists view of the board, same layout as GameBoard.board (board[col][row]).
+        This is built on demand, so it's meant for debugging and tests, not for the hot path.
+    """
+    @property
+    def board(self):
+        nr = self.num_rows
+        return [
+            [t or None for t in self.cells[c * nr:(c + 1) * nr]]
+            for c in range(self.num_cols)
+        ]
+
+
+    """
+        Can this column accept more tokens?
+        Input:
+            column: int, column number (1-indexed)
+        Return: boolean
+            True - if yes
+            False - if full, or column does not exist
+    """
+    def can_drop(self, column):
+        if column <= 0 or column > self.num_cols:
+            return False
+        # if the top cell is empty, there is still capacity
+        return not self.cells[column * self.num_rows - 1]
+
+
+    """
+        Drop a token into a column. NOTE: token must be an int in 1..255.
+        Input:
+            column: int, column number (1-indexed)
+            token: int, 1..255
+        Return: boolean
+            row - row-position of the token, if success
+            None - if could not drop
+    """
+    def drop_token(self, column, token):
+        if not self.can_drop(column):
+            return None
+
+        start = (column - 1) * self.num_rows
+        cell = self.cells.index(0, start)
+        self.cells[cell] = token
+        return cell - start + 1
+
+
+    def _run(self, token, column, row, dc, dr):
+        # tokens in a row from (column, row) in direction (dc, dr), not counting that cell. 0-indexed
+        nc, nr, cells = self.num_cols, self.num_rows, self.cells
+        run = 0
+        column, row = column + dc, row + dr
+        while 0 <= column < nc and 0 <= row < nr and cells[column * nr + row] == token:
+            run += 1
+            column, row = column + dc, row + dr
+        return run
+
+
+    """
+        Check if the token at a specific position is part of a winning run of 4 (col, row or diagonals)
+        Input:
+            column: int, 1-indexed column position
+            row: int, 1-indexed row position
+        Return:
+            True, if a winner
+            False, if not a winner
+    """
+    def check_win(self, column, row):
+        column -= 1
+        row -= 1
+        token = self.cells[column * self.num_rows + row]
+        if not token:
+            return False
+
+        # like GameBoard, a column only counts from this token down
+        runs = (
+            self._run(token, column, row, 0, -1),
+            self._run(token, column, row, -1, 0) + self._run(token, column, row, 1, 0),
+            self._run(token, column, row, -1, -1) + self._run(token, column, row, 1, 1),
+            self._run(token, column, row, -1, 1) + self._run(token, column, row, 1, -1),
+        )
+        return max(runs) + 1 >= self.WINNING_RUN
+
+
+    """
+        Can anybody still win? This engine doesn't track blocked lines, so only a full board says no.
+    """
+    def win_possible(self):
+        return 0 in self.cells
+
+
+    """
+        Compact snapshot of the board, for persisting between moves. Same format as GameBoard.snapshot(),
+        which is how this engine keeps its cells anyway.
+    """
+    def snapshot(self):
+        return bytes(self.cells), [ self._height(c) for c in range(self.num_cols) ]
+
+
+    """
+        Rebuild a board from a snapshot() taken on a board of the same dimensions.
+    """
+    @classmethod
+    def from_snapshot(cls, num_cols, num_rows, cells, heights):
+        cb = cls(num_cols, num_rows)
+        cb.cells[:] = cells
+        return cb
+
+
+    """
+        Independent copy of this board, so one can be changed without affecting the other.
+    """
+    def copy(self):
+        cb = type(self)(self.num_cols, self.num_rows)
+        cb.cells[:] = self.cells
+        return cb
+
+
+# Board engines a game can be played on, selected per game by name (see GameModel.engine).
+ENGINES = {
+    'list': GameBoard,
+    'bitboard': BitBoard,
+    'lines': LineBoard,
+    'compact': CompactBoard,
+}
+DEFAULT_ENGINE = 'list'
+
+
+def new_board(num_cols, num_rows, engine=None):
+    """
+        Build an empty board using the named engine (defaults to DEFAULT_ENGINE).
+    """
+    return ENGINES[engine or DEFAULT_ENGINE](num_cols, num_rows)
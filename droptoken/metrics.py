@@ -0,0 +1,135 @@
+# In-process request timing, aggregated into per-endpoint, per-stage histograms and
+# rendered in the Prometheus text format on /metrics (see app.py).
+# Stages are timed with `with timer('stage'):` around the hot spots (parsing, db reads,
+# board work, win checks, writes). When metrics are disabled, timer() hands back a shared
+# no-op context manager, so instrumented code costs one flag check per stage.
+from threading import Lock
+from time import perf_counter
+
+from flask import has_request_context, request
+
+# upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram(object):
+    """
+        Cumulative-bucket histogram of durations, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def snapshot(self):
+        """
+            Return: (cumulative counts per bucket, count, sum)
+        """
+        with self._lock:
+            cumulative, total = [], 0
+            for c in self.counts:
+                total += c
+                cumulative.append(total)
+            return cumulative, self.count, self.sum
+
+
+class _Timer(object):
+    __slots__ = ('metrics', 'endpoint', 'stage', 'start')
+
+    def __init__(self, metrics, endpoint, stage):
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.endpoint, self.stage, perf_counter() - self.start)
+        return False
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.histograms = {}
+        self._lock = Lock()
+
+    def observe(self, endpoint, stage, seconds):
+        key = (endpoint, stage)
+        hist = self.histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(key, Histogram(self.buckets))
+        hist.observe(seconds)
+
+    def timer(self, stage, endpoint=None):
+        """
+            Context manager timing a stage of the current request.
+            The endpoint defaults to the Flask endpoint handling the request.
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        if endpoint is None:
+            endpoint = request.endpoint if has_request_context() else 'none'
+        return _Timer(self, endpoint, stage)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def render(self, extra_counters=()):
+        """
+            Prometheus text exposition of all histograms.
+            extra_counters: iterable of (name, help, value) for plain counters/gauges to append.
+        """
+        name = 'droptoken_request_stage_seconds'
+        lines = [
+            f'# HELP {name} Time spent in each stage of handling a request.',
+            f'# TYPE {name} histogram',
+        ]
+        for (endpoint, stage), hist in sorted(self.histograms.items()):
+            labels = f'endpoint="{endpoint}",stage="{stage}"'
+            cumulative, count, total = hist.snapshot()
+            for bound, c in zip(hist.buckets, cumulative):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {c}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+
+        for counter, help_text, value in extra_counters:
+            lines.append(f'# HELP {counter} {help_text}')
+            lines.append(f'# TYPE {counter} {"counter" if counter.endswith("_total") else "gauge"}')
+            lines.append(f'{counter} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+# shared by the whole process. Switched on/off with METRICS_ENABLED in app.py
+metrics = Metrics()
+timer = metrics.timer
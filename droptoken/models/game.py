@@ -1,6 +1,8 @@
 from datetime import datetime
-from flask_mongoengine import Document
+from bson import Binary
 import mongoengine as me
+from droptoken.logic import ENGINES, DEFAULT_ENGINE
+from droptoken.packing import can_pack, pack_moves, unpack_moves
 
 STATE_CHOICES = ['IN_PROGRESS', 'DONE']
 MOVE_CHOICES = ['MOVE', 'QUIT']
@@ -8,6 +10,8 @@ MOVE_CHOICES = ['MOVE', 'QUIT']
 class PlayerModel(me.EmbeddedDocument):
     token = me.IntField(required=True)
     name = me.StringField(max_length=50, required=True)
+    # played by the server (droptoken.solver), see resources.moves.play_ai_move
+    is_ai = me.BooleanField(default=False)
     # has_quit = me.BooleanField(choices=[True])  # possibly useful if more than 2 players
 
 
@@ -18,7 +22,15 @@ class MoveModel(me.EmbeddedDocument):
     column = me.IntField()
 
 
-class GameModel(Document):
+class GameModel(me.Document):
+    meta = {
+        # GameList.get filters on these and pages through results in _id order
+        'indexes': [
+            ('state', 'id'),
+            ('players.name', 'id'),
+        ],
+    }
+
     players = me.EmbeddedDocumentListField(PlayerModel, required=True)
     num_rows = me.IntField(required=True)
     num_cols = me.IntField(required=True)
@@ -26,5 +38,64 @@ class GameModel(Document):
     winner = me.StringField(max_length=50, null=True)
     current_token = me.IntField(required=True, default=1)
     moves = me.EmbeddedDocumentListField(MoveModel, default=[])
-     # can possibly use this with save_condition: http://docs.mongoengine.org/apireference.html#mongoengine.Document.save
+    engine = me.StringField(max_length=20, choices=list(ENGINES), default=DEFAULT_ENGINE)
+    # board snapshot, kept up to date on every move so we don't have to replay `moves`.
+    # See GameBoard.snapshot() for the format. Games created before this was added have
+    # no snapshot until they're backfilled (see droptoken.boards.backfill_snapshots).
+    board_cells = me.BinaryField(null=True)
+    heights = me.ListField(me.IntField(), null=True)
+    # `moves`, one byte each (see droptoken.packing). Games that can be packed are stored with
+    # this instead of `moves`; it's unpacked into `moves` on load, so the rest of the code only
+    # ever sees `moves`. Games stored before this existed are packed on their next write.
+    packed_moves = me.BinaryField(null=True)
+    # bumped on every write. Moves are written conditionally on it (see storage.mongo.move_update),
+    # and cached copies of the game use it to tell they're stale.
+    version = me.IntField(required=True, default=0)
     last_modified = me.DateTimeField(required=True, default=datetime.utcnow) 
+
+    @classmethod
+    def _from_son(cls, son, *args, **kwargs):
+        packed = son.get('packed_moves')
+        # partial loads without the players can't name the movers, leave them packed
+        if packed is not None and 'players' in son:
+            son = dict(son)
+            son['moves'] = unpack_move_docs(packed, son['players'])
+        return super()._from_son(son, *args, **kwargs)
+
+    def to_mongo(self, *args, **kwargs):
+        son = super().to_mongo(*args, **kwargs)
+        if 'moves' in son:
+            packed = self.pack_moves()
+            if packed is not None:
+                del son['moves']
+                son['packed_moves'] = Binary(packed)
+        return son
+
+    """
+        Return: bytes, this game's moves packed one byte each, or None if this game can't be packed
+    """
+    def pack_moves(self):
+        if not can_pack(len(self.players), self.num_cols):
+            return None
+        tokens = { p.name: p.token for p in self.players }
+        return pack_moves(
+            (tokens[m.player_name], m.column if m.move_type == 'MOVE' else None)
+            for m in self.moves
+        )
+
+
+def unpack_move_docs(packed, players, first_turn=1):
+    """
+        Packed moves back into MoveModel documents, as they'd be stored in `moves`.
+        Input: packed - GameModel.packed_moves (or a slice of it, starting at turn `first_turn`)
+               players - the game's players (documents)
+    """
+    names = { p['token']: p['name'] for p in players }
+    docs = []
+    for turn, (token, column) in enumerate(unpack_moves(packed), start=first_turn):
+        doc = { 'turn': turn, 'move_type': 'MOVE', 'player_name': names[token], 'column': column }
+        if column is None:
+            doc['move_type'] = 'QUIT'
+            del doc['column']
+        docs.append(doc)
+    return docs
@@ -0,0 +1,157 @@
+# Export and import of games as NDJSON, one game per line, for bulk analytics and for seeding
+# test environments. Both stream: games are read from the store in batches (server-side cursors
+# for MongoDB, see GameStore.iter_games) and written to the store in batches (create_games, one
+# insert per batch), so memory use doesn't grow with the number of games.
+#
+# A line is the game as the API shows it, plus what's needed to recreate it:
+#   {"gameId": "...", "players": ["p1", "p2"], "ai_players": [], "columns": 7, "rows": 6,
+#    "engine": "list", "state": "DONE", "winner": "p1",
+#    "moves": [{"type": "MOVE", "player": "p1", "column": 4}, ...]}
+# On import, lines are checked with the same rules as POST /drop-token and their moves are
+# replayed like the API plays them: state and winner must be what the moves led to, and nothing
+# can be played once the game is over. Games get new ids (gameId is ignored), so a file can be
+# imported more than once.
+import json
+
+from werkzeug.exceptions import HTTPException
+
+from droptoken.boards import store_board
+from droptoken.logic import new_board
+from droptoken.models.game import GameModel, PlayerModel, STATE_CHOICES
+from droptoken.resources.game import check_players, post_schema
+from droptoken.resources.moves import format_move
+from droptoken.validation import Field, Invalid, Schema
+
+# games per read from, or write to, the store
+BATCH_SIZE = 1000
+
+record_schema = Schema('json', *post_schema.fields,
+    Field('state', default='IN_PROGRESS', choices=STATE_CHOICES,
+        help='Game state must be one of: ' + ', '.join(STATE_CHOICES) + '. Error: {error_msg}'),
+    Field('winner',
+        help='Name of the player who won, or null. Error: {error_msg}'),
+    Field('moves', type=dict, many=True, default=[],
+        help='Moves, in order, must be a list of {{"type": "MOVE"/"QUIT", "player": name, "column": number}}. Error: {error_msg}'),
+)
+
+
+def game_record(game):
+    """
+        Input: GameModel
+        Return: the game's NDJSON line, as a dict
+    """
+    return {
+        'gameId': str(game.id),
+        'players': [ p.name for p in game.players ],
+        'ai_players': [ p.name for p in game.players if p.is_ai ],
+        'columns': game.num_cols,
+        'rows': game.num_rows,
+        'engine': game.engine,
+        'state': game.state,
+        'winner': game.winner,
+        'moves': [ format_move(m) for m in game.moves ],
+    }
+
+
+def export_lines(games):
+    """
+        Input: iterable of GameModels, e.g. GameStore.iter_games()
+        Yield: one NDJSON line (str, with its newline) per game
+    """
+    for game in games:
+        yield json.dumps(game_record(game), separators=(',', ':')) + '\n'
+
+
+def game_from_record(record):
+    """
+        Input: a parsed NDJSON line
+        Return: a new, not yet stored GameModel with its board snapshot
+        Raises Invalid if the line doesn't describe a valid game.
+    """
+    args = record_schema.parse(record)
+    try:
+        check_players(args)
+    except HTTPException as e:
+        raise Invalid(e.data['message'])
+    if args['winner'] is not None and args['winner'] not in args['players']:
+        raise Invalid(f"Winner {args['winner']} is not one of the players. Received {args['players']}")
+    if args['winner'] is not None and args['state'] != 'DONE':
+        raise Invalid(f"Only a DONE game can have a winner. Received {args['state']}")
+
+    g = GameModel(
+        players=[
+            PlayerModel(token=i, name=name, is_ai=name in args['ai_players'])
+            for i, name in enumerate(args['players'], start=1)
+        ],
+        num_cols=args['columns'],
+        num_rows=args['rows'],
+        engine=args['engine'],
+        state=args['state'],
+        winner=args['winner'],
+    )
+    tokens = { p.name: p.token for p in g.players }
+    gb = new_board(g.num_cols, g.num_rows, g.engine)
+    # what the moves lead to, decided like resources.moves does
+    state, winner = 'IN_PROGRESS', None
+    for turn, move in enumerate(args['moves'], start=1):
+        move = move or {}
+        if g.moves and g.moves[-1].move_type == 'QUIT':
+            raise Invalid(f"Move {turn} comes after a QUIT.")
+        if state == 'DONE':
+            raise Invalid(f"Move {turn} comes after the end of the game.")
+        player, move_type = move.get('player'), move.get('type', 'MOVE')
+        if player not in tokens:
+            raise Invalid(f"Move {turn}: player {player} is not one of the players. Received {args['players']}")
+        if move_type == 'QUIT':
+            g.moves.create(turn=turn, move_type='QUIT', player_name=player)
+            state, winner = 'DONE', next(name for name in tokens if name != player)
+            continue
+        if move_type != 'MOVE':
+            raise Invalid(f"Move {turn}: type must be MOVE or QUIT. Received {move_type}")
+        column = move.get('column')
+        row = gb.drop_token(column, tokens[player]) if isinstance(column, int) else None
+        if row is None:
+            raise Invalid(f"Move {turn}: illegal move. Unable to drop token in column {column}")
+        g.moves.create(turn=turn, move_type='MOVE', player_name=player, column=column)
+        if gb.check_win(column, row):
+            state, winner = 'DONE', player
+        elif not gb.win_possible():
+            state = 'DONE'
+
+    if (args['state'], args['winner']) != (state, winner):
+        raise Invalid(f"State and winner don't match the moves, expected {state} and {winner}. Received {args['state']} and {args['winner']}")
+
+    # players take turns in token order
+    order = sorted(tokens.values())
+    g.current_token = order[len(g.moves) % len(order)]
+    store_board(g, gb)
+    return g
+
+
+def import_lines(lines, store, batch_size=BATCH_SIZE):
+    """
+        Store the games of an NDJSON export as new games, `batch_size` games per write.
+        Input: iterable of lines (str or bytes), e.g. an open file
+        Yield: number of games stored, per batch
+        Raises Invalid, keyed by the (1-indexed) line number, at the first bad line;
+        the batches before it are already stored.
+    """
+    batch = []
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise Invalid({ str(line_no): f"Malformed JSON. Error: {e}" })
+        try:
+            batch.append(game_from_record(record))
+        except Invalid as e:
+            raise Invalid({ str(line_no): e.message })
+        if len(batch) >= batch_size:
+            store.create_games(batch)
+            yield len(batch)
+            batch = []
+    if batch:
+        store.create_games(batch)
+        yield len(batch)
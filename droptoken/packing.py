@@ -0,0 +1,78 @@
+# Compact storage for moves: a game's moves as one byte each, instead of an embedded document
+# (turn, move type, player name, column) per move.
+#
+#   bit 7     player: 0 for token 1, 1 for token 2
+#   bits 0-6  column (1-indexed), or 0 for a QUIT
+#
+# The turn is the position in the byte string (+1), so it isn't stored at all.
+# Only 2-player games with at most MAX_COLUMN columns can be packed.
+
+MAX_COLUMN = 0x7f
+PLAYER_BIT = 0x80
+QUIT = 0
+
+
+def can_pack(num_players, num_cols):
+    return num_players == 2 and num_cols <= MAX_COLUMN
+
+
+"""
+    Encode one move.
+    Input:
+        token: 1 or 2
+        column: int, 1-indexed column, or None for a QUIT
+    Return: int, 0-255
+"""
+def pack_move(token, column):
+    if column is None:
+        column = QUIT
+    elif not 0 < column <= MAX_COLUMN:
+        raise ValueError(f"Column {column} can't be packed")
+    if token not in (1, 2):
+        raise ValueError(f"Token {token} can't be packed")
+    return (PLAYER_BIT if token == 2 else 0) | column
+
+
+"""
+    Decode one move.
+    Input:
+        byte: int, as returned by pack_move
+    Return: (token, column), column is None for a QUIT
+"""
+def unpack_move(byte):
+    token = 2 if byte & PLAYER_BIT else 1
+    column = byte & MAX_COLUMN
+    return token, (column if column != QUIT else None)
+
+
+"""
+    Input:
+        moves: List( (token, column), ... ), column None for a QUIT
+    Return: bytes, one per move
+"""
+def pack_moves(moves):
+    return bytes(pack_move(token, column) for token, column in moves)
+
+
+"""
+    Input:
+        data: bytes, as returned by pack_moves
+    Return: List( (token, column), ... )
+"""
+def unpack_moves(data):
+    return [ unpack_move(b) for b in data ]
+
+
+# byte -> its column, QUIT for a QUIT
+COLUMNS = bytes(b & MAX_COLUMN for b in range(256))
+
+
+"""
+    The columns played, without unpacking the moves. A QUIT can only be the last move and
+    isn't played on the board, so it's left out.
+    Input:
+        data: bytes, as returned by pack_moves
+    Return: bytes, one column per move
+"""
+def packed_columns(data):
+    return data.translate(COLUMNS).rstrip(bytes((QUIT,)))
@@ -0,0 +1,44 @@
+from flask import Response, request, stream_with_context
+from flask_restful import Resource, abort
+from droptoken.ndjson import export_lines, import_lines
+from droptoken.storage import get_store
+from droptoken.validation import Invalid
+
+
+class GameExport(Resource):
+    def get(self):
+        """
+            Every game, archived ones too, as NDJSON: one line per game with its players,
+            dimensions, state, winner and moves (see droptoken/ndjson.py for the format).
+            The response is streamed, games are read from the store a batch at a time.
+            Output (application/x-ndjson):
+                {"gameId": "...", "players": ["player1", "player2"], "columns": 4, "rows": 4, "state": "DONE", "winner": "player1", "moves": [...], ...}
+                {"gameId": "...", ...}
+            Status codes
+                • 200 - OK. On success
+        """
+        lines = export_lines(get_store().iter_games())
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+
+class GameImport(Resource):
+    def post(self):
+        """
+            Create games from an NDJSON export (as new games, with new ids). The body is read
+            line by line and stored a batch at a time, so it can be as big as needed.
+            Input (application/x-ndjson): lines as returned by GET /drop-token/export
+            Output:
+                { "imported": 1000 }
+            Status codes
+                • 200 - OK. On success
+                • 400 - Malformed line. "message" is keyed by its line number, and "imported" is
+                        the number of games stored before it, e.g.
+                        { "message": { "3": "Player names must be unique. Received ['a', 'a']" }, "imported": 0 }
+        """
+        count = 0
+        try:
+            for stored in import_lines(request.stream, get_store()):
+                count += stored
+        except Invalid as e:
+            abort(400, message=e.message, imported=count)
+        return { "imported": count }
@@ -1,45 +1,158 @@
-from flask_restful import Resource, reqparse, abort
-from droptoken.models.game import GameModel, PlayerModel
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask_restful import Resource, abort
+from droptoken.models.game import GameModel, PlayerModel, STATE_CHOICES
+from droptoken.logic import ENGINES, DEFAULT_ENGINE, new_board
+from droptoken.boards import store_board
+from droptoken.resources.moves import play_ai_move
+from droptoken.storage import get_store
+from droptoken.metrics import timer
+from droptoken.validation import Field, Invalid, Schema, between, max_length
 from mongoengine.errors import DoesNotExist, ValidationError
+from werkzeug.exceptions import HTTPException
 
 
-# we get input type validation and 400s for free with reqparse
-# TODO: add more strict validation on params (player names unique, #players == 2 and #rows/cols == 4)
-post_parser = reqparse.RequestParser()
-post_parser.add_argument(
-    'players', dest='players', action='append',
-    location='json', required=True,
-    help='Names of the players participating in the game must be a list of strings. Error: {error_msg}',
+# board size limits: a game keeps its board in memory (and a snapshot in every stored copy),
+# so pathological boards are rejected up front
+MIN_BOARD_SIZE = 4
+MAX_BOARD_SIZE = 64
+# same as the max_length of PlayerModel.name
+MAX_NAME_LENGTH = 50
+
+post_schema = Schema('json',
+    Field('players', many=True, required=True, check=max_length(MAX_NAME_LENGTH),
+        help='Names of the players participating in the game must be a list of strings. Error: {error_msg}'),
+    Field('columns', type=int, required=True, check=between(MIN_BOARD_SIZE, MAX_BOARD_SIZE),
+        help='Number of columns on the game board must be >= 4. Error: {error_msg}'),
+    Field('rows', type=int, required=True, check=between(MIN_BOARD_SIZE, MAX_BOARD_SIZE),
+        help='Number of rows on the game board must be >= 4. Error: {error_msg}'),
+    Field('engine', default=DEFAULT_ENGINE, choices=ENGINES,
+        help='Board engine must be one of: ' + ', '.join(ENGINES) + '. Error: {error_msg}'),
+    Field('ai_players', many=True, default=[],
+        help='Names of the players the server plays for must be a list of strings. Error: {error_msg}'),
 )
-post_parser.add_argument(
-    'columns', dest='columns',
-    type=int, location='json', required=True,
-    help='Number of columns on the game board must be >= 4. Error: {error_msg}',
+
+
+# max number of games per GameBulk.post
+MAX_BULK_GAMES = 10000
+# an AI that goes first searches for its move when the game is created, up to 10000 searches
+# in one request is too much: games with AI players are created one at a time
+BULK_AI_PLAYERS_MESSAGE = "AI players can't be set in bulk, create their games with POST /drop-token. Received {}"
+
+bulk_post_schema = Schema('json',
+    Field('games', type=dict, many=True, required=True,
+        help='Games to create must be a list of {{"players": [names], "columns": number, "rows": number}}. Error: {error_msg}'),
 )
-post_parser.add_argument(
-    'rows', dest='rows',
-    type=int, location='json', required=True,
-    help='Number of rows on the game board must be >= 4. Error: {error_msg}',
+
+
+# page size limits for GameList.get
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+list_get_schema = Schema('args',
+    Field('limit', type=int, default=DEFAULT_PAGE_SIZE,
+        help=f'Max number of games to return, 1 to {MAX_PAGE_SIZE}. Error: {{error_msg}}'),
+    Field('after',
+        help='Game id to continue listing after (the "next" value of the previous page). Error: {error_msg}'),
+    Field('state', choices=STATE_CHOICES,
+        help='Game state must be one of: ' + ', '.join(STATE_CHOICES) + '. Error: {error_msg}'),
+    Field('player',
+        help='Only list games this player takes part in. Error: {error_msg}'),
 )
 
 
+def check_players(args):
+    """
+        Input: arguments parsed with post_schema
+        Aborts with a 400 if the players don't make a game.
+    """
+    #players == 2
+    num_players = len(args['players'])
+    if num_players != 2:
+        abort(400, message=f"The game can only support 2 players at this time. Received {num_players}")
+
+    #player names unique 
+    if args['players'][0] == args['players'][1]:
+        abort(400, message=f"Player names must be unique. Received {args['players']}")
+
+    # AI players must be in the game, and somebody has to be left to play against them
+    ai_players = args['ai_players']
+    for name in ai_players:
+        if name not in args['players']:
+            abort(400, message=f"AI player {name} is not one of the players. Received {args['players']}")
+    if all(name in ai_players for name in args['players']):
+        abort(400, message=f"At least one player must not be an AI. Received {ai_players}")
+
+
+def new_game(args):
+    """
+        Input: arguments parsed with post_schema, that passed check_players()
+        Return: a new, not yet stored GameModel with its board snapshot
+    """
+    player_list = [
+        PlayerModel(
+            token=i,
+            name=name,
+            is_ai=name in args['ai_players']
+        )
+        for i, name in enumerate(args['players'], start=1)
+    ]
+
+    g = GameModel(
+        players=player_list,
+        num_cols=args['columns'],
+        num_rows=args['rows'],
+        engine=args['engine']
+    )
+    gb = new_board(g.num_cols, g.num_rows, g.engine)
+    # an AI going first makes its move right away
+    play_ai_move(g, gb)
+    store_board(g, gb)
+    return g
+
+
 class GameList(Resource):
     def get(self):
         """
+            Optional Query parameters: GET /drop-token?limit=100&after={gameId}&state=DONE&player=player1
+                Games are listed in id order, one page at a time. Pass "next" from the previous page
+                as `after` to get the following page; "next" is null on the last page.
             Output
-                { "games" : ["gameid1", "gameid2"] }
+                { "games" : ["gameid1", "gameid2"], "next": "gameid2" }
             Status codes
                 • 200 - OK. On success
+                • 400 - Malformed request
         """
-        res = [str(r.id) for r in GameModel.objects]
-        return { "games": res}
+        with timer('parse'):
+            args = list_get_schema.parse_request()
+
+        limit = args['limit']
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            abort(400, message=f"limit must be between 1 and {MAX_PAGE_SIZE}. Received {limit}")
+
+        after = None
+        if args['after'] is not None:
+            try:
+                after = ObjectId(args['after'])
+            except (InvalidId, TypeError):
+                abort(400, message=f"after must be a game id. Received {args['after']}")
+
+        res = get_store().list_game_ids(limit, after=after, state=args['state'], player=args['player'])
+        return {
+            "games": res,
+            "next": res[-1] if len(res) == limit else None,
+        }
    
     def post(self):
         """
             Input:
                 { "players": ["player1", "player2"],
                 "columns": 4,
-                "rows": 4
+                "rows": 4,
+                "engine": "list",   # optional, one of logic.ENGINES. "lines" suits big boards,
+                                    # and ends a game as a draw as soon as nobody can win.
+                                    # "compact" takes the least memory per live game
+                "ai_players": ["player2"]   # optional, players the server plays for
                 }
             Output:
                 { "gameId": "some_string_token"}
@@ -47,33 +160,56 @@ class GameList(Resource):
                 • 200 - OK. On success
                 • 400 - Malformed request 
         """    
-        args = post_parser.parse_args()
-
-        #players == 2
-        num_players = len(args['players'])
-        if num_players != 2:
-            abort(400, message=f"The game can only support 2 players at this time. Received {num_players}")
-
-        #player names unique 
-        if args['players'][0] == args['players'][1]:
-            abort(400, message=f"Player names must be unique. Received {args['players']}")
-        
-        player_list = [
-            PlayerModel(
-                token=i,
-                name=name
-            )
-            for i, name in enumerate(args['players'], start=1)
-        ]
-
-        g = GameModel(
-            players=player_list,
-            num_cols=args['columns'],
-            num_rows=args['rows']
-        )
-        g.save()
+        with timer('parse'):
+            args = post_schema.parse_request()
+        check_players(args)
+
+        g = new_game(args)
+        get_store().create_game(g)
         return { "gameId": f"{g.id}"}
 
+class GameBulk(Resource):
+    def post(self):
+        """
+            Create many games at once (tournaments, load tests). Every game is checked first,
+            with the same rules as POST /drop-token; if any is malformed, none is created.
+            Games can't have AI players.
+            Input:
+                {
+                "games": [      # up to MAX_BULK_GAMES, same fields as POST /drop-token
+                    { "players": ["player1", "player2"], "columns": 4, "rows": 4 },
+                    { "players": ["player3", "player4"], "columns": 7, "rows": 6, "engine": "bitboard" }
+                ]
+                }
+            Output:
+                { "gameIds": ["some_string_token", "another_string_token"] }    # in the same order
+            Status codes
+                • 200 - OK. On success
+                • 400 - Malformed request. "message" is keyed by the index of the first bad game,
+                        e.g. { "message": { "1": "Player names must be unique. Received ['a', 'a']" } }
+        """
+        with timer('parse'):
+            specs = bulk_post_schema.parse_request()['games']
+            if len(specs) > MAX_BULK_GAMES:
+                abort(400, message=f"At most {MAX_BULK_GAMES} games can be created at once. Received {len(specs)}")
+
+            games = []
+            for i, spec in enumerate(specs):
+                try:
+                    args = post_schema.parse(spec)
+                    check_players(args)
+                    if args['ai_players']:
+                        abort(400, message=BULK_AI_PLAYERS_MESSAGE.format(args['ai_players']))
+                except Invalid as e:
+                    abort(400, message={ str(i): e.message })
+                except HTTPException as e:
+                    abort(400, message={ str(i): e.data['message'] })
+                games.append(args)
+
+        games = [ new_game(args) for args in games ]
+        get_store().create_games(games)
+        return { "gameIds": [ f"{g.id}" for g in games ] }
+
 class GameDetail(Resource):
     def get(self, game_id):
         """
@@ -88,7 +224,7 @@ class GameDetail(Resource):
         """
         # get the game object
         try:
-            g = GameModel.objects(id=game_id).get()
+            g, _ = get_store().get_live_game(game_id)
         except (DoesNotExist, ValidationError) :
             abort(404, message=f"Game {game_id} not found.")
 
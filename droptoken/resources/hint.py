@@ -0,0 +1,79 @@
+from flask_restful import Resource, inputs, abort
+from droptoken.analysis import parallel_solver
+from droptoken.book import book
+from droptoken.storage import get_store
+from droptoken.solver import WIN_BOUND, solver
+from droptoken.metrics import timer
+from droptoken.validation import Field, Schema, finite
+from mongoengine.errors import DoesNotExist, ValidationError
+
+# upper bound on the time_limit a client can ask for, in seconds
+MAX_HINT_TIME = 5
+
+hint_get_schema = Schema('args',
+    # float() takes "nan" and "inf", which would leave the search without a deadline
+    Field('time_limit', type=float, check=finite,
+        help=f'How long to search for a move, in seconds (max {MAX_HINT_TIME}). Error: {{error_msg}}'),
+    Field('deep', type=inputs.boolean, default=False,
+        help='Search on all CPU cores, for longer. Error: {error_msg}'),
+)
+
+def outcome(score):
+    if score > WIN_BOUND:
+        return 'WIN'
+    if score < -WIN_BOUND:
+        return 'LOSS'
+    return None
+
+
+class GameHint(Resource):
+    def get(self, game_id):
+        """
+            Suggest a move for the player whose turn it is.
+            Optional Query parameters: GET /drop-token/{gameId}/hint?time_limit=0.5&deep=true
+                time_limit: max seconds to search (defaults to the server's SOLVER_TIME_LIMIT,
+                            or SOLVER_DEEP_TIME_LIMIT for deep hints)
+                deep: search in parallel on all CPU cores (see droptoken/analysis.py)
+            Output:
+                {
+                "player": "player1",    # whose turn it is
+                "column": 4,
+                "score": 12,            # > 0 is good for "player", < 0 is good for the opponent
+                "outcome": "WIN",       # "WIN"/"LOSS" if the search proved it, otherwise null
+                "depth": 8              # how many moves ahead the search looked (positions in the
+                                        # opening book were searched ahead of time)
+                }
+            Status codes:
+                • 200 - OK. On success
+                • 400 - Malformed request
+                • 404 - Game not found
+                • 410 - Game is already in DONE state.
+        """
+        with timer('parse'):
+            args = hint_get_schema.parse_request()
+        time_limit = args['time_limit']
+        if time_limit is not None:
+            time_limit = min(max(time_limit, 0.001), MAX_HINT_TIME)
+
+        try:
+            g, gb = get_store().get_live_game(game_id)
+        except (DoesNotExist, ValidationError) :
+            abort(404, message=f"Game {game_id} not found.")
+
+        if g.state == 'DONE':
+            abort(410, message=f"The game is already DONE.")
+
+        # the live board is shared, the solver only reads it
+        with timer('solve'):
+            result = book.lookup(gb, g.current_token)
+            if result is None:
+                search = parallel_solver if args['deep'] else solver
+                result = search.solve(gb, g.current_token, time_limit=time_limit)
+
+        return {
+            'player': next(p.name for p in g.players if p.token == g.current_token),
+            'column': result.column,
+            'score': result.score,
+            'outcome': outcome(result.score),
+            'depth': result.depth,
+        }
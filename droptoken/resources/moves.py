@@ -1,26 +1,27 @@
-from flask_restful import Resource, reqparse, abort
-from droptoken.models.game import GameModel, PlayerModel, MoveModel
-from droptoken.logic import GameBoard
+from flask_restful import Resource, abort
+from droptoken.storage import get_store
+from droptoken.metrics import timer
+from droptoken.book import book
+from droptoken.solver import solver
+from droptoken.validation import Field, Schema
 from mongoengine.errors import DoesNotExist, ValidationError
 
 
-move_list_get_parser = reqparse.RequestParser()
-move_list_get_parser.add_argument(
-    'start', dest='start', default=0,
-    type=int, location='args',
-    help='Which move number to start with. Error: {error_msg}',
+move_list_get_schema = Schema('args',
+    Field('start', type=int, default=0,
+        help='Which move number to start with. Error: {error_msg}'),
+    Field('until', type=int, default=-1,
+        help='Which move number to end with. Error: {error_msg}'),
 )
-move_list_get_parser.add_argument(
-    'until', dest='until', default=-1,
-    type=int, location='args',
-    help='Which move number to end with. Error: {error_msg}',
+
+moves_batch_post_schema = Schema('json',
+    Field('moves', type=dict, many=True, required=True,
+        help='Moves to play, in order, must be a list of {{"player": name, "column": number}}. Error: {error_msg}'),
 )
 
-moves_post_parser = reqparse.RequestParser()
-moves_post_parser.add_argument(
-    'column', dest='column',
-    type=int, location='json', required=True,
-    help='Number of the column to drop the token into. Error: {error_msg}',
+moves_post_schema = Schema('json',
+    Field('column', type=int, required=True,
+        help='Number of the column to drop the token into. Error: {error_msg}'),
 )
 
 def get_next_token(token_list, current_token):
@@ -34,31 +35,79 @@ def get_next_token(token_list, current_token):
     return token_list[next_i]
 
 
-def get_matching_moves(game, start, until):
-    # get the matching moves, filter locally
-    moves_tuples_list = [
-        (
-            m.turn ,  # we will sort by this key
-            ({
-                'type': m.move_type,
-                'player': m.player_name,
-                'column': m.column
-            } 
-            if m.move_type == 'MOVE' 
-            else {
-                'type': m.move_type,
-                'player': m.player_name,
-            })
-        ) 
-        for m in game.moves
-        if m.turn >= start and m.turn <= until
-    ]
-
-    # display, in order (sort, just in case);
-    def compare_key(item):
-        return item[0]
-    moves_tuples_list.sort(key=compare_key)
-    return [ move for _, move in moves_tuples_list]
+def play_move(game, board, player, column):
+    """
+        Drop the player's token into a column, record the move on the game, update the winner/state
+        and pass the turn on. The move must be legal (board.can_drop(column)).
+        Only changes the game and board in memory, nothing is saved.
+        Return: the new MoveModel
+    """
+    with timer('drop_token'):
+        row = board.drop_token(column, player.token)
+
+    with timer('check_win'):
+        won = board.check_win(column, row)
+
+    if won:
+        game.state = 'DONE'
+        game.winner = player.name
+    # can also be done if board is full, or (for engines that can tell) nobody can win anymore
+    elif not board.win_possible():
+        game.state = 'DONE'
+        game.winner = None
+
+    move_number = game.moves.count() + 1
+    m = game.moves.create(turn=move_number, move_type='MOVE', player_name=player.name, column=column)
+
+    token_list = [ p.token for p in game.players ]
+    game.current_token = get_next_token(token_list, player.token)
+    return m
+
+
+def play_ai_move(game, board):
+    """
+        If it's an AI player's turn, pick its move (from the opening book, or with the solver)
+        and play it (see play_move).
+        Return: the new MoveModel, or None if it's not an AI player's turn or the game is over
+    """
+    if game.state == 'DONE':
+        return None
+    p = next((p for p in game.players if p.token == game.current_token), None)
+    if p is None or not p.is_ai:
+        return None
+
+    with timer('solve'):
+        result = book.lookup(board, p.token) or solver.solve(board, p.token)
+    if result.column is None:
+        return None
+    return play_move(game, board, p, result.column)
+
+
+# $slice needs a count, this stands in for "all the rest"
+ALL_MOVES = 2**31 - 1
+
+
+def format_move(m):
+    return (
+        {
+            'type': m.move_type,
+            'player': m.player_name,
+            'column': m.column
+        } 
+        if m.move_type == 'MOVE' 
+        else {
+            'type': m.move_type,
+            'player': m.player_name,
+        }
+    )
+
+
+def get_matching_moves(game_id, skip, limit):
+    """
+        Fetch up to `limit` moves of a game, starting at the 0-indexed move `skip`.
+        Raises DoesNotExist/ValidationError if the game can't be found.
+    """
+    return [ format_move(m) for m in get_store().get_moves(game_id, skip, limit) ]
 
 
 class Moves(Resource):
@@ -88,25 +137,25 @@ class Moves(Resource):
         if player_id != 'moves':
             abort(404, message=f"URL /drop_token/{game_id}/{player_id} not found.")
 
-        # get the game object
+        with timer('parse'):
+            args = move_list_get_schema.parse_request()
+
+        # get the correct boundaries (0-indexed, `until` is inclusive, -1 means all)
+        skip = max(args['start'], 0)
+        limit = args['until'] - skip + 1 if args['until'] > -1 else ALL_MOVES
+
+        # get the matching moves. We still fetch one move for an empty range, to tell whether
+        # `start` exists at all
         try:
-            g = GameModel.objects(id=game_id).get()
+            moves = get_matching_moves(game_id, skip, max(limit, 1))
         except (DoesNotExist, ValidationError) :
             abort(404, message=f"Game {game_id} not found.")
 
-        args = move_list_get_parser.parse_args()
-        total_moves = g.moves.count()
-
         # we know this one is impossible
-        if args['start'] >= total_moves:
+        if not moves:
             abort(404, message=f"No moves found for game {game_id}, starting at move {args['start']}.")
 
-        # get the correct boundaries, shift to 1-indexed (because that's how we store them in db at the moment)
-        # TODO: maybe rethink the 1-indexing on moves
-        start = args['start'] + 1 if args['start'] >=0 else 1
-        until = args['until'] + 1 if args['until'] < total_moves and args['until'] > -1 else total_moves
-
-        return get_matching_moves(g, start, until)
+        return moves if limit > 0 else []
 
 
     def post(self, game_id, player_id):
@@ -119,19 +168,22 @@ class Moves(Resource):
                 {
                 "move": "{gameId}/moves/{move_number}"
                 }
+            If the other player is an AI, its answer is played right away, as the next move.
             Status codes:
                 • 200 - OK. On success
                 • 400 - Malformed input. Illegal move
                 • 404 - Game not found or player is not a part of it.
-                • 409 - Player tried to post when it’s not their turn.
+                • 409 - Player tried to post when it’s not their turn,
+                        or another move for this game was written concurrently.
                 • 410 - Game is already in DONE state. (additional requirement, noticed while testing)
         """
-        args = moves_post_parser.parse_args()
+        with timer('parse'):
+            args = moves_post_schema.parse_request()
         request_column = args['column']
 
-        # get the game object
+        # get the game object, and its board
         try:
-            g = GameModel.objects(id=game_id).get()
+            g, gb = get_store().checkout_game(game_id)
         except (DoesNotExist, ValidationError) :
             abort(404, message=f"Game {game_id} not found.") 
 
@@ -149,35 +201,23 @@ class Moves(Resource):
         if g.current_token != p.token:
             abort(409, message=f"Player {player_id} tried to post when it’s not their turn.")
         
-        # build GameBoard
-        gb = GameBoard(g.num_cols, g.num_rows)
-        players_to_token_map = { p.name: p.token for p in g.players }
-        moves = [ { 'token': players_to_token_map[m.player_name], 'column': m.column } for m in g.moves if m.move_type == 'MOVE']
-        gb.apply_moves(moves)
-
         # test if next move is legal
         if not gb.can_drop(request_column):
             abort(400, message=f"Illegal move. Unable to drop token in column {request_column}")
 
         # apply move and check winning condition
-        row = gb.drop_token(request_column, p.token)
-
-        if gb.check_win(request_column, row):
-            g.state = 'DONE'
-            g.winner = p.name
-        # can also be done if board is full
-        elif g.moves.count() + 1 == g.num_cols * g.num_rows:
-            g.state = 'DONE'
-            g.winner = None
-
-        move_number = len(moves) + 1
-        g.moves.create(turn=move_number, move_type='MOVE', player_name=p.name, column=request_column)
-
-        token_list = list(players_to_token_map.values())
-        g.current_token = get_next_token(token_list, p.token)
-        
-        # TODO: possibly use conditional save here, to make sure we're updating the latest tamestamp seen
-        g.save()
+        m = play_move(g, gb, p, request_column)
+        move_number = m.turn
+        played = [m]
+
+        # an AI opponent answers right away, in the same write
+        ai_move = play_ai_move(g, gb)
+        if ai_move is not None:
+            played.append(ai_move)
+
+        # conditional atomic write: only lands if nobody moved since we loaded the game
+        if not get_store().commit_moves(g, gb, played, expected_version=g.version, expected_token=p.token):
+            abort(409, message=f"Game {game_id} was changed by another request. Reload the game and try again.")
         
         # success
         return { "move": f"{game_id}/moves/{move_number}" }   # TODO: use @marshal_with, fields.Url('endpoint_resource')
@@ -188,11 +228,12 @@ class Moves(Resource):
             Status codes:
                 • 202 - OK. On success
                 • 404 - Game not found or player is not a part of it.
+                • 409 - Another move for this game was written concurrently.
                 • 410 - Game is already in DONE state.
         """    
         # get the game object
         try:
-            g = GameModel.objects(id=game_id).get()
+            g, gb = get_store().checkout_game(game_id)
         except (DoesNotExist, ValidationError) :
             abort(404, message=f"Game {game_id} not found.") 
 
@@ -208,15 +249,16 @@ class Moves(Resource):
 
         # add a move
         move_number = g.moves.count() + 1
-        g.moves.create(turn=move_number, move_type='QUIT', player_name=p.name)
+        m = g.moves.create(turn=move_number, move_type='QUIT', player_name=p.name)
         
         # update winning status and save (TODO: assuming 2 players, generalize this )
         remaining = g.players.exclude(name=player_id)
         g.state = 'DONE'
         g.winner = remaining.first().name
 
-        # TODO: possibly use conditional save here, to make sure we're updating the latest tamestamp seen
-        g.save()
+        # conditional atomic write: only lands if nobody moved since we loaded the game
+        if not get_store().commit_moves(g, gb, [m], expected_version=g.version):
+            abort(409, message=f"Game {game_id} was changed by another request. Reload the game and try again.")
 
         return {}
 
@@ -235,30 +277,110 @@ class MoveDetail(Resource):
                 • 400 - Malformed request (NOTE: not sure how to get this case, there are no params besides the path variables)
                 • 404 - Game/moves not found.
         """
-        # get the game object
+        # get just this move
         try:
-            g = GameModel.objects(id=game_id).get()
+            moves = get_matching_moves(game_id, move_id, 1)
         except (DoesNotExist, ValidationError) :
             abort(404, message=f"Game {game_id} not found.")
 
+        if not moves:
+            abort(404, message=f"Move number {move_id} not found for game {game_id}")
+
+        # TODO: use @marshal_with for better validation
+        return moves[0]
+
+
+
+class MovesBatch(Resource):
+    def post(self, game_id):
+        """
+            Play a sequence of moves in one request (for bots and importing recorded games).
+            Moves are played in order and stop at the first one that fails, or when the game is over.
+            All moves that were played are saved in a single write.
+            If the other player is an AI, it answers after each move (those moves get no entry in "moves").
+            Input:
+                {
+                "moves": [
+                    {"player": "player1", "column": 2},
+                    {"player": "player2", "column": 3}
+                ]
+                }
+            Output:
+                {
+                "moves": [      # one entry per move that was attempted, same codes as POST /drop-token/{gameId}/{playerId}
+                    {"status": 200, "move": "{gameId}/moves/{move_number}"},
+                    {"status": 409, "message": "Player player1 tried to post when it’s not their turn."}
+                ],
+                "state": "DONE/IN_PROGRESS",
+                "winner": "player1"     # only when state is DONE
+                }
+            Status codes:
+                • 200 - OK. Per-move results are in the response
+                • 400 - Malformed request
+                • 404 - Game not found.
+                • 409 - Another move for this game was written concurrently. Nothing was saved.
+                • 410 - Game is already in DONE state.
+        """
+        with timer('parse'):
+            args = moves_batch_post_schema.parse_request()
 
-        turn = move_id + 1
-        # get the move
+        # get the game object, and its board
         try:
-            m = g.moves.get(turn=turn)
+            g, gb = get_store().checkout_game(game_id)
         except (DoesNotExist, ValidationError) :
-            abort(404, message=f"Move number {move_id} not found for game {game_id}")
+            abort(404, message=f"Game {game_id} not found.") 
 
-        # TODO: use @marshal_with for better validation
-        return (
-            {
-                'type': m.move_type,
-                'player': m.player_name,
-                'column': m.column
-            } 
-            if m.move_type == 'MOVE' 
-            else {
-                'type': m.move_type,
-                'player': m.player_name,
-            }
-        )
\ No newline at end of file
+        # check if game is already DONE
+        if g.state == 'DONE':
+            abort(410, message=f"The game is already DONE.")
+
+        expected_version = g.version
+        expected_token = g.current_token
+        results = []
+        played = []
+
+        for move in args['moves']:
+            if g.state == 'DONE':
+                break
+
+            player_id = move.get('player')
+            column = move.get('column')
+
+            if not isinstance(column, int) or isinstance(column, bool):
+                results.append({ 'status': 400, 'message': f"Column must be a number. Received {column}" })
+                break
+
+            # check if player is part of the game
+            try:
+                p = g.players.get(name=player_id)
+            except DoesNotExist:
+                results.append({ 'status': 404, 'message': f"Player {player_id} does not belong to game {game_id}." })
+                break
+
+            # check if it's player's turn
+            if g.current_token != p.token:
+                results.append({ 'status': 409, 'message': f"Player {player_id} tried to post when it’s not their turn." })
+                break
+
+            # test if next move is legal
+            if not gb.can_drop(column):
+                results.append({ 'status': 400, 'message': f"Illegal move. Unable to drop token in column {column}" })
+                break
+
+            m = play_move(g, gb, p, column)
+            played.append(m)
+            results.append({ 'status': 200, 'move': f"{game_id}/moves/{m.turn}" })
+
+            # AI answers are played in between, but only requested moves get a result
+            ai_move = play_ai_move(g, gb)
+            if ai_move is not None:
+                played.append(ai_move)
+
+        # conditional atomic write of everything we played
+        if played and not get_store().commit_moves(g, gb, played, expected_version=expected_version, expected_token=expected_token):
+            abort(409, message=f"Game {game_id} was changed by another request. Reload the game and try again.")
+
+        res = { 'moves': results, 'state': g.state }
+        if g.state == 'DONE':
+            res['winner'] = g.winner
+        return res
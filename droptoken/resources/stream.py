@@ -0,0 +1,95 @@
+import json
+
+from flask import Response, request, stream_with_context
+from flask_restful import Resource, abort
+from droptoken.events import game_events
+from droptoken.storage import get_store
+from droptoken.resources.moves import ALL_MOVES, get_matching_moves
+from droptoken.metrics import timer
+from droptoken.validation import Field, Schema
+from mongoengine.errors import DoesNotExist, ValidationError
+
+# how long a single long-poll request (or SSE connection) may wait, in seconds
+DEFAULT_WAIT = 30
+MAX_WAIT = 60
+
+stream_get_schema = Schema('args',
+    Field('since_turn', type=int, default=0,
+        help='Number of moves the client has already seen. Error: {error_msg}'),
+    Field('timeout', type=int, default=DEFAULT_WAIT,
+        help=f'How long to wait for a change, in seconds (max {MAX_WAIT}). Error: {{error_msg}}'),
+)
+
+def state_update(latest, moves):
+    res = { 'turn': latest.turn, 'state': latest.state, 'moves': moves }
+    if latest.state == 'DONE':
+        res['winner'] = latest.winner
+    return res
+
+
+class GameStream(Resource):
+    def get(self, game_id):
+        """
+            Wait for new moves and state changes of a game, instead of polling.
+            Optional Query parameters: GET /drop-token/{gameId}/stream?since_turn=3&timeout=30
+                since_turn: number of moves already seen; only later moves are returned
+                timeout: max seconds to wait for a change
+
+            Long-poll (default): returns as soon as there is a move after `since_turn` or the game is DONE,
+            or when the timeout runs out (with no moves).
+            Output:
+                {
+                "turn": 5,          # moves played so far, pass it back as since_turn
+                "state": "DONE/IN_PROGRESS",
+                "winner": "player1",    # only when DONE
+                "moves": [ {"type": "MOVE", "player": "player1", "column": 1} ]
+                }
+
+            Server-Sent Events (with "Accept: text/event-stream"): the same objects as `update` events,
+            one per change, until the game is DONE or the timeout runs out.
+
+            Status codes:
+                • 200 - OK. On success
+                • 400 - Malformed request
+                • 404 - Game not found
+        """
+        with timer('parse'):
+            args = stream_get_schema.parse_request()
+        since_turn = max(args['since_turn'], 0)
+        timeout = min(max(args['timeout'], 0), MAX_WAIT)
+
+        def new_moves(latest, seen):
+            if latest.turn <= seen:
+                return []
+            try:
+                return get_matching_moves(game_id, seen, ALL_MOVES)
+            except (DoesNotExist, ValidationError):
+                return []
+
+        def load():
+            return get_store().game_state(game_id)
+
+        latest = game_events.wait(game_id, since_turn, timeout, load=load)
+        if latest is None:
+            abort(404, message=f"Game {game_id} not found.")
+
+        if request.accept_mimetypes.best == 'text/event-stream':
+            def events(latest, seen):
+                while True:
+                    update = state_update(latest, new_moves(latest, seen))
+                    if update['moves'] or latest.state == 'DONE':
+                        yield f"event: update\ndata: {json.dumps(update)}\n\n"
+                        seen = latest.turn
+                    else:
+                        # keep the connection alive through proxies
+                        yield ": keep-alive\n\n"
+                    if latest.state == 'DONE':
+                        return
+                    # the hub may have forgotten the game since the last wait
+                    latest = game_events.wait(game_id, seen, timeout, load=load)
+                    if latest is None or (latest.turn <= seen and latest.state != 'DONE'):
+                        return
+
+            return Response(stream_with_context(events(latest, since_turn)), mimetype='text/event-stream')
+
+        return state_update(latest, new_moves(latest, since_turn))
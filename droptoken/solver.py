@@ -0,0 +1,317 @@
+# Move search: finds the best column for the player whose turn it is, for hints and AI players.
+# Alpha-beta negamax with iterative deepening, on its own bitboards (same layout as
+# logic.BitBoard: column-major, one sentinel row per column) so a node costs a few integer ops.
+# Results of searched positions go into a fixed-size, Zobrist-hashed transposition table that
+# is shared by all searches in the process.
+# Boards come in through snapshot(), so any engine in logic.ENGINES works. Two tokens, 1 and 2.
+import random
+from collections import namedtuple
+from functools import lru_cache
+from time import perf_counter
+
+from droptoken.logic import GameBoard
+
+RUN = GameBoard.WINNING_RUN
+# score of a win (minus the number of plies it takes, so quicker wins score higher)
+WIN_SCORE = 1000000
+# scores above this are wins/losses, not heuristic estimates
+WIN_BOUND = WIN_SCORE - 10000
+# heuristic value of a line holding n of your tokens and none of the opponent's
+LINE_WEIGHTS = (0, 1, 5, 50)
+
+# about how many lines are scored (see Search.evaluate) between two looks at the time budget.
+# A leaf scores every line of the board, so the bigger the board, the fewer nodes between checks
+CHECK_WORK = 2**14
+
+# transposition table entry flags
+EXACT, LOWER, UPPER = 0, 1, 2
+
+Result = namedtuple('Result', ['column', 'score', 'depth', 'nodes'])
+
+
+class Layout(object):
+    """
+        Everything about a board size that the search needs, built once per size (see layout()).
+    """
+
+    def __init__(self, num_cols, num_rows):
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self.col_height = num_rows + 1
+        # bit shifts for each direction: column, row and both diagonals
+        self.shifts = (1, self.col_height, self.col_height - 1, self.col_height + 1)
+        # try the middle columns first, they take part in the most lines
+        middle = (num_cols - 1) / 2
+        self.order = sorted(range(num_cols), key=lambda c: (abs(c - middle), c))
+
+        # one mask per possible winning line
+        self.lines = []
+        for dc, dr in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for c in range(num_cols):
+                for r in range(num_rows):
+                    end_c, end_r = c + dc * (RUN - 1), r + dr * (RUN - 1)
+                    if 0 <= end_c < num_cols and 0 <= end_r < num_rows:
+                        self.lines.append(sum(self.bit(c + dc * k, r + dr * k) for k in range(RUN)))
+        # the budget is checked every check_mask + 1 nodes (a power of 2, 1 on the biggest boards)
+        nodes = max(CHECK_WORK // max(len(self.lines), 1), 1)
+        self.check_mask = (1 << (nodes.bit_length() - 1)) - 1
+
+        # random keys for every (token, cell), the same for every process
+        rng = random.Random(num_cols * 1000 + num_rows)
+        cells = num_cols * self.col_height
+        self.zobrist = [[rng.getrandbits(64) for _ in range(cells)] for _ in range(2)]
+
+    def bit(self, column, row):
+        # 0-indexed column and row
+        return 1 << (column * self.col_height + row)
+
+    def is_win(self, bb):
+        for s in self.shifts:
+            m = bb & (bb >> s)
+            if m & (m >> (2 * s)):
+                return True
+        return False
+
+
+@lru_cache(maxsize=64)
+def layout(num_cols, num_rows):
+    return Layout(num_cols, num_rows)
+
+
+class OutOfBudget(Exception):
+    pass
+
+
+class Solver(object):
+    """
+        Finds moves with a bounded search. One instance is shared by the whole process (`solver`),
+        so its transposition table keeps paying off between requests for the same game.
+    """
+
+    def __init__(self, time_limit=0.5, max_nodes=None, table_size=2**18):
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.resize(table_size)
+
+    def resize(self, table_size):
+        """
+            Drop the transposition table and start a new one with `table_size` entries
+            (rounded down to a power of 2).
+        """
+        bits = max(table_size, 1).bit_length() - 1
+        self.mask = (1 << bits) - 1
+        # entry: (key, depth, flag, score, column)
+        self.table = [None] * (1 << bits)
+
+    def solve(self, board, token, time_limit=None, max_nodes=None, max_depth=None):
+        """
+            Search for the best move for `token` on `board`.
+            Stops at the first of: time_limit seconds, max_nodes positions, max_depth plies,
+            or the end of the game (defaults: this solver's settings, no depth limit).
+            A time_limit of 0 means no time limit.
+            Return: Result(column (1-indexed, None if the board is full), score (for `token`,
+                    > WIN_BOUND is a forced win), depth (plies fully searched), nodes)
+        """
+        search = Search(
+            self, layout(board.num_cols, board.num_rows), board, token,
+            self.time_limit if time_limit is None else time_limit,
+            self.max_nodes if max_nodes is None else max_nodes,
+        )
+        return search.run(max_depth)
+
+    def value(self, board, token, depth, ply=0, time_limit=None):
+        """
+            Score of a position for `token` (to move), at a fixed depth (see Search.value).
+            Return: (score, nodes), score is None if time_limit ran out
+        """
+        search = Search(self, layout(board.num_cols, board.num_rows), board, token, time_limit, None)
+        return search.value(depth, ply), search.nodes
+
+
+class Search(object):
+    """
+        State of one solve() call.
+    """
+
+    def __init__(self, solver, layout, board, token, time_limit, max_nodes):
+        self.table = solver.table
+        self.mask = solver.mask
+        self.layout = layout
+        self.check_mask = layout.check_mask
+        self.deadline = perf_counter() + time_limit if time_limit else None
+        self.max_nodes = max_nodes
+        self.nodes = 0
+
+        cells, heights = board.snapshot()
+        self.heights = list(heights)
+        self.bitboards = [0, 0]
+        self.key = 0
+        for c in range(board.num_cols):
+            for r in range(heights[c]):
+                t = cells[c * board.num_rows + r] - 1
+                self.bitboards[t] |= layout.bit(c, r)
+                self.key ^= layout.zobrist[t][c * layout.col_height + r]
+        self.side = token - 1
+        self.empty = board.num_cols * board.num_rows - sum(heights)
+
+    def run(self, max_depth):
+        me, opp = self.bitboards[self.side], self.bitboards[1 - self.side]
+        moves = self.moves()
+        if not moves:
+            return Result(None, 0, 0, 0)
+
+        # always have an answer, even if the first iteration runs out of budget
+        best = Result(moves[0][0] + 1, 0, 0, 0)
+        column = None
+        limit = self.empty if max_depth is None else min(max_depth, self.empty)
+        for depth in range(1, limit + 1):
+            try:
+                score, column = self.root(me, opp, depth, column)
+            except OutOfBudget:
+                break
+            best = Result(column + 1, score, depth, self.nodes)
+            if abs(score) > WIN_BOUND:
+                # the outcome is decided, deeper searches won't change the move
+                break
+        return best._replace(nodes=self.nodes)
+
+    def value(self, depth, ply):
+        """
+            Score of the position for the player to move, searched `depth` plies deep with a full
+            window, as if it was `ply` plies below the root of a search.
+            Return: score, or None if the budget ran out
+        """
+        me, opp = self.bitboards[self.side], self.bitboards[1 - self.side]
+        try:
+            return self.negamax(me, opp, self.side, self.key, depth, -WIN_SCORE - 1, WIN_SCORE + 1, ply)
+        except OutOfBudget:
+            return None
+
+    def moves(self):
+        L = self.layout
+        return [
+            (c, L.bit(c, self.heights[c]), c * L.col_height + self.heights[c])
+            for c in L.order if self.heights[c] < L.num_rows
+        ]
+
+    def root(self, me, opp, depth, hint):
+        # the best move of the previous iteration goes first. Not taken from the table, so the
+        # result only depends on the position (see droptoken/analysis.py)
+        best_score, best_column = -WIN_SCORE - 1, None
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        for column, bit, cell in self.ordered(self.moves(), hint):
+            if self.layout.is_win(me | bit):
+                return WIN_SCORE - 1, column
+            self.heights[column] += 1
+            score = -self.negamax(opp, me | bit, 1 - self.side, self.key ^ self.layout.zobrist[self.side][cell],
+                depth - 1, -beta, -alpha, 1)
+            self.heights[column] -= 1
+            if score > best_score:
+                best_score, best_column = score, column
+            alpha = max(alpha, score)
+        self.store(self.key, depth, EXACT, best_score, best_column, 0)
+        return best_score, best_column
+
+    def negamax(self, me, opp, side, key, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & self.check_mask == 0:
+            self.check_budget()
+
+        moves = self.moves()
+        if not moves:
+            return 0
+        for column, bit, _ in moves:
+            if self.layout.is_win(me | bit):
+                return WIN_SCORE - ply - 1
+        if depth <= 0:
+            return self.evaluate(me, opp)
+
+        alpha_orig = alpha
+        hint = None
+        entry = self.table[key & self.mask]
+        if entry is not None and entry[0] == key:
+            hint = entry[4]
+            # only results of the same depth are reused, so a search always gives the same
+            # result for a position, whatever is in the (shared) table
+            if entry[1] == depth:
+                score = from_table(entry[3], ply)
+                if entry[2] == EXACT:
+                    return score
+                if entry[2] == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        zobrist = self.layout.zobrist[side]
+        best_score, best_column = -WIN_SCORE - 1, None
+        for column, bit, cell in self.ordered(moves, hint):
+            self.heights[column] += 1
+            score = -self.negamax(opp, me | bit, 1 - side, key ^ zobrist[cell], depth - 1, -beta, -alpha, ply + 1)
+            self.heights[column] -= 1
+            if score > best_score:
+                best_score, best_column = score, column
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        flag = EXACT
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        self.store(key, depth, flag, best_score, best_column, ply)
+        return best_score
+
+    def ordered(self, moves, hint):
+        # the best move from an earlier (shallower) search of this position goes first
+        if hint is None:
+            return moves
+        return sorted(moves, key=lambda m: m[0] != hint)
+
+    def evaluate(self, me, opp):
+        score = 0
+        for line in self.layout.lines:
+            mine, theirs = me & line, opp & line
+            if not theirs:
+                score += LINE_WEIGHTS[bin(mine).count('1')]
+            elif not mine:
+                score -= LINE_WEIGHTS[bin(theirs).count('1')]
+        return score
+
+    def store(self, key, depth, flag, score, column, ply):
+        i = key & self.mask
+        entry = self.table[i]
+        # keep the deeper result when two positions share a slot
+        if entry is None or entry[0] == key or entry[1] <= depth:
+            self.table[i] = (key, depth, flag, to_table(score, ply), column)
+
+    def check_budget(self):
+        if self.deadline is not None and perf_counter() > self.deadline:
+            raise OutOfBudget()
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise OutOfBudget()
+
+
+# win scores count plies from the root; in the table they count from the stored position,
+# so they stay right when the position is reached at a different depth
+def to_table(score, ply):
+    if score > WIN_BOUND:
+        return score + ply
+    if score < -WIN_BOUND:
+        return score - ply
+    return score
+
+
+def from_table(score, ply):
+    if score > WIN_BOUND:
+        return score - ply
+    if score < -WIN_BOUND:
+        return score + ply
+    return score
+
+
+# shared by the whole process
+solver = Solver()
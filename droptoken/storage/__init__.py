@@ -0,0 +1,41 @@
+# Pluggable game storage. The resources get the configured backend with get_store();
+# app.py picks one with set_store() from the STORAGE setting.
+from droptoken.storage.base import GameStore
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        from droptoken.storage.mongo import MongoStore
+        _store = MongoStore()
+    return _store
+
+
+def set_store(store):
+    global _store
+    _store = store
+
+
+def make_store(kind, path=None, flush_interval=1.0, fsync=False):
+    """
+        Input: kind - 'mongo', 'memory', 'log' or 'writebehind'
+               path - the log file, for 'log', or the journal, for 'writebehind'
+               flush_interval - seconds between writes to MongoDB, for 'writebehind'
+               fsync - flush every write to disk before it's acknowledged, for 'log' and 'writebehind'
+        Return: a new GameStore
+    """
+    if kind == 'mongo':
+        from droptoken.storage.mongo import MongoStore
+        return MongoStore()
+    if kind == 'memory':
+        from droptoken.storage.memory import MemoryStore
+        return MemoryStore()
+    if kind == 'log':
+        from droptoken.storage.log import LogStore
+        return LogStore(path, fsync=fsync)
+    if kind == 'writebehind':
+        from droptoken.storage.writebehind import WriteBehindStore
+        return WriteBehindStore(path, flush_interval=flush_interval, fsync=fsync)
+    raise ValueError(f"Unknown storage backend {kind}")
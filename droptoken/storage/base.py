@@ -0,0 +1,96 @@
+from mongoengine.errors import ValidationError
+
+from droptoken.events import GameState, game_events
+from droptoken.models.game import GameModel
+
+
+class GameStore(object):
+    """
+        Where games live. The resources only talk to a GameStore (see droptoken.storage.get_store),
+        never to the database directly, so the backend can be swapped per deployment.
+
+        Games are passed around as GameModel objects (also for backends that don't use MongoDB),
+        boards as GameBoard-like engines from droptoken.logic.
+        Missing games raise GameModel.DoesNotExist, malformed ids raise ValidationError,
+        same as GameModel.objects(id=game_id).get().
+    """
+
+    def create_game(self, game):
+        """
+            Store a new game. Sets game.id.
+        """
+        raise NotImplementedError
+
+    def create_games(self, games):
+        """
+            Store many new games, in one write where the backend can. Sets game.id on each.
+            All games are validated before any is stored.
+        """
+        for game in games:
+            game.validate()
+        for game in games:
+            self.create_game(game)
+
+    def list_game_ids(self, limit, after=None, state=None, player=None):
+        """
+            Return: up to `limit` game ids (str), in id order, after the ObjectId `after`,
+            optionally only games in `state` or with a player named `player`.
+        """
+        raise NotImplementedError
+
+    def iter_games(self, batch_size=1000):
+        """
+            Yield: every stored game (GameModel, read-only), read from the backend `batch_size`
+            games at a time. Games created or changed meanwhile may or may not be included.
+        """
+        raise NotImplementedError
+
+    def get_live_game(self, game_id):
+        """
+            Return: (game, board). These may be shared with other requests, treat them as read-only.
+        """
+        raise NotImplementedError
+
+    def checkout_game(self, game_id):
+        """
+            Return: private copies of (game, board), to play moves on and then commit_moves().
+        """
+        game, board = self.get_live_game(game_id)
+        return copy_game(game), board.copy()
+
+    def get_moves(self, game_id, skip, limit):
+        """
+            Return: up to `limit` MoveModels of a game, starting at the 0-indexed move `skip`.
+        """
+        raise NotImplementedError
+
+    def commit_moves(self, game, board, new_moves, expected_version, expected_token=None):
+        """
+            Atomically append moves to a game and store its new turn/state/winner/board.
+            `game` (and `board`, if given) must already have the moves applied locally.
+            Only writes if the stored game is still IN_PROGRESS at expected_version
+            (and it's still expected_token's turn, if given).
+            Return:
+                True - written. game.version is bumped.
+                False - somebody else wrote to the game first. Nothing was written.
+        """
+        raise NotImplementedError
+
+    def game_state(self, game_id):
+        """
+            Return: GameState (number of moves, state, winner), or None if there's no such game.
+        """
+        try:
+            game, _ = self.get_live_game(game_id)
+        except (GameModel.DoesNotExist, ValidationError):
+            return None
+        return GameState(game.moves.count(), game.state, game.winner)
+
+
+def copy_game(game):
+    return GameModel._from_son(game.to_mongo())
+
+
+def publish(game):
+    # tell clients waiting on the game (resources/stream.py) about a write
+    game_events.publish(str(game.id), game.moves.count(), game.state, game.winner)
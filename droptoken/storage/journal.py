@@ -0,0 +1,73 @@
+import os
+from datetime import datetime
+
+import bson
+
+from droptoken.boards import load_board
+from droptoken.models.game import GameModel
+from droptoken.storage.base import publish
+from droptoken.storage.log import apply_moves_record, moves_record, read_log
+from droptoken.storage.memory import MemoryStore
+
+
+class JournalStore(MemoryStore):
+    """
+        Games are served from memory (see MemoryStore) and made durable in a journal: a log file
+        with the same records as LogStore's (see storage/log.py), appended to on every write.
+        On start the whole journal is replayed to rebuild every game, so it's meant for journals
+        that are kept short, like WriteBehindStore's, which starts a new one at every flush.
+        Set fsync=True to flush each record to disk before a request is acknowledged.
+    """
+
+    def __init__(self, path, fsync=False):
+        super().__init__()
+        self.path = path
+        self.fsync = fsync
+        self._recover()
+        self._file = open(path, 'ab')
+
+    def _recover(self):
+        self._replay(self.path)
+
+    def _replay(self, path):
+        for _, record in read_log(path):
+            self._apply(record)
+
+    def _apply(self, record):
+        if record['op'] == 'create':
+            game = GameModel._from_son(record['game'])
+            self._insert(game, load_board(game))
+        elif record['op'] == 'moves':
+            game, board = self._games[record['_id']]
+            # replayed games are only reachable from here, safe to change in place
+            apply_moves_record(game, board, record)
+
+    def _append(self, *records):
+        # caller holds the lock
+        self._file.write(b''.join(bson.encode(record) for record in records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def create_games(self, games):
+        for game in games:
+            game.validate()
+            game.id = bson.ObjectId()
+        boards = [ load_board(game) for game in games ]
+        with self._lock:
+            self._append(*[ { 'op': 'create', 'game': game.to_mongo() } for game in games ])
+            for game, board in zip(games, boards):
+                self._insert(game, board)
+
+    def commit_moves(self, game, board, new_moves, expected_version, expected_token=None):
+        with self._lock:
+            if not self._can_commit(game.id, expected_version, expected_token):
+                return False
+            game.last_modified = datetime.utcnow()
+            self._append(moves_record(game, new_moves, expected_version))
+            self._commit(game, board, expected_version)
+        publish(game)
+        return True
+
+    def close(self):
+        self._file.close()
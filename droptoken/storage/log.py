@@ -0,0 +1,301 @@
+# Append-only game log on local disk: one BSON record per write,
+#   { "op": "create", "game": <game document> }
+#   { "op": "moves", "_id": <game id>, "moves": [<move>, ...], "set": { <changed fields> } }
+# Writes only ever append, so a commit costs one small sequential write instead of rewriting the game.
+# LogStore (below) reads games straight from the memory-mapped file; JournalStore
+# (storage/journal.py) replays the whole file into memory on start.
+import mmap
+import os
+from bisect import bisect_right, insort
+from datetime import datetime
+from threading import Lock
+
+import bson
+from bson import ObjectId
+from mongoengine.errors import ValidationError
+
+from droptoken.boards import board_cache, load_board, store_board
+from droptoken.events import GameState
+from droptoken.metrics import timer
+from droptoken.models.game import GameModel, MoveModel
+from droptoken.storage.base import GameStore, publish
+from droptoken.storage.memory import parse_id
+
+# size prefix of a BSON document (little-endian int32, counts itself)
+SIZE_BYTES = 4
+# LogStore compacts its file on open once it holds more than this many records per game
+COMPACT_RATIO = 2
+
+
+def read_log(path):
+    """
+        Yield: (offset, record) for every record of the log at `path`, in order.
+        A record cut short by a crash ends the log: it's truncated away once everything before it is read.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = 0
+        while pos + SIZE_BYTES <= len(data):
+            size = int.from_bytes(data[pos:pos + SIZE_BYTES], 'little')
+            if size < 5 or pos + size > len(data):
+                break
+            yield pos, bson.decode(data[pos:pos + size])
+            pos += size
+        torn = pos < len(data)
+
+    if torn:
+        with open(path, 'r+b') as f:
+            f.truncate(pos)
+
+
+def moves_record(game, new_moves, expected_version):
+    """
+        The "moves" record of a commit: `new_moves`, and the game's fields they changed.
+    """
+    return {
+        'op': 'moves',
+        '_id': game.id,
+        'moves': [ m.to_mongo() for m in new_moves ],
+        'set': {
+            'current_token': game.current_token,
+            'state': game.state,
+            'winner': game.winner,
+            'last_modified': game.last_modified,
+            'version': expected_version + 1,
+        },
+    }
+
+
+def apply_moves_record(game, board, record):
+    """
+        Play a "moves" record on a game and its board, in place.
+    """
+    tokens = { p.name: p.token for p in game.players }
+    for doc in record['moves']:
+        m = MoveModel._from_son(doc)
+        game.moves.append(m)
+        if m.move_type == 'MOVE':
+            board.drop_token(m.column, tokens[m.player_name])
+    for name, value in record['set'].items():
+        setattr(game, name, value)
+    store_board(game, board)
+
+
+def replay_game(records):
+    """
+        Input: a game's records, in order (its "create" record first)
+        Return: (game, board)
+    """
+    game = GameModel._from_son(records[0]['game'])
+    board = load_board(game)
+    for record in records[1:]:
+        apply_moves_record(game, board, record)
+    return game, board
+
+
+class LogEntry(object):
+    """
+        What LogStore keeps in memory for a game: where its records are, and enough of its state
+        to check a commit, filter a listing and answer game_state() without reading the game.
+    """
+    __slots__ = ('offsets', 'version', 'current_token', 'state', 'winner', 'turn', 'players')
+
+    def __init__(self, offset, doc):
+        self.offsets = [offset]
+        self.version = doc.get('version', 0)
+        self.current_token = doc.get('current_token')
+        self.state = doc.get('state')
+        self.winner = doc.get('winner')
+        packed = doc.get('packed_moves')
+        self.turn = len(packed) if packed is not None else len(doc.get('moves', []))
+        self.players = [ p['name'] for p in doc['players'] ]
+
+    def update(self, offset, record):
+        self.offsets.append(offset)
+        self.turn += len(record['moves'])
+        for name in ('version', 'current_token', 'state', 'winner'):
+            setattr(self, name, record['set'][name])
+
+
+class LogStore(GameStore):
+    """
+        Games live in an append-only log file (see above) on local disk. The file is memory-mapped
+        and indexed by game id (the offsets of the game's records); a game is rebuilt from its
+        records when it's read and then kept in the shared board_cache, so only the games in use
+        (and a LogEntry per game) are held in memory.
+        On open, the file is scanned to build the index; a record cut short by a crash is dropped
+        (and truncated away). If it holds more than COMPACT_RATIO records per game, it's compacted
+        first, see compact().
+        Set fsync=True to flush each record to disk before a request is acknowledged.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._lock = Lock()
+        self._open()
+        if self._records > COMPACT_RATIO * len(self._entries):
+            self.compact()
+
+    def _open(self):
+        self._entries = {}  # ObjectId -> LogEntry
+        self._ids = []      # sorted, for paging
+        self._records = 0
+        for offset, record in read_log(self.path):
+            self._index(offset, record)
+        self._file = open(self.path, 'a+b')
+        self._size = self._file.seek(0, os.SEEK_END)
+        self._map = None
+
+    def _index(self, offset, record):
+        # caller holds the lock (or is opening the log)
+        self._records += 1
+        if record['op'] == 'create':
+            game_id = record['game']['_id']
+            self._entries[game_id] = LogEntry(offset, record['game'])
+            insort(self._ids, game_id)
+        else:
+            self._entries[record['_id']].update(offset, record)
+
+    def _close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def _read(self, offset):
+        # caller holds the lock
+        if self._map is None or offset >= len(self._map):
+            # appended to since it was mapped
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        size = int.from_bytes(self._map[offset:offset + SIZE_BYTES], 'little')
+        return self._map[offset:offset + size]
+
+    def _append(self, *records):
+        # caller holds the lock
+        for record in records:
+            data = bson.encode(record)
+            self._file.write(data)
+            self._index(self._size, record)
+            self._size += len(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _entry(self, game_id):
+        # caller holds the lock
+        entry = self._entries.get(parse_id(game_id))
+        if entry is None:
+            raise GameModel.DoesNotExist(f"Game {game_id} not found.")
+        return entry
+
+    def _load(self, game_id):
+        with self._lock:
+            data = [ self._read(offset) for offset in self._entry(game_id).offsets ]
+        with timer('load_board'):
+            return replay_game([ bson.decode(d) for d in data ])
+
+    def create_game(self, game):
+        self.create_games([game])
+
+    def create_games(self, games):
+        for game in games:
+            game.validate()
+            game.id = ObjectId()
+        with self._lock:
+            with timer('save'):
+                self._append(*[ { 'op': 'create', 'game': game.to_mongo() } for game in games ])
+
+    def list_game_ids(self, limit, after=None, state=None, player=None):
+        with self._lock:
+            start = bisect_right(self._ids, after) if after is not None else 0
+            res = []
+            for game_id in self._ids[start:]:
+                entry = self._entries[game_id]
+                if state is not None and entry.state != state:
+                    continue
+                if player is not None and player not in entry.players:
+                    continue
+                res.append(str(game_id))
+                if len(res) == limit:
+                    break
+            return res
+
+    def iter_games(self, batch_size=1000):
+        # read past the board cache, so an export doesn't push the games being played out of it
+        after = None
+        while True:
+            with self._lock:
+                start = bisect_right(self._ids, after) if after is not None else 0
+                ids = self._ids[start:start + batch_size]
+            if not ids:
+                return
+            for game_id in ids:
+                yield self._load(game_id)[0]
+            after = ids[-1]
+
+    def get_live_game(self, game_id):
+        with self._lock:
+            version = self._entry(game_id).version
+        cached = board_cache.get(str(game_id), version)
+        if cached is not None:
+            return cached
+        game, board = self._load(game_id)
+        board_cache.put(str(game_id), game.version, game, board)
+        return game, board
+
+    def get_moves(self, game_id, skip, limit):
+        game, _ = self.get_live_game(game_id)
+        return list(game.moves[skip:skip + limit])
+
+    def commit_moves(self, game, board, new_moves, expected_version, expected_token=None):
+        with self._lock:
+            entry = self._entry(game.id)
+            if (entry.state != 'IN_PROGRESS' or entry.version != expected_version
+                    or (expected_token is not None and entry.current_token != expected_token)):
+                return False
+            game.last_modified = datetime.utcnow()
+            with timer('save'):
+                self._append(moves_record(game, new_moves, expected_version))
+        game.version = expected_version + 1
+        if board is None:
+            board = load_board(game)
+        store_board(game, board)
+        board_cache.put(str(game.id), game.version, game, board)
+        publish(game)
+        return True
+
+    def game_state(self, game_id):
+        # from the index, without reading the game
+        with self._lock:
+            try:
+                entry = self._entry(game_id)
+            except (GameModel.DoesNotExist, ValidationError):
+                return None
+            return GameState(entry.turn, entry.state, entry.winner)
+
+    def compact(self):
+        """
+            Rewrite the log with one "create" record per game, holding the game as it is now.
+            Return: number of records dropped
+        """
+        with self._lock:
+            before = self._records
+            tmp_path = f'{self.path}.compact'
+            with open(tmp_path, 'wb') as f:
+                for game_id in self._ids:
+                    records = [ bson.decode(self._read(offset)) for offset in self._entries[game_id].offsets ]
+                    game, _ = replay_game(records)
+                    f.write(bson.encode({ 'op': 'create', 'game': game.to_mongo() }))
+                f.flush()
+                os.fsync(f.fileno())
+            self._close()
+            os.replace(tmp_path, self.path)
+            self._open()
+            return before - self._records
+
+    def close(self):
+        with self._lock:
+            self._close()
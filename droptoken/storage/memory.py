@@ -0,0 +1,117 @@
+from bisect import bisect_right, insort
+from datetime import datetime
+from threading import Lock
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine.errors import ValidationError
+
+from droptoken.boards import load_board, store_board
+from droptoken.models.game import GameModel
+from droptoken.storage.base import GameStore, publish
+
+
+def parse_id(game_id):
+    try:
+        return ObjectId(game_id)
+    except (InvalidId, TypeError):
+        raise ValidationError(f"'{game_id}' is not a valid ObjectId")
+
+
+class MemoryStore(GameStore):
+    """
+        Games live in this process only, as (GameModel, board) pairs guarded by one lock.
+        Nothing survives a restart; meant for local development, tests and benchmarks.
+        Stored objects are never changed in place: a commit swaps in the writer's copies,
+        so readers holding the old ones are unaffected.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._games = {}    # ObjectId -> (game, board)
+        self._ids = []      # sorted, for paging
+
+    def _get(self, game_id):
+        # caller holds the lock
+        entry = self._games.get(parse_id(game_id))
+        if entry is None:
+            raise GameModel.DoesNotExist(f"Game {game_id} not found.")
+        return entry
+
+    def _insert(self, game, board):
+        # caller holds the lock
+        self._games[game.id] = (game, board)
+        insort(self._ids, game.id)
+
+    def create_game(self, game):
+        self.create_games([game])
+
+    def create_games(self, games):
+        for game in games:
+            game.validate()
+            game.id = ObjectId()
+        boards = [ load_board(game) for game in games ]
+        with self._lock:
+            for game, board in zip(games, boards):
+                self._insert(game, board)
+
+    def list_game_ids(self, limit, after=None, state=None, player=None):
+        with self._lock:
+            start = bisect_right(self._ids, after) if after is not None else 0
+            res = []
+            for game_id in self._ids[start:]:
+                game = self._games[game_id][0]
+                if state is not None and game.state != state:
+                    continue
+                if player is not None and not any(p.name == player for p in game.players):
+                    continue
+                res.append(str(game_id))
+                if len(res) == limit:
+                    break
+            return res
+
+    def iter_games(self, batch_size=1000):
+        # a batch at a time, so other requests get the lock in between
+        after = None
+        while True:
+            with self._lock:
+                start = bisect_right(self._ids, after) if after is not None else 0
+                batch = [ self._games[game_id][0] for game_id in self._ids[start:start + batch_size] ]
+            if not batch:
+                return
+            yield from batch
+            after = batch[-1].id
+
+    def get_live_game(self, game_id):
+        with self._lock:
+            return self._get(game_id)
+
+    def get_moves(self, game_id, skip, limit):
+        game, _ = self.get_live_game(game_id)
+        return list(game.moves[skip:skip + limit])
+
+    def _can_commit(self, game_id, expected_version, expected_token):
+        # caller holds the lock
+        current, _ = self._get(game_id)
+        return (
+            current.state == 'IN_PROGRESS'
+            and current.version == expected_version
+            and (expected_token is None or current.current_token == expected_token)
+        )
+
+    def _commit(self, game, board, expected_version):
+        # caller holds the lock and checked _can_commit
+        game.version = expected_version + 1
+        if board is None:
+            board = load_board(game)
+        store_board(game, board)
+        self._games[game.id] = (game, board)
+
+    def commit_moves(self, game, board, new_moves, expected_version, expected_token=None):
+        with self._lock:
+            if not self._can_commit(game.id, expected_version, expected_token):
+                return False
+            game.last_modified = datetime.utcnow()
+            self._commit(game, board, expected_version)
+        publish(game)
+        return True
@@ -0,0 +1,192 @@
+from datetime import datetime
+
+from bson import Binary
+
+from mongoengine.errors import ValidationError
+
+from droptoken.archive import game_archive
+from droptoken.boards import board_cache, load_board, store_board
+from droptoken.events import GameState
+from droptoken.metrics import timer
+from droptoken.models.game import GameModel
+from droptoken.storage.base import GameStore, publish
+
+
+def move_update(game, board, new_moves, expected_version, expected_token=None):
+    """
+        Build the raw (filter, update) documents for MongoStore.commit_moves().
+        Kept separate so the async app (droptoken/asgi.py) can send the exact same write with motor.
+        Sets game.last_modified and, if a board is given, the game's snapshot fields.
+    """
+    query = { '_id': game.id, 'state': 'IN_PROGRESS', 'version': expected_version }
+    if expected_version == 0:
+        # games saved before versioning have no version field at all
+        del query['version']
+        query['$or'] = [ { 'version': 0 }, { 'version': { '$exists': False } } ]
+    if expected_token is not None:
+        query['current_token'] = expected_token
+
+    game.last_modified = datetime.utcnow()
+    set_fields = {
+        'current_token': game.current_token,
+        'state': game.state,
+        'winner': game.winner,
+        'last_modified': game.last_modified,
+    }
+    if board is not None:
+        store_board(game, board)
+        set_fields.update(board_cells=game.board_cells, heights=game.heights)
+
+    update = { '$set': set_fields, '$inc': { 'version': 1 } }
+    packed = game.pack_moves()
+    if packed is not None:
+        # rewrite the whole (small) byte string; the version check above keeps this safe.
+        # Legacy games drop their `moves` list here.
+        set_fields['packed_moves'] = Binary(packed)
+        update['$unset'] = { 'moves': '' }
+    else:
+        update['$push'] = { 'moves': { '$each': [ m.to_mongo() for m in new_moves ] } }
+    return query, update
+
+
+def finish_commit(game, board, expected_version, committed):
+    """
+        Bookkeeping after a move_update() write: bump the in-memory version, tell waiting
+        clients, and update the cache. `committed` is False if the write lost a race.
+    """
+    if not committed:
+        board_cache.invalidate(str(game.id))
+        return False
+
+    game.version = expected_version + 1
+    publish(game)
+    if board is not None:
+        board_cache.put(str(game.id), game.version, game, board)
+    else:
+        board_cache.invalidate(str(game.id))
+    return True
+
+
+def move_count(doc):
+    """
+        Number of moves of a raw game document projected with `packed_moves` and
+        `turn` ($size of `moves`), whichever way its moves are stored.
+    """
+    if doc.get('packed_moves') is not None:
+        return len(doc['packed_moves'])
+    return doc['turn']
+
+
+def iter_stored_games(collection, archive, batch_size):
+    """
+        Every game in `collection`, then every game in `archive` (a GameArchive), through
+        server-side cursors that fetch `batch_size` documents per round trip.
+        A game archived while this runs can show up twice.
+    """
+    # board snapshots aren't needed to read a game
+    for doc in collection.find({}, { 'board_cells': 0, 'heights': 0 }).batch_size(batch_size):
+        yield GameModel._from_son(doc)
+    yield from archive.iter_games(batch_size)
+
+
+class MongoStore(GameStore):
+    """
+        Games are GameModel documents in MongoDB (through mongoengine), with hydrated boards
+        kept in the shared board_cache and validated against the stored version.
+        Games that aren't in the game collection are looked up in the archive (see droptoken/archive.py).
+    """
+
+    def create_game(self, game):
+        with timer('save'):
+            game.save()
+
+    def create_games(self, games):
+        for game in games:
+            game.validate()
+        if not games:
+            return
+        # one insert_many instead of a save() per game
+        with timer('save'):
+            result = GameModel._get_collection().insert_many([ game.to_mongo() for game in games ])
+        for game, game_id in zip(games, result.inserted_ids):
+            game.id = game_id
+
+    def list_game_ids(self, limit, after=None, state=None, player=None):
+        query = GameModel.objects
+        if after is not None:
+            query = query(id__gt=after)
+        if state is not None:
+            query = query(state=state)
+        if player is not None:
+            query = query(players__name=player)
+
+        # project only _id, so we never transfer the players or move lists
+        with timer('fetch'):
+            return [str(game_id) for game_id in query.order_by('id').limit(limit).scalar('id')]
+
+    def iter_games(self, batch_size=1000):
+        return iter_stored_games(GameModel._get_collection(), game_archive, batch_size)
+
+    def get_live_game(self, game_id):
+        # only the game's version is read from the db on a cache hit
+        try:
+            with timer('fetch_version'):
+                version = GameModel.objects(id=game_id).scalar('version').get()
+        except GameModel.DoesNotExist:
+            game = self.get_archived_game(game_id)
+            return game, load_board(game)
+        cached = board_cache.get(game_id, version)
+        if cached is not None:
+            return cached
+
+        with timer('fetch'):
+            game = GameModel.objects(id=game_id).get()
+        with timer('load_board'):
+            board = load_board(game)
+        board_cache.put(game_id, game.version, game, board)
+        return game, board
+
+    def get_moves(self, game_id, skip, limit):
+        # packed games are a byte per move, so they are read whole and cut here. Legacy games
+        # are cut server-side with a $slice projection, so we only transfer the moves we return
+        # (moves are stored in turn order, no need to sort them)
+        try:
+            with timer('fetch'):
+                g = GameModel.objects(id=game_id).fields(
+                    id=1, players=1, packed_moves=1, slice__moves=[skip, limit]).get()
+        except GameModel.DoesNotExist:
+            return list(self.get_archived_game(game_id).moves[skip:skip + limit])
+        if g.packed_moves is not None:
+            return list(g.moves[skip:skip + limit])
+        return list(g.moves)
+
+    def commit_moves(self, game, board, new_moves, expected_version, expected_token=None):
+        query, update = move_update(game, board, new_moves, expected_version, expected_token)
+        with timer('save'):
+            result = GameModel._get_collection().update_one(query, update)
+        return finish_commit(game, board, expected_version, result.modified_count == 1)
+
+    def game_state(self, game_id):
+        # state, winner and the number of moves, without transferring the moves
+        try:
+            with timer('fetch'):
+                doc = GameModel.objects(id=game_id).aggregate([
+                    { '$project': { 'state': 1, 'winner': 1, 'packed_moves': 1,
+                        'turn': { '$size': { '$ifNull': ['$moves', []] } } } },
+                ]).next()
+        except ValidationError:
+            return None
+        except StopIteration:
+            return super().game_state(game_id)
+        return GameState(move_count(doc), doc['state'], doc.get('winner'))
+
+    def get_archived_game(self, game_id):
+        """
+            Return: an archived game (without a board snapshot, they're never played on again)
+            Raises GameModel.DoesNotExist if it isn't archived either.
+        """
+        with timer('fetch_archive'):
+            game = game_archive.get_game(game_id)
+        if game is None:
+            raise GameModel.DoesNotExist(f"Game {game_id} not found.")
+        return game
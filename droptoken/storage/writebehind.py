@@ -0,0 +1,225 @@
+import logging
+import os
+from bisect import bisect_left
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from pymongo import ReplaceOne
+
+from droptoken.archive import GameArchive
+from droptoken.boards import load_board
+from droptoken.metrics import timer
+from droptoken.models.game import GameModel
+from droptoken.storage.journal import JournalStore
+from droptoken.storage.mongo import iter_stored_games
+from droptoken.storage.memory import parse_id
+
+log = logging.getLogger(__name__)
+
+
+class WriteBehindStore(JournalStore):
+    """
+        Games being played live in memory and are the authoritative copy; MongoDB catches up
+        in the background.
+        A write is acknowledged once it is appended to the journal (a JournalStore file at `path`).
+        Every `flush_interval` seconds a thread writes the games changed since the last flush
+        to MongoDB in one bulk write of whole documents, so a game that got 20 moves in
+        a second costs one write instead of 20.
+        Games are read from MongoDB (or the archive, see droptoken/archive.py) on first use and
+        dropped from memory once they are flushed and DONE, or untouched for `idle_timeout` seconds.
+        Listings are read from MongoDB, with the games it doesn't have yet taken from memory,
+        so they never wait on (or fail with) a flush.
+
+        The journal is rotated at each flush (to `path`.1) and the old one removed once its
+        games are in MongoDB. On start, both are replayed on top of what MongoDB has, skipping
+        moves MongoDB already has (by version), and flushed again.
+        This process must be the only writer of the games in MongoDB.
+    """
+
+    def __init__(self, path, flush_interval=1.0, idle_timeout=60.0, fsync=False, collection=None):
+        self._collection = collection
+        self._archive = GameArchive(games=collection)
+        self._dirty = set()           # ids of games changed since the last flush
+        self._flushing = set()        # ids of games being written by the running flush
+        self._touched = {}            # id -> monotonic() of the last read or write
+        self._flush_lock = Lock()     # one flush at a time
+        self.flush_interval = flush_interval
+        self.idle_timeout = idle_timeout
+        super().__init__(path, fsync=fsync)
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name='game-write-behind', daemon=True)
+        self._thread.start()
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = GameModel._get_collection()
+        return self._collection
+
+    @property
+    def rotated_path(self):
+        return f'{self.path}.1'
+
+    def _recover(self):
+        # records of a rotated journal come first
+        self._replay(self.rotated_path)
+        self._replay(self.path)
+
+    def _apply(self, record):
+        game_id = record['game']['_id'] if record['op'] == 'create' else record['_id']
+        if record['op'] == 'create' and game_id in self._games:
+            return
+        if record['op'] == 'moves':
+            if game_id not in self._games:
+                game = self._fetch(game_id)
+                if game is None:
+                    log.error("Game %s is in the journal but not in the database, skipping", game_id)
+                    return
+                self._insert(game, load_board(game))
+            if record['set']['version'] <= self._games[game_id][0].version:
+                # flushed before the restart
+                return
+        super()._apply(record)
+        self._dirty.add(game_id)
+        self._touched[game_id] = monotonic()
+
+    def _fetch(self, game_id):
+        with timer('fetch'):
+            doc = self.collection.find_one({ '_id': game_id })
+        if doc is not None:
+            return GameModel._from_son(doc)
+        with timer('fetch_archive'):
+            return self._archive.get_game(game_id)
+
+    def _append(self, *records):
+        # caller holds the lock. Marked in the same critical section, so a flush either sees
+        # the games as dirty or rotates the journal after these records
+        super()._append(*records)
+        now = monotonic()
+        for record in records:
+            game_id = record['game']['_id'] if record['op'] == 'create' else record['_id']
+            self._dirty.add(game_id)
+            self._touched[game_id] = now
+
+    def _pending(self):
+        """
+            Return: { id: game } of the games MongoDB doesn't have up to date (not flushed yet)
+        """
+        with self._lock:
+            return { game_id: self._games[game_id][0] for game_id in self._dirty | self._flushing }
+
+    def list_game_ids(self, limit, after=None, state=None, player=None):
+        pending = self._pending()
+        query = {}
+        if after is not None:
+            query['_id'] = { '$gt': after }
+        if state is not None:
+            query['state'] = state
+        if player is not None:
+            query['players.name'] = player
+        # MongoDB's copy of a pending game is stale (or missing): theirs are left out, and
+        # enough others asked for to still fill the page
+        with timer('fetch'):
+            stored = self.collection.find(query, { '_id': 1 }).sort('_id').limit(limit + len(pending))
+            ids = [ doc['_id'] for doc in stored if doc['_id'] not in pending ]
+        ids += [
+            game.id for game in pending.values()
+            if (after is None or game.id > after)
+            and (state is None or game.state == state)
+            and (player is None or any(p.name == player for p in game.players))
+        ]
+        return [ str(game_id) for game_id in sorted(ids)[:limit] ]
+
+    def iter_games(self, batch_size=1000):
+        # like list_game_ids: MongoDB's games, with the pending ones taken from memory
+        pending = self._pending()
+        for game in iter_stored_games(self.collection, self._archive, batch_size):
+            if game.id not in pending:
+                yield game
+        yield from pending.values()
+
+    def get_live_game(self, game_id):
+        game_id = parse_id(game_id)
+        with self._lock:
+            entry = self._games.get(game_id)
+            if entry is not None:
+                self._touched[game_id] = monotonic()
+                return entry
+
+        game = self._fetch(game_id)
+        if game is None:
+            raise GameModel.DoesNotExist(f"Game {game_id} not found.")
+        board = load_board(game)
+        with self._lock:
+            # somebody else may have loaded it meanwhile
+            if game_id not in self._games:
+                self._insert(game, board)
+            self._touched[game_id] = monotonic()
+            return self._games[game_id]
+
+    def commit_moves(self, game, board, new_moves, expected_version, expected_token=None):
+        # it may have been dropped from memory since it was checked out
+        self.get_live_game(game.id)
+        return super().commit_moves(game, board, new_moves, expected_version, expected_token)
+
+    def flush(self):
+        """
+            Write every game changed since the last flush to MongoDB.
+            On failure they stay pending for the next flush (and in the journal).
+            Return: number of games written
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    if os.path.exists(self.rotated_path):
+                        # replayed on start, and all of it was already in MongoDB
+                        os.remove(self.rotated_path)
+                    return 0
+                ids, self._dirty = self._dirty, set()
+                self._flushing = ids
+                games = [ self._games[game_id][0] for game_id in ids ]
+                if not os.path.exists(self.rotated_path):
+                    # everything in the journal so far is covered by `games`
+                    self._file.close()
+                    os.replace(self.path, self.rotated_path)
+                    self._file = open(self.path, 'ab')
+
+            # stored games are never changed in place (see MemoryStore), no lock needed
+            requests = [ ReplaceOne({ '_id': g.id }, g.to_mongo(), upsert=True) for g in games ]
+            try:
+                with timer('flush'):
+                    self.collection.bulk_write(requests, ordered=False)
+            except Exception:
+                with self._lock:
+                    self._dirty |= ids
+                    self._flushing = set()
+                raise
+            with self._lock:
+                self._flushing = set()
+            os.remove(self.rotated_path)
+            self._evict()
+            return len(games)
+
+    def _evict(self):
+        now = monotonic()
+        with self._lock:
+            for game_id, (game, _) in list(self._games.items()):
+                if game_id in self._dirty:
+                    continue
+                if game.state == 'DONE' or now - self._touched.get(game_id, 0) > self.idle_timeout:
+                    del self._games[game_id]
+                    self._touched.pop(game_id, None)
+                    del self._ids[bisect_left(self._ids, game_id)]
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Flushing games to the database failed, retrying")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        super().close()
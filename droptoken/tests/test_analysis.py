@@ -0,0 +1,48 @@
+from time import monotonic
+
+import pytest
+
+from droptoken.analysis import ParallelSolver, search_child
+from droptoken.logic import new_board
+from droptoken.solver import WIN_BOUND, Solver
+
+def board_with(nc, nr, moves):
+    game = new_board(nc, nr)
+    game.apply_moves([ {'token': t, 'column': c} for t, c in moves ])
+    return game
+
+@pytest.fixture(scope='module')
+def parallel():
+    solver = ParallelSolver(processes=2)
+    yield solver
+    solver.shutdown()
+
+@pytest.mark.parametrize('moves, token', [
+    ([], 1),
+    ([(1, 4), (2, 4), (1, 3)], 2),
+    ([(1, 1), (2, 7), (1, 2), (2, 7), (1, 3)], 2),
+])
+def test_same_answer_as_a_serial_search(parallel, moves, token):
+    result = parallel.solve(board_with(7, 6, moves), token, time_limit=0, max_depth=5)
+    serial = Solver().solve(board_with(7, 6, moves), token, time_limit=0, max_depth=5)
+    assert (result.column, result.score, result.depth) == (serial.column, serial.score, serial.depth)
+
+def test_takes_an_immediate_win_without_the_pool():
+    solver = ParallelSolver(processes=2)
+    game = board_with(7, 6, [(1, 1), (2, 1), (1, 2), (2, 2), (1, 3), (2, 3)])
+    result = solver.solve(game, 1, time_limit=0)
+    assert result.column == 4
+    assert result.score > WIN_BOUND
+    assert solver._pool is None
+
+def test_full_board_has_no_move(parallel):
+    game = board_with(1, 2, [(1, 1), (2, 1)])
+    assert parallel.solve(game, 1).column is None
+
+def test_queued_search_only_gets_the_time_left():
+    game = board_with(7, 6, [(1, 4)])
+    task = (7, 6) + game.snapshot() + (2, 5)
+    # started after the deadline: nothing is searched
+    assert search_child(task + (monotonic() - 0.01,)) == (None, 0)
+    score, nodes = search_child(task + (monotonic() + 60,))
+    assert score is not None and nodes > 0
@@ -0,0 +1,126 @@
+import pytest
+
+from droptoken.app import create_app
+from droptoken.archive import game_archive
+from droptoken.events import game_events
+from droptoken.storage import get_store
+
+def mongo_settings():
+    mongomock = pytest.importorskip('mongomock')
+    return { 'db': 'droptokendb', 'host': 'localhost', 'mongo_client_class': mongomock.MongoClient }
+
+@pytest.fixture(params=['memory', 'mongo'])
+def client(request):
+    config = { 'STORAGE': request.param, 'METRICS_ENABLED': False }
+    if request.param == 'mongo':
+        config['MONGODB_SETTINGS'] = mongo_settings()
+    yield create_app(config).test_client()
+    if request.param == 'mongo':
+        from mongoengine import disconnect
+        disconnect()
+        # the shared archive holds on to the collection of the client that was just dropped
+        game_archive._games = game_archive._archive = None
+
+def new_game(client, **body):
+    body = dict({ 'players': ['p1', 'p2'], 'columns': 4, 'rows': 4 }, **body)
+    res = client.post('/drop-token', json=body)
+    assert res.status_code == 200
+    return res.json['gameId']
+
+def moves_of(client, game_id):
+    return client.get(f'/drop-token/{game_id}/moves').json
+
+def test_move_loses_a_race_with_a_concurrent_one(client, monkeypatch):
+    game_id = new_game(client)
+    store = get_store()
+    # a request that loaded the game before the two moves below were written.
+    # It's p1's turn again after them, only the game's version tells it's stale
+    stale = store.checkout_game(game_id)
+    assert client.post(f'/drop-token/{game_id}/p1', json={ 'column': 1 }).status_code == 200
+    assert client.post(f'/drop-token/{game_id}/p2', json={ 'column': 2 }).status_code == 200
+
+    monkeypatch.setattr(store, 'checkout_game', lambda game_id: stale)
+    res = client.post(f'/drop-token/{game_id}/p1', json={ 'column': 3 })
+    assert res.status_code == 409
+    assert res.json['message'] == f"Game {game_id} was changed by another request. Reload the game and try again."
+    monkeypatch.undo()
+    assert [ m['column'] for m in moves_of(client, game_id) ] == [1, 2]
+
+def test_bulk_create_rejects_ai_players(client):
+    res = client.post('/drop-token/bulk', json={ 'games': [
+        { 'players': ['p1', 'p2'], 'columns': 4, 'rows': 4 },
+        { 'players': ['p1', 'p2'], 'columns': 4, 'rows': 4, 'ai_players': ['p1'] },
+    ] })
+    assert res.status_code == 400
+    assert res.json['message'] == {
+        '1': "AI players can't be set in bulk, create their games with POST /drop-token. Received ['p1']",
+    }
+    assert client.get('/drop-token').json['games'] == []
+
+@pytest.mark.parametrize('time_limit', ['nan', 'inf'])
+def test_hint_rejects_a_time_limit_that_never_runs_out(client, time_limit):
+    game_id = new_game(client)
+    res = client.get(f'/drop-token/{game_id}/hint?time_limit={time_limit}')
+    assert res.status_code == 400
+    assert 'is not a finite number' in res.json['message']['time_limit']
+
+def test_event_stream_reloads_a_game_the_hub_forgot(client, monkeypatch):
+    game_id = new_game(client)
+    assert client.post(f'/drop-token/{game_id}/p1', json={ 'column': 1 }).status_code == 200
+    res = client.get(f'/drop-token/{game_id}/stream?timeout=1', headers={ 'Accept': 'text/event-stream' })
+    chunks = iter(res.response)
+    assert next(chunks).startswith(b'event: update')
+    # between two waits, nobody is waiting on the game: another game pushes it out of the hub
+    monkeypatch.setattr(game_events, 'max_games', 1)
+    game_events.publish('another game', 0, 'IN_PROGRESS')
+    assert game_events.latest(game_id) is None
+    # no change before the timeout, the stream ends
+    assert list(chunks) == []
+    res.close()
+
+def test_batch_plays_every_move_in_one_write(client):
+    game_id = new_game(client)
+    res = client.post(f'/drop-token/{game_id}/moves/batch', json={ 'moves': [
+        { 'player': 'p1', 'column': 1 }, { 'player': 'p2', 'column': 2 },
+        { 'player': 'p1', 'column': 1 }, { 'player': 'p2', 'column': 2 },
+        { 'player': 'p1', 'column': 1 }, { 'player': 'p2', 'column': 2 },
+        { 'player': 'p1', 'column': 1 },
+        # the game is over, this one isn't played
+        { 'player': 'p2', 'column': 2 },
+    ] })
+    assert res.status_code == 200
+    assert res.json['moves'] == [ { 'status': 200, 'move': f"{game_id}/moves/{n}" } for n in range(1, 8) ]
+    assert res.json['state'] == 'DONE' and res.json['winner'] == 'p1'
+    assert [ m['column'] for m in moves_of(client, game_id) ] == [1, 2, 1, 2, 1, 2, 1]
+
+@pytest.mark.parametrize('bad_move, result', [
+    ({ 'player': 'p2', 'column': 5 }, { 'status': 400, 'message': "Illegal move. Unable to drop token in column 5" }),
+    ({ 'player': 'p1', 'column': 3 }, { 'status': 409, 'message': "Player p1 tried to post when it’s not their turn." }),
+])
+def test_batch_stops_at_the_first_failing_move(client, bad_move, result):
+    game_id = new_game(client)
+    res = client.post(f'/drop-token/{game_id}/moves/batch', json={ 'moves': [
+        { 'player': 'p1', 'column': 1 }, bad_move, { 'player': 'p2', 'column': 2 },
+    ] })
+    assert res.status_code == 200
+    assert res.json == {
+        'moves': [ { 'status': 200, 'move': f"{game_id}/moves/1" }, result ],
+        'state': 'IN_PROGRESS',
+    }
+    # the moves before it are saved
+    assert moves_of(client, game_id) == [ { 'type': 'MOVE', 'player': 'p1', 'column': 1 } ]
+
+def test_batch_loses_a_race_with_a_concurrent_move(client, monkeypatch):
+    game_id = new_game(client)
+    store = get_store()
+    stale = store.checkout_game(game_id)
+    assert client.post(f'/drop-token/{game_id}/p1', json={ 'column': 1 }).status_code == 200
+    assert client.post(f'/drop-token/{game_id}/p2', json={ 'column': 2 }).status_code == 200
+
+    monkeypatch.setattr(store, 'checkout_game', lambda game_id: stale)
+    res = client.post(f'/drop-token/{game_id}/moves/batch', json={ 'moves': [
+        { 'player': 'p1', 'column': 3 }, { 'player': 'p2', 'column': 4 },
+    ] })
+    assert res.status_code == 409
+    monkeypatch.undo()
+    assert [ m['column'] for m in moves_of(client, game_id) ] == [1, 2]
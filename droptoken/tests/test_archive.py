@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from droptoken.archive import GameArchive, pack_game, unpack_game
+from droptoken.boards import load_board, store_board
+from droptoken.logic import new_board
+from droptoken.models.game import GameModel, PlayerModel
+from droptoken.storage.writebehind import WriteBehindStore
+
+NOW = datetime(2026, 1, 31)
+
+def finished_game(days_ago, state='DONE'):
+    g = GameModel(
+        players=[ PlayerModel(token=1, name='p1'), PlayerModel(token=2, name='p2') ],
+        num_cols=4,
+        num_rows=4,
+        state=state,
+        last_modified=NOW - timedelta(days=days_ago),
+    )
+    gb = new_board(4, 4)
+    for turn, column in enumerate([1, 2, 1, 2, 1, 2, 1], start=1):
+        token = 1 if turn % 2 else 2
+        gb.drop_token(column, token)
+        g.moves.create(turn=turn, move_type='MOVE', player_name=f'p{token}', column=column)
+    if state == 'DONE':
+        g.winner = 'p1'
+    store_board(g, gb)
+    return g
+
+@pytest.fixture
+def archive():
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient().db
+    return GameArchive(games=db.game_model, archive=db.game_model_archive)
+
+def insert(archive, *games):
+    result = archive.games.insert_many([ g.to_mongo() for g in games ])
+    for g, game_id in zip(games, result.inserted_ids):
+        g.id = game_id
+
+def test_pack_round_trip_drops_the_board_snapshot():
+    g = finished_game(0)
+    doc = g.to_mongo().to_dict()
+    doc['_id'] = 'some-id'
+    restored = unpack_game(pack_game(doc))
+    assert restored.board_cells is None and restored.heights is None
+    assert [m.column for m in restored.moves] == [1, 2, 1, 2, 1, 2, 1]
+    assert restored.winner == 'p1'
+    # the board is replayed from the moves
+    assert load_board(restored).snapshot() == (g.board_cells, g.heights)
+
+def test_only_old_done_games_are_archived_in_batches(archive):
+    old = [ finished_game(30) for _ in range(5) ]
+    recent, playing = finished_game(1), finished_game(30, state='IN_PROGRESS')
+    insert(archive, *old, recent, playing)
+
+    assert list(archive.archive_games(timedelta(days=7), batch_size=2, now=NOW)) == [2, 2, 1]
+    assert sorted(d['_id'] for d in archive.games.find()) == sorted([recent.id, playing.id])
+    assert archive.archive.count_documents({}) == 5
+    assert archive.get_game(str(old[0].id)).state == 'DONE'
+    assert archive.get_game(str(recent.id)) is None
+    assert archive.get_game('not-an-id') is None
+
+def test_rerun_after_an_interrupted_batch(archive):
+    g = finished_game(30)
+    insert(archive, g)
+    # archived, but not deleted from the game collection yet
+    archive.archive.insert_one(pack_game(archive.games.find_one({ '_id': g.id })))
+    assert list(archive.archive_games(timedelta(days=7), now=NOW)) == [1]
+    assert archive.games.count_documents({}) == 0
+    assert archive.archive.count_documents({}) == 1
+
+def test_write_behind_reads_archived_games(tmp_path, archive):
+    g = finished_game(30)
+    insert(archive, g)
+    list(archive.archive_games(timedelta(days=7), now=NOW))
+    store = WriteBehindStore(str(tmp_path / 'journal'), flush_interval=3600, collection=archive.games)
+    game, board = store.get_live_game(str(g.id))
+    assert game.state == 'DONE'
+    assert board.snapshot() == (g.board_cells, g.heights)
+    with pytest.raises(GameModel.DoesNotExist):
+        store.get_live_game('5f0000000000000000000000')
+    store.close()
@@ -0,0 +1,116 @@
+import pytest
+
+from droptoken.app import create_app
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+testclient = pytest.importorskip('starlette.testclient')
+
+from droptoken import asgi
+
+class FlaskCaller(object):
+    def __init__(self):
+        self.client = create_app({ 'STORAGE': 'memory', 'METRICS_ENABLED': False }).test_client()
+
+    def __call__(self, method, url, json=None, data=None, content_type=None):
+        if data is not None:
+            res = self.client.open(url, method=method, data=data, content_type=content_type)
+        else:
+            res = self.client.open(url, method=method, json=json)
+        return res.status_code, res.get_json()
+
+class AsgiCaller(object):
+    def __init__(self, monkeypatch):
+        monkeypatch.setattr(asgi, '_client', mongomock_motor.AsyncMongoMockClient())
+        self.client = testclient.TestClient(asgi.app)
+
+    def __call__(self, method, url, json=None, data=None, content_type=None):
+        if data is not None:
+            res = self.client.request(method, url, content=data, headers={ 'content-type': content_type })
+        else:
+            res = self.client.request(method, url, json=json)
+        return res.status_code, res.json()
+
+def session(call):
+    """
+        The same requests against either app.
+        Return: list of (status, body), with the game ids replaced by names
+    """
+    log = []
+    ids = {}
+
+    def request(method, url, **kwargs):
+        for name, game_id in ids.items():
+            url = url.replace(name, game_id)
+        status, body = call(method, url, **kwargs)
+        log.append((method, url, status, repr(body)))
+        return body
+
+    # create
+    ids['GAME1'] = request('POST', '/drop-token', json={ 'players': ['p1', 'p2'], 'columns': 4, 'rows': 4 })['gameId']
+    ids['GAME2'] = request('POST', '/drop-token/', json={ 'players': ['a', 'b'], 'columns': 5, 'rows': 4 })['gameId']
+    request('POST', '/drop-token', json={ 'players': ['p1', 'p1'], 'columns': 4, 'rows': 4 })
+    request('POST', '/drop-token', json={ 'players': ['p1', 'p2'], 'columns': 100, 'rows': 4 })
+    request('POST', '/drop-token', json={ 'columns': 4, 'rows': 4 })
+    request('POST', '/drop-token', data='{"players": ', content_type='application/json')
+    request('POST', '/drop-token', data='{"players": ["p1", "p2"], "columns": 4, "rows": 4}', content_type='text/plain')
+    request('POST', '/drop-token/bulk', json={ 'games': [
+        { 'players': ['p1', 'p2'], 'columns': 4, 'rows': 4 },
+        { 'players': ['p1', 'p2'], 'columns': 4, 'rows': 4, 'ai_players': ['p2'] },
+    ] })
+
+    # move
+    for player, column in (('p1', 1), ('p2', 2), ('p1', 1), ('p2', 2), ('p1', 1), ('p2', 2)):
+        request('POST', '/drop-token/GAME1/p1/' if player == 'p1' else '/drop-token/GAME1/p2', json={ 'column': column })
+    request('POST', '/drop-token/GAME1/p2', json={ 'column': 3 })
+    request('POST', '/drop-token/GAME1/p1', json={ 'column': 5 })
+    request('POST', '/drop-token/GAME1/p3', json={ 'column': 1 })
+    request('POST', '/drop-token/GAME1/p1', json={})
+    request('POST', '/drop-token/GAME1/p1', data='{"column": 1', content_type='application/json')
+    request('POST', '/drop-token/GAME1/p1', json={ 'column': 1 })
+    request('POST', '/drop-token/GAME1/p2', json={ 'column': 1 })
+
+    # detail
+    request('GET', '/drop-token/GAME1')
+    request('GET', '/drop-token/GAME2')
+    request('GET', '/drop-token/5f0000000000000000000000')
+
+    # hint
+    request('GET', '/drop-token/GAME2/hint?time_limit=nan')
+    request('GET', '/drop-token/GAME2/hint?time_limit=inf&deep=true')
+
+    # moves
+    request('GET', '/drop-token/GAME1/moves')
+    request('GET', '/drop-token/GAME1/moves?start=2&until=3')
+    request('GET', '/drop-token/GAME1/moves?start=50')
+    request('GET', '/drop-token/GAME2/moves')
+    request('GET', '/drop-token/GAME1/moves/0')
+    request('GET', '/drop-token/GAME1/moves/6')
+    request('GET', '/drop-token/GAME1/moves/99')
+
+    # list
+    request('GET', '/drop-token')
+    request('GET', '/drop-token?state=DONE')
+    request('GET', '/drop-token?player=a')
+    request('GET', '/drop-token?limit=1')
+    request('GET', '/drop-token?limit=0')
+
+    # delete
+    request('DELETE', '/drop-token/GAME2/c')
+    request('DELETE', '/drop-token/GAME2/a')
+    request('DELETE', '/drop-token/GAME2/b')
+    request('GET', '/drop-token/GAME2')
+    request('GET', '/drop-token/GAME2/moves')
+    request('GET', '/drop-token?state=IN_PROGRESS')
+
+    def named(text):
+        for name, game_id in ids.items():
+            text = text.replace(game_id, name)
+        return text
+    return [ tuple(named(x) if isinstance(x, str) else x for x in entry) for entry in log ]
+
+def test_asgi_app_answers_like_the_flask_app(monkeypatch):
+    flask_log = session(FlaskCaller())
+    asgi_log = session(AsgiCaller(monkeypatch))
+    for flask_res, asgi_res in zip(flask_log, asgi_log):
+        assert asgi_res == flask_res
+    assert len(asgi_log) == len(flask_log)
@@ -0,0 +1,127 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from droptoken import storage
+from droptoken.archive import game_archive
+from droptoken.batch import find_wins, replay_games
+from droptoken.boards import audit_winners, store_board
+from droptoken.logic import GameBoard, new_board
+from droptoken.models.game import GameModel, PlayerModel
+from droptoken.storage.mongo import MongoStore
+
+# boards from test_logic.py
+BOARDS = [
+    [[2, 2, 2, 0], [1, 2, 0, 0], [1, 1, 2, 0], [1, 1, 1, 2]],
+    [[2, 2, 2, 1], [2, 2, 1, 0], [2, 1, 1, 1], [1, 1, 0, 0]],
+    [[2, 2, 2, 1], [2, 2, 1, 1], [2, 1, 1, 1], [1, 0, 0, 0]],
+    [[2, 2, 2, 0], [2, 2, 1, 0], [2, 1, 1, 1], [1, 1, 1, 0]],
+    [[1, 1, 1, 1], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
+    [[1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0]],
+]
+
+def game_board_wins(board):
+    game = GameBoard(len(board), len(board[0]))
+    game.board = [list(col) for col in board]
+    return [
+        [bool(board[c][r]) and game.check_win(c + 1, r + 1) for r in range(len(board[0]))]
+        for c in range(len(board))
+    ]
+
+def test_find_wins_agrees_with_game_board_on_test_boards():
+    wins = find_wins(np.array(BOARDS))
+    for i, board in enumerate(BOARDS):
+        assert wins[i].tolist() == game_board_wins(board)
+
+def test_replay_detects_column_win():
+    moves = [{'token': 1, 'column': 1}, {'token': 2, 'column': 2}] * 3 + [{'token': 1, 'column': 1}]
+    res = replay_games([moves], 4, 4)
+    assert res['winner'].tolist() == [1]
+    assert res['final_turn'].tolist() == [7]
+    assert not res['draw'][0]
+
+def test_replay_stops_on_illegal_move():
+    moves = [{'token': 1, 'column': 4}, {'token': 2, 'column': 1}]
+    res = replay_games([moves], 3, 2)
+    assert res['valid'].tolist() == [False]
+    assert res['final_turn'].tolist() == [0]
+
+def test_replay_detects_draw():
+    # fill a 2x2 board, nobody can make 4
+    moves = [{'token': t, 'column': c} for t, c in [(1, 1), (2, 2), (1, 2), (2, 1)]]
+    res = replay_games([moves], 2, 2)
+    assert res['draw'].tolist() == [True]
+    assert res['winner'].tolist() == [0]
+
+@pytest.mark.parametrize('nc, nr', [(4, 4), (7, 6), (9, 5)])
+def test_replay_agrees_with_game_board_on_random_games(nc, nr):
+    rng = random.Random(nc * 10 + nr)
+    games, expected = [], []
+    for _ in range(100):
+        gb = GameBoard(nc, nr)
+        moves, winner, token = [], 0, 1
+        # random length, so some games end early and the batch is ragged
+        for _ in range(rng.randint(0, nc * nr)):
+            col = rng.choice([c for c in range(1, nc + 1) if gb.can_drop(c)])
+            row = gb.drop_token(col, token)
+            moves.append({'token': token, 'column': col})
+            if gb.check_win(col, row):
+                winner = token
+                break
+            token = 3 - token
+        # moves after the end of the game must be ignored
+        if winner:
+            moves.append({'token': token, 'column': 1})
+        games.append(moves)
+        expected.append((winner, len(moves) - (1 if winner else 0), gb.board))
+
+    res = replay_games(games, nc, nr)
+    for i, (winner, final_turn, board) in enumerate(expected):
+        assert res['winner'][i] == winner
+        assert res['final_turn'][i] == final_turn
+        assert res['draw'][i] == (not winner and final_turn == nc * nr)
+        assert res['boards'][i].tolist() == [[t or 0 for t in col] for col in board]
+
+def audited_game(columns, state, winner=None):
+    g = GameModel(
+        players=[ PlayerModel(token=1, name='p1'), PlayerModel(token=2, name='p2') ],
+        num_cols=4,
+        num_rows=4,
+        state=state,
+        winner=winner,
+        last_modified=datetime(2026, 1, 1),
+    )
+    gb = new_board(4, 4)
+    for turn, column in enumerate(columns, start=1):
+        token = 1 if turn % 2 else 2
+        gb.drop_token(column, token)
+        g.moves.create(turn=turn, move_type='MOVE', player_name=f'p{token}', column=column)
+    store_board(g, gb)
+    return g
+
+def test_audit_winners_reads_the_configured_store_and_the_archive(monkeypatch):
+    mongomock = pytest.importorskip('mongomock')
+    from mongoengine import connect, disconnect
+    connect('droptokendb', mongo_client_class=mongomock.MongoClient)
+    monkeypatch.setattr(storage, '_store', MongoStore())
+    monkeypatch.setattr(game_archive, '_games', None)
+    monkeypatch.setattr(game_archive, '_archive', None)
+
+    right = audited_game([1, 2, 1, 2, 1, 2, 1], 'DONE', 'p1')
+    wrong = audited_game([1, 2, 1, 2, 1, 2, 1], 'DONE', 'p2')
+    storage.get_store().create_games([right, wrong])
+    list(game_archive.archive_games(timedelta(days=1)))
+    assert GameModel.objects.count() == 0
+    # won, but never marked so
+    playing = audited_game([1, 2, 1, 2, 1, 2, 1], 'IN_PROGRESS')
+    storage.get_store().create_game(playing)
+
+    mismatches = list(audit_winners())
+    disconnect()
+    assert sorted((str(game_id), stored, replayed) for game_id, stored, replayed in mismatches) == sorted([
+        (str(wrong.id), ('DONE', 'p2'), ('DONE', 'p1')),
+        (str(playing.id), ('IN_PROGRESS', None), ('DONE', 'p1')),
+    ])
@@ -0,0 +1,190 @@
+import random
+
+import pytest
+
+from droptoken.logic import BitBoard, GameBoard, new_board
+
+def test_create_board_with_all_cells_set_to_none():
+    nc, nr = 3, 2
+    game = BitBoard(nc, nr)
+    assert game.board == [[None] * nr for _ in range(nc)]
+
+def test_can_drop_token_into_empty_column():
+    game = BitBoard(1, 3)
+    assert game.can_drop(1)
+
+def test_cannot_drop_token_into_full_column():
+    game = BitBoard(1, 3)
+    for _ in range(3):
+        game.drop_token(1, 1)
+    assert not game.can_drop(1)
+
+def test_cannot_drop_token_into_nonexisting_column():
+    game = BitBoard(1, 3)
+    assert not game.can_drop(0)
+    assert not game.can_drop(2)
+
+def test_drop_token_returns_row():
+    game = BitBoard(2, 3)
+    assert game.drop_token(1, 1) == 1
+    assert game.drop_token(1, 2) == 2
+    assert game.drop_token(2, 1) == 1
+    assert game.token_at(1, 2) == 2
+
+def test_dropping_token_to_nonexisting_column_fails():
+    game = BitBoard(2, 2)
+    assert not game.drop_token(3, 1)
+
+def test_winning_condition_detected_for_full_column():
+    game = BitBoard(4, 4)
+    for _ in range(4):
+        game.drop_token(1, 1)
+    assert game.check_win(1, 4)
+
+def test_winning_condition_detected_for_full_row():
+    game = BitBoard(4, 4)
+    for c in range(1, 5):
+        game.drop_token(c, 1)
+    assert all(game.check_win(c, 1) for c in range(1, 5))
+
+def test_column_runs_do_not_wrap_into_next_column():
+    # two tokens at the top of column 1, two at the bottom of column 2
+    game = BitBoard(2, 4)
+    game.apply_moves([
+        {'token': 2, 'column': 1}, {'token': 2, 'column': 1},
+        {'token': 1, 'column': 1}, {'token': 1, 'column': 1},
+        {'token': 1, 'column': 2}, {'token': 1, 'column': 2},
+    ])
+    assert not game.check_win(2, 1)
+    assert not game.check_win(1, 4)
+
+def test_win_is_only_reported_for_cells_in_the_run():
+    game = BitBoard(5, 4)
+    for c in range(1, 5):
+        game.drop_token(c, 1)
+    game.drop_token(5, 1)
+    game.drop_token(1, 1)
+    assert game.check_win(5, 1)
+    assert not game.check_win(1, 2)
+
+def test_winning_condition_detected_for_diagonals():
+    main_diagonal = [
+        [2, 2, 2],
+        [1, 2],
+        [1, 1, 2],
+        [1, 1, 1, 2],
+    ]
+    secondary_diagonal = [
+        [2, 2, 2, 1],
+        [2, 2, 1],
+        [2, 1, 1, 1],
+        [1, 1],
+    ]
+    for columns, cells in [(main_diagonal, [(1, 1), (3, 3), (4, 4)]), (secondary_diagonal, [(1, 4), (2, 3), (4, 1)])]:
+        game = BitBoard(4, 4)
+        for c, tokens in enumerate(columns, start=1):
+            for t in tokens:
+                game.drop_token(c, t)
+        for c, r in cells:
+            assert game.check_win(c, r)
+
+def test_empty_cell_is_not_a_winner():
+    game = BitBoard(4, 4)
+    assert not game.check_win(1, 1)
+
+def test_apply_all_moves_should_succeed():
+    game = BitBoard(4, 2)
+    moves = [
+        {'token': 1, 'column': 4},
+        {'token': 2, 'column': 1},
+        {'token': 1, 'column': 1},
+        {'token': 2, 'column': 3}
+    ]
+    expected_board = [
+        [2, 1],
+        [None, None],
+        [2, None],
+        [1, None]
+    ]
+    assert game.apply_moves(moves)
+    assert game.board == expected_board
+
+def test_apply_all_moves_should_fail():
+    game = BitBoard(3, 2)
+    moves = [
+        {'token': 1, 'column': 4},
+        {'token': 2, 'column': 1},
+    ]
+    assert not game.apply_moves(moves)
+
+def test_new_board_picks_engine_by_name():
+    assert isinstance(new_board(4, 4), GameBoard)
+    assert isinstance(new_board(4, 4, 'bitboard'), BitBoard)
+
+@pytest.mark.parametrize('nc, nr', [(4, 4), (7, 6), (9, 5), (5, 12)])
+def test_agrees_with_game_board_on_random_games(nc, nr):
+    rng = random.Random(nc * 100 + nr)
+    for _ in range(50):
+        gb, bb = GameBoard(nc, nr), BitBoard(nc, nr)
+        token = 1
+        while True:
+            open_cols = [c for c in range(1, nc + 1) if gb.can_drop(c)]
+            assert open_cols == [c for c in range(1, nc + 1) if bb.can_drop(c)]
+            if not open_cols:
+                break
+            col = rng.choice(open_cols)
+            row = gb.drop_token(col, token)
+            assert bb.drop_token(col, token) == row
+            won = gb.check_win(col, row)
+            assert bb.check_win(col, row) == won
+            if won:
+                break
+            token = 3 - token
+        assert bb.board == gb.board
+
+@pytest.mark.parametrize('nc, nr', [(4, 4), (7, 6), (5, 12), (12, 5)])
+def test_check_win_agrees_on_every_cell_of_full_boards(nc, nr):
+    # three tokens, so runs end up everywhere, including along the board's edges
+    rng = random.Random(nc * 100 + nr)
+    for _ in range(10):
+        gb, bb = GameBoard(nc, nr), BitBoard(nc, nr)
+        for _ in range(nc * nr):
+            col = rng.choice([c for c in range(1, nc + 1) if gb.can_drop(c)])
+            token = rng.choice([1, 2, 3])
+            gb.drop_token(col, token)
+            bb.drop_token(col, token)
+        for c in range(1, nc + 1):
+            for r in range(1, nr + 1):
+                assert bb.check_win(c, r) == gb.check_win(c, r)
+
+def test_snapshot_matches_game_board():
+    moves = [
+        {'token': 1, 'column': 4},
+        {'token': 2, 'column': 1},
+        {'token': 1, 'column': 1},
+        {'token': 2, 'column': 1},
+    ]
+    gb, bb = GameBoard(4, 3), BitBoard(4, 3)
+    gb.apply_moves(moves)
+    bb.apply_moves(moves)
+    assert bb.snapshot() == gb.snapshot()
+    restored = BitBoard.from_snapshot(4, 3, *gb.snapshot())
+    assert restored.board == gb.board
+    assert restored.drop_token(1, 1) is None
+    assert restored.drop_token(4, 2) == 2
+
+def test_copy_is_independent():
+    game = BitBoard(2, 2)
+    game.drop_token(1, 1)
+    other = game.copy()
+    other.drop_token(1, 2)
+    assert game.board == [[1, None], [None, None]]
+    assert other.board == [[1, 2], [None, None]]
+
+def test_column_win_is_reported_from_the_top_like_game_board():
+    gb, bb = GameBoard(1, 5), BitBoard(1, 5)
+    for _ in range(5):
+        gb.drop_token(1, 1)
+        bb.drop_token(1, 1)
+    for r in range(1, 6):
+        assert bb.check_win(1, r) == gb.check_win(1, r)
@@ -0,0 +1,40 @@
+import pytest
+
+from droptoken.boards import BoardCache
+
+def test_cache_miss_then_hit():
+    cache = BoardCache(max_size=2)
+    assert cache.get('g1', 0) is None
+    cache.put('g1', 0, 'game', 'board')
+    assert cache.get('g1', 0) == ('game', 'board')
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_stale_version_is_a_miss():
+    cache = BoardCache(max_size=2)
+    cache.put('g1', 1, 'game', 'board')
+    assert cache.get('g1', 2) is None
+
+def test_older_version_does_not_replace_newer():
+    cache = BoardCache(max_size=2)
+    cache.put('g1', 2, 'new game', 'new board')
+    cache.put('g1', 1, 'old game', 'old board')
+    assert cache.get('g1', 2) == ('new game', 'new board')
+
+def test_least_recently_used_is_evicted():
+    cache = BoardCache(max_size=2)
+    cache.put('g1', 0, 'game1', 'board1')
+    cache.put('g2', 0, 'game2', 'board2')
+    cache.get('g1', 0)
+    cache.put('g3', 0, 'game3', 'board3')
+    assert cache.get('g2', 0) is None
+    assert cache.get('g1', 0) is not None
+    assert cache.stats()['evictions'] == 1
+
+def test_resize_evicts_down_to_new_size():
+    cache = BoardCache(max_size=3)
+    for i in range(3):
+        cache.put(f'g{i}', 0, 'game', 'board')
+    cache.resize(1)
+    assert cache.stats()['size'] == 1
+    assert cache.get('g2', 0) is not None
@@ -0,0 +1,72 @@
+import pytest
+
+from droptoken.book import OpeningBook, build_book, key, positions
+from droptoken.logic import GameBoard, new_board
+from droptoken.solver import Solver
+
+def board_with(nc, nr, moves, engine='list'):
+    game = new_board(nc, nr, engine)
+    game.apply_moves([ {'token': t, 'column': c} for t, c in moves ])
+    return game
+
+@pytest.fixture(scope='module')
+def book_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('book') / 'book.bin')
+    build_book(path, [(5, 4)], plies=3, depth=4, processes=1)
+    return path
+
+def test_mirror_images_share_a_key():
+    left = board_with(7, 6, [(1, 1), (2, 2)])
+    right = board_with(7, 6, [(1, 7), (2, 6)])
+    (k1, m1), (k2, m2) = key(left, 1), key(right, 1)
+    assert k1 == k2
+    assert m1 != m2
+
+def test_key_depends_on_size_and_side_to_move():
+    assert key(GameBoard(7, 6), 1) != key(GameBoard(6, 7), 1)
+    game = board_with(7, 6, [(1, 4)])
+    assert key(game, 1)[0] != key(game, 2)[0]
+
+@pytest.mark.parametrize('engine', ['bitboard', 'lines'])
+def test_key_is_the_same_for_every_engine(engine):
+    moves = [(1, 4), (2, 3), (1, 4)]
+    assert key(board_with(7, 6, moves, engine), 2) == key(board_with(7, 6, moves), 2)
+
+def test_positions_are_unique_up_to_mirroring():
+    found = list(positions(7, 6, 2))
+    # empty board, 4 first moves (7 up to mirroring), then 4 stacked + 21 side by side replies
+    assert len(found) == 1 + 4 + 4 + 21
+    assert len({ k for k, *_ in found }) == len(found)
+
+def test_book_has_the_searched_moves(book_path):
+    book = OpeningBook(book_path)
+    assert book.count == len(list(positions(5, 4, 3)))
+    for moves, token in [([], 1), ([(1, 1)], 2), ([(1, 5)], 2), ([(1, 2), (2, 3), (1, 2)], 2)]:
+        game = board_with(5, 4, moves)
+        found = book.lookup(game, token)
+        searched = Solver().solve(game, token, time_limit=0, max_depth=4)
+        assert found.score == searched.score
+        assert found.depth == searched.depth
+        # mirrored positions may pick the mirror of an equally good move
+        assert found.column in (searched.column, 6 - searched.column)
+    book.close()
+
+def test_mirrored_lookups_mirror_the_column(book_path):
+    book = OpeningBook(book_path)
+    left = book.lookup(board_with(5, 4, [(1, 1)]), 2)
+    right = book.lookup(board_with(5, 4, [(1, 5)]), 2)
+    assert left.column == 6 - right.column
+    book.close()
+
+def test_misses_outside_the_book(book_path):
+    book = OpeningBook(book_path)
+    assert book.lookup(board_with(5, 4, [(1, 1), (2, 1), (1, 1), (2, 1)]), 1) is None
+    assert book.lookup(GameBoard(7, 6), 1) is None
+    book.close()
+    assert book.lookup(GameBoard(5, 4), 1) is None
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'not-a-book'
+    path.write_bytes(b'hello, world, this is not a book')
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from droptoken.logic import ENGINES, CompactBoard, GameBoard, new_board
+
+def test_create_board_with_all_cells_set_to_none():
+    game = CompactBoard(3, 2)
+    assert game.board == [[None] * 2 for _ in range(3)]
+
+def test_has_no_instance_dict():
+    game = CompactBoard(4, 4)
+    assert not hasattr(game, '__dict__')
+    with pytest.raises(AttributeError):
+        game.heights = [0] * 4
+
+def test_cannot_drop_token_into_full_or_nonexisting_column():
+    game = CompactBoard(1, 3)
+    for _ in range(3):
+        assert game.can_drop(1)
+        game.drop_token(1, 1)
+    assert not game.can_drop(1)
+    assert not game.can_drop(0)
+    assert not game.can_drop(2)
+    assert game.drop_token(1, 1) is None
+
+def test_drop_token_returns_row():
+    game = CompactBoard(2, 3)
+    assert game.drop_token(1, 1) == 1
+    assert game.drop_token(1, 2) == 2
+    assert game.drop_token(2, 1) == 1
+    assert game.token_at(1, 2) == 2
+    assert game.token_at(2, 2) is None
+
+def test_runs_do_not_wrap_into_next_column():
+    # two tokens at the top of column 1, two at the bottom of column 2
+    game = CompactBoard(2, 4)
+    game.apply_columns([1, 1, 1, 1, 2, 2], tokens=(2, 2, 1, 1))
+    assert game.board == [[2, 2, 1, 1], [2, 2, None, None]]
+    assert not game.check_win(2, 2)
+    assert not game.check_win(1, 4)
+
+def test_empty_cell_is_not_a_winner():
+    game = CompactBoard(4, 4)
+    assert not game.check_win(1, 1)
+
+def test_win_possible_until_full():
+    game = CompactBoard(1, 2)
+    game.drop_token(1, 1)
+    assert game.win_possible()
+    game.drop_token(1, 2)
+    assert not game.win_possible()
+
+def test_snapshot_round_trip():
+    game = CompactBoard(4, 3)
+    game.apply_columns(b'\x04\x01\x01\x01')
+    cells, heights = game.snapshot()
+    assert heights == [3, 0, 0, 1]
+    restored = CompactBoard.from_snapshot(4, 3, cells, heights)
+    assert restored.board == game.board
+    assert restored.drop_token(1, 1) is None
+    assert restored.drop_token(4, 2) == 2
+
+def test_copy_is_independent():
+    game = CompactBoard(2, 2)
+    game.drop_token(1, 1)
+    other = game.copy()
+    other.drop_token(1, 2)
+    assert game.board == [[1, None], [None, None]]
+    assert other.board == [[1, 2], [None, None]]
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_apply_columns_matches_apply_moves(engine):
+    columns = [4, 1, 1, 3, 1, 2]
+    moves = [ {'token': i % 2 + 1, 'column': c} for i, c in enumerate(columns) ]
+    by_moves, by_columns = new_board(4, 3, engine), new_board(4, 3, engine)
+    assert by_moves.apply_moves(moves)
+    assert by_columns.apply_columns(bytes(columns))
+    assert by_columns.snapshot() == by_moves.snapshot()
+    # the fourth token in column 1 doesn't fit
+    assert not by_columns.apply_columns([1])
+
+@pytest.mark.parametrize('nc, nr', [(4, 4), (7, 6), (9, 5), (5, 12)])
+def test_agrees_with_game_board_on_random_games(nc, nr):
+    rng = random.Random(nc * 100 + nr)
+    for _ in range(50):
+        gb, cb = GameBoard(nc, nr), CompactBoard(nc, nr)
+        token = 1
+        while True:
+            open_cols = [c for c in range(1, nc + 1) if gb.can_drop(c)]
+            assert open_cols == [c for c in range(1, nc + 1) if cb.can_drop(c)]
+            if not open_cols:
+                break
+            col = rng.choice(open_cols)
+            row = gb.drop_token(col, token)
+            assert cb.drop_token(col, token) == row
+            won = gb.check_win(col, row)
+            assert cb.check_win(col, row) == won
+            if won:
+                break
+            token = 3 - token
+        assert cb.board == gb.board
+        assert cb.snapshot() == gb.snapshot()
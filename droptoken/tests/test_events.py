@@ -0,0 +1,73 @@
+import threading
+import time
+
+from droptoken.events import GameEvents, GameState
+
+def test_wait_returns_immediately_if_already_past_turn():
+    events = GameEvents()
+    events.publish('g1', 3, 'IN_PROGRESS')
+    latest = events.wait('g1', 2, timeout=5)
+    assert latest.turn == 3
+
+def test_wait_times_out_without_changes():
+    events = GameEvents()
+    events.publish('g1', 3, 'IN_PROGRESS')
+    start = time.monotonic()
+    latest = events.wait('g1', 3, timeout=0.05)
+    assert latest.turn == 3
+    assert time.monotonic() - start >= 0.05
+
+def test_wait_wakes_up_on_publish():
+    events = GameEvents()
+    events.publish('g1', 0, 'IN_PROGRESS')
+    timer = threading.Timer(0.05, events.publish, args=('g1', 1, 'IN_PROGRESS'))
+    timer.start()
+    latest = events.wait('g1', 0, timeout=5)
+    timer.join()
+    assert latest.turn == 1
+
+def test_wait_returns_for_done_game():
+    events = GameEvents()
+    events.publish('g1', 4, 'DONE', 'player1')
+    latest = events.wait('g1', 4, timeout=5)
+    assert latest.state == 'DONE'
+    assert latest.winner == 'player1'
+
+def test_unknown_game_is_loaded_once():
+    events = GameEvents()
+    calls = []
+    def load():
+        calls.append(1)
+        return GameState(2, 'IN_PROGRESS')
+    assert events.wait('g1', 1, timeout=0, load=load).turn == 2
+    assert events.wait('g1', 1, timeout=0, load=load).turn == 2
+    assert len(calls) == 1
+
+def test_missing_game_returns_none():
+    events = GameEvents()
+    assert events.wait('g1', 0, timeout=0, load=lambda: None) is None
+
+def test_older_updates_are_ignored():
+    events = GameEvents()
+    events.publish('g1', 5, 'IN_PROGRESS')
+    events.publish('g1', 4, 'IN_PROGRESS')
+    assert events.latest('g1').turn == 5
+
+def test_least_recently_used_idle_games_are_forgotten():
+    events = GameEvents(max_games=2)
+    for game_id in ['g1', 'g2', 'g3']:
+        events.publish(game_id, 1, 'IN_PROGRESS')
+    assert events.latest('g1') is None
+    assert events.latest('g3').turn == 1
+
+def test_games_being_waited_on_are_not_forgotten():
+    events = GameEvents(max_games=2)
+    events.publish('g1', 1, 'IN_PROGRESS')
+    waiter = threading.Thread(target=events.wait, args=('g1', 1, 0.5))
+    waiter.start()
+    while not events._channels['g1'].waiters:
+        time.sleep(0.01)
+    for game_id in ['g2', 'g3', 'g4']:
+        events.publish(game_id, 1, 'IN_PROGRESS')
+    waiter.join()
+    assert list(events._channels) == ['g1', 'g4']
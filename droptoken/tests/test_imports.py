@@ -0,0 +1,18 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY = ('flask', 'flask_restful', 'werkzeug', 'mongoengine', 'pymongo', 'bson', 'numpy')
+
+def imported_packages(module):
+    code = f'import json, sys; import {module}; print(json.dumps(sorted({{ m.split(".")[0] for m in sys.modules }})))'
+    return set(json.loads(subprocess.check_output([sys.executable, '-c', code], text=True)))
+
+@pytest.mark.parametrize('module', ['droptoken.logic', 'droptoken.solver', 'droptoken.packing'])
+def test_game_logic_imports_without_web_or_db_packages(module):
+    assert imported_packages(module) & set(HEAVY) == set()
+
+def test_app_module_defers_flask_until_create_app():
+    assert 'flask' not in imported_packages('droptoken.app')
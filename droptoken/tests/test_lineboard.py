@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from droptoken.logic import GameBoard, LineBoard, new_board, win_lines
+
+def test_line_table_is_shared_by_boards_of_the_same_size():
+    assert LineBoard(7, 6).lines is LineBoard(7, 6).lines
+    assert LineBoard(7, 6).lines is not LineBoard(6, 7).lines
+    assert win_lines(7, 6) is LineBoard(7, 6).lines
+
+def test_line_table_counts_every_winning_line():
+    # classic 7x6 board: 24 horizontal, 21 vertical, 12 + 12 diagonal
+    assert len(win_lines(7, 6).lines) == 69
+    assert len(win_lines(3, 3).lines) == 0
+
+def test_winning_condition_detected_for_full_row():
+    game = LineBoard(4, 4)
+    for c in range(1, 5):
+        game.drop_token(c, 1)
+    assert all(game.check_win(c, 1) for c in range(1, 5))
+
+def test_empty_cell_is_not_a_winner():
+    game = LineBoard(4, 4)
+    assert not game.check_win(1, 1)
+
+def test_draw_is_detected_before_the_board_is_full():
+    # 4 columns, every row blocked: 1 1 2 2 / 2 2 1 1 / ...
+    game = LineBoard(4, 4)
+    rows = [[1, 1, 2, 2], [2, 2, 1, 1], [1, 1, 2, 2]]
+    for tokens in rows:
+        for c, t in enumerate(tokens, start=1):
+            game.drop_token(c, t)
+    assert not any(game.check_win(c, r) for c in range(1, 5) for r in range(1, 4))
+    # the top row can't complete a column or diagonal, and 1 1 2 2 blocks the row itself
+    assert game.win_possible()
+    game.drop_token(1, 2)
+    game.drop_token(2, 2)
+    game.drop_token(3, 1)
+    assert not game.win_possible()
+    assert game.can_drop(4)
+
+def test_full_board_is_not_winnable():
+    game = LineBoard(3, 2)
+    for c in range(1, 4):
+        game.drop_token(c, 1)
+        game.drop_token(c, 1)
+    assert not game.win_possible()
+
+def test_other_engines_only_call_a_draw_on_a_full_board():
+    for engine in ('list', 'bitboard'):
+        game = new_board(1, 2, engine)
+        game.drop_token(1, 1)
+        assert game.win_possible()
+        game.drop_token(1, 2)
+        assert not game.win_possible()
+
+@pytest.mark.parametrize('nc, nr', [(4, 4), (7, 6), (9, 5), (5, 12)])
+def test_agrees_with_game_board_on_random_games(nc, nr):
+    rng = random.Random(nc * 100 + nr)
+    for _ in range(50):
+        gb, lb = GameBoard(nc, nr), LineBoard(nc, nr)
+        token = 1
+        while True:
+            open_cols = [c for c in range(1, nc + 1) if gb.can_drop(c)]
+            assert open_cols == [c for c in range(1, nc + 1) if lb.can_drop(c)]
+            if not open_cols:
+                break
+            col = rng.choice(open_cols)
+            row = gb.drop_token(col, token)
+            assert lb.drop_token(col, token) == row
+            # every occupied cell, not just the new one (GameBoard doesn't answer for empty cells)
+            for c in range(1, nc + 1):
+                for r in range(1, gb.snapshot()[1][c - 1] + 1):
+                    assert lb.check_win(c, r) == gb.check_win(c, r)
+            if gb.check_win(col, row):
+                break
+            token = 3 - token
+        assert lb.board == gb.board
+
+def test_snapshot_round_trip_keeps_counters():
+    moves = [ {'token': 1, 'column': c} for c in (1, 2, 3) ]
+    game = LineBoard(5, 4)
+    game.apply_moves(moves)
+    restored = LineBoard.from_snapshot(5, 4, *game.snapshot())
+    assert restored.snapshot() == game.snapshot()
+    restored.drop_token(4, 1)
+    assert restored.check_win(4, 1)
+
+def test_copy_is_independent():
+    game = LineBoard(4, 4)
+    for c in (1, 2, 3):
+        game.drop_token(c, 1)
+    other = game.copy()
+    other.drop_token(4, 1)
+    assert other.check_win(4, 1)
+    assert game.can_drop(4) and not game.check_win(3, 1)
+    assert game.board[3] == [None] * 4
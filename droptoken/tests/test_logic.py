@@ -187,4 +187,25 @@ def test_apply_all_moves_should_fail():
         {'token': 1, 'column': 4},
         {'token': 2, 'column': 1},
     ]
-    assert not game.apply_moves(moves)  
\ No newline at end of file
+    assert not game.apply_moves(moves)  
+
+def test_snapshot_round_trip():
+    nc, nr = 4, 3
+    game = GameBoard(nc, nr)
+    game.apply_moves([
+        {'token': 1, 'column': 4},
+        {'token': 2, 'column': 1},
+        {'token': 1, 'column': 1},
+    ])
+    cells, heights = game.snapshot()
+    assert heights == [2, 0, 0, 1]
+    assert len(cells) == nc * nr
+    assert GameBoard.from_snapshot(nc, nr, cells, heights).board == game.board
+
+def test_copy_is_independent():
+    game = GameBoard(2, 2)
+    game.drop_token(1, 1)
+    other = game.copy()
+    other.drop_token(1, 2)
+    assert game.board == [[1, None], [None, None]]
+    assert other.board == [[1, 2], [None, None]]
@@ -0,0 +1,35 @@
+import pytest
+
+from droptoken.metrics import Histogram, Metrics, NULL_TIMER
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram(buckets=(0.1, 1.0))
+    for seconds in [0.05, 0.5, 0.5, 5.0]:
+        hist.observe(seconds)
+    cumulative, count, total = hist.snapshot()
+    assert cumulative == [1, 3]
+    assert count == 4
+    assert total == pytest.approx(6.05)
+
+def test_timer_records_stage_for_endpoint():
+    metrics = Metrics()
+    with metrics.timer('fetch', endpoint='moves'):
+        pass
+    assert metrics.histograms[('moves', 'fetch')].count == 1
+
+def test_disabled_metrics_hand_out_the_null_timer():
+    metrics = Metrics(enabled=False)
+    assert metrics.timer('fetch', endpoint='moves') is NULL_TIMER
+    with metrics.timer('fetch', endpoint='moves'):
+        pass
+    assert not metrics.histograms
+
+def test_render_prometheus_text():
+    metrics = Metrics(buckets=(0.1,))
+    metrics.observe('moves', 'save', 0.05)
+    text = metrics.render([('droptoken_board_cache_hits_total', 'Cache hits.', 3)])
+    assert 'droptoken_request_stage_seconds_bucket{endpoint="moves",stage="save",le="0.1"} 1' in text
+    assert 'droptoken_request_stage_seconds_bucket{endpoint="moves",stage="save",le="+Inf"} 1' in text
+    assert 'droptoken_request_stage_seconds_count{endpoint="moves",stage="save"} 1' in text
+    assert '# TYPE droptoken_board_cache_hits_total counter' in text
+    assert 'droptoken_board_cache_hits_total 3' in text
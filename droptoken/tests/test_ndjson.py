@@ -0,0 +1,95 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+from droptoken.archive import GameArchive
+from droptoken.ndjson import export_lines, game_from_record, import_lines
+from droptoken.storage.memory import MemoryStore
+from droptoken.storage.mongo import iter_stored_games
+from droptoken.validation import Invalid
+
+def record(**fields):
+    line = { 'players': ['p1', 'p2'], 'columns': 4, 'rows': 4 }
+    line.update(fields)
+    return line
+
+def moves(*columns):
+    return [ { 'type': 'MOVE', 'player': f'p{i % 2 + 1}', 'column': c } for i, c in enumerate(columns) ]
+
+def test_record_is_replayed():
+    g = game_from_record(record(moves=moves(1, 2, 1), ai_players=['p2']))
+    assert [m.column for m in g.moves] == [1, 2, 1]
+    assert g.current_token == 2
+    assert g.heights == [2, 1, 0, 0]
+    assert [p.is_ai for p in g.players] == [False, True]
+
+@pytest.mark.parametrize('line, error', [
+    (record(players=['p1', 'p1']), "Player names must be unique. Received ['p1', 'p1']"),
+    (record(columns=100), { 'columns': 'Number of columns on the game board must be >= 4. Error: 100 is not between 4 and 64' }),
+    (record(state='DONE', winner='p3'), "Winner p3 is not one of the players. Received ['p1', 'p2']"),
+    (record(winner='p1'), "Only a DONE game can have a winner. Received IN_PROGRESS"),
+    (record(moves=moves(1, 5)), "Move 2: illegal move. Unable to drop token in column 5"),
+    (record(moves=[{ 'type': 'QUIT', 'player': 'p1' }] + moves(1)), "Move 2 comes after a QUIT."),
+    (record(moves=[{ 'player': 'p3', 'column': 1 }]), "Move 1: player p3 is not one of the players. Received ['p1', 'p2']"),
+    (record(moves=moves(1, 2, 1, 2, 1, 2, 1)), "State and winner don't match the moves, expected DONE and p1. Received IN_PROGRESS and None"),
+    (record(state='DONE', winner='p2', moves=moves(1, 2, 1, 2, 1, 2, 1)),
+        "State and winner don't match the moves, expected DONE and p1. Received DONE and p2"),
+    (record(state='DONE', winner='p1', moves=moves(1, 2, 1, 2, 1, 2, 1, 2)), "Move 8 comes after the end of the game."),
+    (record(state='DONE', winner='p1', moves=moves(1, 2)), "State and winner don't match the moves, expected IN_PROGRESS and None. Received DONE and p1"),
+    (record(state='DONE', moves=[{ 'type': 'QUIT', 'player': 'p1' }]),
+        "State and winner don't match the moves, expected DONE and p2. Received DONE and None"),
+])
+def test_bad_records_are_rejected(line, error):
+    with pytest.raises(Invalid) as e:
+        game_from_record(line)
+    assert e.value.message == error
+
+def test_finished_records_are_replayed():
+    won = game_from_record(record(state='DONE', winner='p1', moves=moves(1, 2, 1, 2, 1, 2, 1)))
+    assert (won.state, won.winner) == ('DONE', 'p1')
+    # a draw on a full board
+    columns = [1, 2, 1, 2, 2, 1, 2, 1, 3, 4, 3, 4, 4, 3, 4, 3]
+    drawn = game_from_record(record(state='DONE', moves=moves(*columns)))
+    assert (drawn.state, drawn.winner, len(drawn.moves)) == ('DONE', None, 16)
+
+def test_export_import_round_trip():
+    source, target = MemoryStore(), MemoryStore()
+    source.create_games([
+        game_from_record(record(moves=moves(1, 2))),
+        game_from_record(record(state='DONE', winner='p2', moves=[{ 'type': 'QUIT', 'player': 'p1' }])),
+        game_from_record(record(players=['a', 'b'], engine='compact')),
+    ])
+    lines = list(export_lines(source.iter_games(batch_size=2)))
+    assert list(import_lines(lines, target, batch_size=2)) == [2, 1]
+
+    def without_ids(lines):
+        return [ { k: v for k, v in json.loads(line).items() if k != 'gameId' } for line in lines ]
+    assert without_ids(export_lines(target.iter_games())) == without_ids(lines)
+
+def test_import_stops_at_the_first_bad_line():
+    store = MemoryStore()
+    lines = [ json.dumps(record()), '', json.dumps(record()), '{"players": ' ]
+    imported = []
+    with pytest.raises(Invalid) as e:
+        for count in import_lines(lines, store, batch_size=1):
+            imported.append(count)
+    assert list(e.value.message) == ['4']
+    assert imported == [1, 1]
+
+def test_iter_stored_games_reads_the_archive_too():
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient().db
+    archive = GameArchive(games=db.game_model)
+    quits = [{ 'type': 'QUIT', 'player': 'p2' }]
+    games = [
+        game_from_record(record(state='DONE', winner='p1', moves=moves(i + 1) + quits) if i % 2 else record(moves=moves(i + 1)))
+        for i in range(4)
+    ]
+    db.game_model.insert_many([ g.to_mongo() for g in games ])
+    list(archive.archive_games(timedelta(0)))
+    assert db.game_model.count_documents({}) == 2
+
+    stored = list(iter_stored_games(db.game_model, archive, batch_size=1))
+    assert sorted(g.moves[0].column for g in stored) == [1, 2, 3, 4]
+    assert all(g.board_cells is None for g in stored)
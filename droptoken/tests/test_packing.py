@@ -0,0 +1,93 @@
+import pytest
+
+from droptoken.boards import replay_board
+from droptoken.models.game import GameModel, PlayerModel
+from droptoken.packing import MAX_COLUMN, can_pack, pack_move, pack_moves, packed_columns, unpack_move, unpack_moves
+
+def make_game(num_cols=4):
+    return GameModel(
+        players=[ PlayerModel(token=1, name='p1'), PlayerModel(token=2, name='p2') ],
+        num_cols=num_cols,
+        num_rows=4,
+    )
+
+def test_pack_move_round_trip():
+    for token in (1, 2):
+        for column in (1, 7, MAX_COLUMN, None):
+            assert unpack_move(pack_move(token, column)) == (token, column)
+
+def test_pack_move_layout():
+    assert pack_move(1, 3) == 0x03
+    assert pack_move(2, 3) == 0x83
+    assert pack_move(2, None) == 0x80
+
+def test_pack_move_rejects_what_does_not_fit():
+    with pytest.raises(ValueError):
+        pack_move(1, MAX_COLUMN + 1)
+    with pytest.raises(ValueError):
+        pack_move(1, 0)
+    with pytest.raises(ValueError):
+        pack_move(3, 1)
+
+def test_pack_moves_one_byte_each():
+    moves = [ (1, 1), (2, 4), (1, None) ]
+    assert len(pack_moves(moves)) == 3
+    assert unpack_moves(pack_moves(moves)) == moves
+
+def test_packed_columns_leave_out_the_quit():
+    assert packed_columns(pack_moves([ (1, 1), (2, 4), (1, MAX_COLUMN) ])) == bytes((1, 4, MAX_COLUMN))
+    assert packed_columns(pack_moves([ (1, 1), (2, 4), (1, None) ])) == bytes((1, 4))
+    assert packed_columns(b'') == b''
+
+def test_can_pack():
+    assert can_pack(2, MAX_COLUMN)
+    assert not can_pack(2, MAX_COLUMN + 1)
+    assert not can_pack(3, 4)
+
+def test_game_stores_packed_moves():
+    g = make_game()
+    g.moves.create(turn=1, move_type='MOVE', player_name='p1', column=2)
+    g.moves.create(turn=2, move_type='QUIT', player_name='p2')
+    son = g.to_mongo()
+    assert 'moves' not in son
+    assert bytes(son['packed_moves']) == b'\x02\x80'
+
+    moves = GameModel._from_son(son).moves
+    assert [ (m.turn, m.move_type, m.player_name, m.column) for m in moves ] == [
+        (1, 'MOVE', 'p1', 2),
+        (2, 'QUIT', 'p2', None),
+    ]
+
+def test_wide_game_keeps_move_documents():
+    g = make_game(num_cols=MAX_COLUMN + 1)
+    g.moves.create(turn=1, move_type='MOVE', player_name='p1', column=MAX_COLUMN + 1)
+    son = g.to_mongo()
+    assert son.get('packed_moves') is None
+    assert GameModel._from_son(son).moves[0].column == MAX_COLUMN + 1
+
+def test_legacy_document_reads_moves():
+    son = make_game().to_mongo()
+    del son['packed_moves']
+    son['moves'] = [ { 'turn': 1, 'move_type': 'MOVE', 'player_name': 'p2', 'column': 3 } ]
+    g = GameModel._from_son(son)
+    assert g.moves[0].player_name == 'p2'
+    # and it's packed from now on
+    assert bytes(g.to_mongo()['packed_moves']) == b'\x83'
+
+def pack_game(moves):
+    g = make_game()
+    g.moves = moves
+    return g.to_mongo()
+
+def test_replay_board_reads_packed_moves():
+    g = make_game()
+    for turn, (name, column) in enumerate([ ('p1', 1), ('p2', 2), ('p1', 1) ], start=1):
+        g.moves.create(turn=turn, move_type='MOVE', player_name=name, column=column)
+    g.moves.create(turn=4, move_type='QUIT', player_name='p2')
+    assert replay_board(GameModel._from_son(g.to_mongo())).board == replay_board(g).board == [
+        [1, 1, None, None], [2, None, None, None], [None] * 4, [None] * 4,
+    ]
+    # played since it was loaded: the packed moves are behind
+    loaded = GameModel._from_son(pack_game(g.moves[:3]))
+    loaded.moves.create(turn=4, move_type='MOVE', player_name='p2', column=2)
+    assert replay_board(loaded).board[1] == [2, 2, None, None]
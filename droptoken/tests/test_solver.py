@@ -0,0 +1,89 @@
+from time import perf_counter
+
+import pytest
+
+from droptoken.logic import GameBoard, new_board
+from droptoken.solver import WIN_BOUND, Solver, from_table, layout, to_table
+
+def board_with(nc, nr, moves, engine='list'):
+    game = new_board(nc, nr, engine)
+    game.apply_moves([ {'token': t, 'column': c} for t, c in moves ])
+    return game
+
+def test_takes_an_immediate_win():
+    game = board_with(7, 6, [(1, 1), (2, 1), (1, 2), (2, 2), (1, 3), (2, 3)])
+    result = Solver().solve(game, 1, time_limit=1)
+    assert result.column == 4
+    assert result.score > WIN_BOUND
+
+def test_blocks_the_opponents_win():
+    game = board_with(7, 6, [(1, 1), (2, 7), (1, 2), (2, 7), (1, 3)])
+    assert Solver().solve(game, 2, time_limit=1).column == 4
+
+def test_sees_a_forced_win_a_few_moves_ahead():
+    # token 1 on columns 3 and 4 of the bottom row: a third one next to them can't be stopped
+    game = board_with(7, 6, [(1, 3), (2, 3), (1, 4), (2, 4)])
+    result = Solver().solve(game, 1, time_limit=2)
+    assert result.column in (2, 5)
+    assert result.score > WIN_BOUND
+
+def test_sees_a_forced_loss():
+    # token 2 has three on the bottom row with both ends open
+    game = board_with(7, 6, [(2, 3), (1, 1), (2, 4), (1, 1), (2, 5)])
+    result = Solver().solve(game, 1, time_limit=2)
+    assert result.score < -WIN_BOUND
+
+def test_full_board_has_no_move():
+    game = GameBoard(1, 2)
+    game.drop_token(1, 1)
+    game.drop_token(1, 2)
+    assert Solver().solve(game, 1).column is None
+
+def test_respects_node_budget():
+    result = Solver().solve(GameBoard(7, 6), 1, time_limit=0, max_nodes=2000)
+    assert 1 <= result.column <= 7
+    assert result.nodes < 4000
+
+@pytest.mark.parametrize('size', [20, 64])
+def test_time_limit_holds_on_big_boards(size):
+    # a leaf scores every line of the board, thousands of them here
+    layout(size, size)
+    game = board_with(size, size, [(1, 1)])
+    start = perf_counter()
+    result = Solver().solve(game, 2, time_limit=0.05)
+    assert perf_counter() - start < 0.5
+    assert result.column is not None
+
+def test_respects_depth_limit():
+    result = Solver().solve(GameBoard(7, 6), 1, time_limit=0, max_depth=3)
+    assert result.depth == 3
+
+@pytest.mark.parametrize('engine', ['list', 'bitboard', 'lines', 'compact'])
+def test_same_answer_for_every_engine(engine):
+    moves = [(1, 4), (2, 4), (1, 3), (2, 5)]
+    results = Solver().solve(board_with(7, 6, moves, engine), 1, time_limit=0, max_depth=5)
+    assert results == Solver().solve(board_with(7, 6, moves), 1, time_limit=0, max_depth=5)
+
+def test_table_does_not_change_the_result():
+    moves = [(1, 4), (2, 4), (1, 3)]
+    solver = Solver()
+    first = solver.solve(board_with(7, 6, moves), 2, time_limit=0, max_depth=6)
+    second = solver.solve(board_with(7, 6, moves), 2, time_limit=0, max_depth=6)
+    assert (first.column, first.score) == (second.column, second.score)
+    assert second.nodes < first.nodes
+
+def test_tiny_table_still_works():
+    solver = Solver(table_size=1)
+    assert len(solver.table) == 1
+    game = board_with(7, 6, [(1, 1), (2, 1), (1, 2), (2, 2), (1, 3), (2, 3)])
+    assert solver.solve(game, 1, time_limit=0, max_depth=4).column == 4
+
+def test_layout_is_shared_per_size():
+    assert layout(7, 6) is layout(7, 6)
+    assert len(layout(7, 6).lines) == 69
+
+def test_win_scores_are_stored_relative_to_the_position():
+    score = 10**6 - 7
+    assert from_table(to_table(score, 3), 3) == score
+    assert from_table(to_table(-score, 3), 5) == -score + 2
+    assert to_table(12, 3) == 12
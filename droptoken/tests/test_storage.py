@@ -0,0 +1,340 @@
+import pytest
+from bson import ObjectId
+from mongoengine.errors import ValidationError
+
+from droptoken.boards import board_cache, store_board
+from droptoken.logic import new_board
+from droptoken.models.game import GameModel, PlayerModel
+from droptoken.storage import make_store
+from droptoken.storage.log import COMPACT_RATIO, LogStore
+from droptoken.storage.memory import MemoryStore
+from droptoken.storage.mongo import MongoStore
+from droptoken.storage.writebehind import WriteBehindStore
+
+def make_game():
+    g = GameModel(
+        players=[ PlayerModel(token=1, name='p1'), PlayerModel(token=2, name='p2') ],
+        num_cols=4,
+        num_rows=4,
+    )
+    store_board(g, new_board(4, 4))
+    return g
+
+def play(store, game_id, column):
+    g, gb = store.checkout_game(game_id)
+    token = g.current_token
+    gb.drop_token(column, token)
+    m = g.moves.create(turn=g.moves.count() + 1, move_type='MOVE', player_name=f'p{token}', column=column)
+    g.current_token = 2 if token == 1 else 1
+    return store.commit_moves(g, gb, [m], expected_version=g.version, expected_token=token)
+
+def test_memory_create_and_get():
+    store = MemoryStore()
+    g = make_game()
+    store.create_game(g)
+    game, board = store.get_live_game(str(g.id))
+    assert game.players[0].name == 'p1'
+    assert board.can_drop(1)
+
+def test_memory_missing_and_malformed_ids():
+    store = MemoryStore()
+    with pytest.raises(GameModel.DoesNotExist):
+        store.get_live_game('5f0000000000000000000000')
+    with pytest.raises(ValidationError):
+        store.get_live_game('not-an-id')
+    assert store.game_state('not-an-id') is None
+
+def test_memory_commit_bumps_version_and_keeps_readers_isolated():
+    store = MemoryStore()
+    g = make_game()
+    store.create_game(g)
+    before, _ = store.get_live_game(str(g.id))
+    assert play(store, str(g.id), 1)
+    after, board = store.get_live_game(str(g.id))
+    assert after.version == 1
+    assert before.moves.count() == 0
+    assert board.board[0][0] == 1
+    assert store.game_state(str(g.id)).turn == 1
+
+def test_memory_stale_commit_is_rejected():
+    store = MemoryStore()
+    g = make_game()
+    store.create_game(g)
+    g1, b1 = store.checkout_game(str(g.id))
+    assert play(store, str(g.id), 1)
+    m = g1.moves.create(turn=1, move_type='MOVE', player_name='p1', column=2)
+    assert not store.commit_moves(g1, b1, [m], expected_version=0, expected_token=1)
+    assert [m.column for m in store.get_moves(str(g.id), 0, 10)] == [1]
+
+@pytest.fixture
+def mongo_store():
+    mongomock = pytest.importorskip('mongomock')
+    from mongoengine import connect, disconnect
+    connect('droptokendb', mongo_client_class=mongomock.MongoClient)
+    yield MongoStore()
+    disconnect()
+
+def test_mongo_stale_commit_is_rejected(mongo_store):
+    g = make_game()
+    mongo_store.create_game(g)
+    g1, b1 = mongo_store.checkout_game(str(g.id))
+    assert play(mongo_store, str(g.id), 1)
+    assert play(mongo_store, str(g.id), 2)
+    # it's p1's turn again, only the version tells that g1 is stale
+    m = g1.moves.create(turn=1, move_type='MOVE', player_name='p1', column=3)
+    g1.current_token = 2
+    assert not mongo_store.commit_moves(g1, b1, [m], expected_version=0, expected_token=1)
+    game, board = mongo_store.get_live_game(str(g.id))
+    assert game.version == 2
+    assert [m.column for m in game.moves] == [1, 2]
+    assert board.board[2][0] is None
+
+def test_mongo_commit_checks_whose_turn_it_is(mongo_store):
+    g = make_game()
+    mongo_store.create_game(g)
+    g1, b1 = mongo_store.checkout_game(str(g.id))
+    m = g1.moves.create(turn=1, move_type='MOVE', player_name='p2', column=1)
+    assert not mongo_store.commit_moves(g1, b1, [m], expected_version=0, expected_token=2)
+    assert mongo_store.get_live_game(str(g.id))[0].moves.count() == 0
+
+def test_memory_list_pages_and_filters():
+    store = MemoryStore()
+    games = [ make_game() for _ in range(3) ]
+    for g in games:
+        store.create_game(g)
+    ids = store.list_game_ids(2)
+    assert ids == [ str(g.id) for g in games[:2] ]
+    assert store.list_game_ids(2, after=games[1].id) == [ str(games[2].id) ]
+    assert store.list_game_ids(10, player='nobody') == []
+    assert len(store.list_game_ids(10, state='IN_PROGRESS')) == 3
+
+def test_log_replays_games(tmp_path):
+    path = str(tmp_path / 'games.log')
+    store = LogStore(path)
+    g = make_game()
+    store.create_game(g)
+    play(store, str(g.id), 1)
+    play(store, str(g.id), 2)
+    store.close()
+    board_cache.clear()
+
+    reopened = LogStore(path)
+    game, board = reopened.get_live_game(str(g.id))
+    assert game.version == 2
+    assert game.current_token == 1
+    assert [m.column for m in game.moves] == [1, 2]
+    assert board.board[0][0] == 1 and board.board[1][0] == 2
+    # and it keeps appending after a replay
+    assert play(reopened, str(g.id), 3)
+    reopened.close()
+    assert LogStore(path).get_live_game(str(g.id))[0].version == 3
+
+def test_log_reads_games_from_the_file(tmp_path):
+    path = str(tmp_path / 'games.log')
+    store = LogStore(path)
+    games = [ make_game() for _ in range(2) ]
+    store.create_games(games)
+    play(store, str(games[0].id), 1)
+    play(store, str(games[0].id), 2)
+    # only the index is kept: where each game's records are
+    assert len(store._entries[games[0].id].offsets) == 3
+    assert store.game_state(str(games[0].id)).turn == 2
+
+    board_cache.clear()
+    game, board = store.get_live_game(str(games[0].id))
+    assert [m.column for m in game.moves] == [1, 2]
+    assert board.board[1][0] == 2
+    assert [ g.version for g in store.iter_games(batch_size=1) ] == [2, 0]
+    store.close()
+
+def test_log_is_compacted_on_open(tmp_path):
+    path = str(tmp_path / 'games.log')
+    store = LogStore(path)
+    g = make_game()
+    store.create_game(g)
+    for column in (1, 2, 1, 2, 3):
+        play(store, str(g.id), column)
+    store.close()
+    board_cache.clear()
+
+    reopened = LogStore(path)
+    assert reopened._records == 1
+    game, board = reopened.get_live_game(str(g.id))
+    assert game.version == 5
+    assert [m.column for m in game.moves] == [1, 2, 1, 2, 3]
+    assert board.board[0][:2] == [1, 1]
+    assert reopened.list_game_ids(10, state='IN_PROGRESS') == [str(g.id)]
+    # and it's appended to as before
+    assert play(reopened, str(g.id), 4)
+    assert reopened._records <= COMPACT_RATIO
+    reopened.close()
+
+def test_memory_create_games_validates_all_first():
+    store = MemoryStore()
+    games = [ make_game(), make_game() ]
+    games[1].num_cols = None
+    with pytest.raises(ValidationError):
+        store.create_games(games)
+    assert store.list_game_ids(10) == []
+
+    games[1].num_cols = 4
+    store.create_games(games)
+    assert store.list_game_ids(10) == [ str(g.id) for g in games ]
+
+def test_log_replays_bulk_created_games(tmp_path):
+    path = str(tmp_path / 'games.log')
+    store = LogStore(path)
+    games = [ make_game() for _ in range(3) ]
+    store.create_games(games)
+    store.close()
+    assert LogStore(path).list_game_ids(10) == [ str(g.id) for g in games ]
+
+def test_make_store_passes_fsync_on(tmp_path):
+    assert make_store('log', str(tmp_path / 'log'), fsync=True).fsync
+    assert not make_store('log', str(tmp_path / 'log2')).fsync
+    store = make_store('writebehind', str(tmp_path / 'journal'), flush_interval=3600, fsync=True)
+    assert store.fsync
+    store.close()
+
+def test_log_drops_torn_record(tmp_path):
+    path = str(tmp_path / 'games.log')
+    store = LogStore(path)
+    g = make_game()
+    store.create_game(g)
+    store.close()
+    with open(path, 'ab') as f:
+        f.write(b'\x40\x00\x00\x00garbage')
+
+    reopened = LogStore(path)
+    assert reopened.get_live_game(str(g.id))[0].moves.count() == 0
+    assert play(reopened, str(g.id), 1)
+    reopened.close()
+    assert LogStore(path).get_live_game(str(g.id))[0].moves.count() == 1
+
+def write_behind(path, collection, **kwargs):
+    # flushed by hand in these tests
+    return WriteBehindStore(path, flush_interval=3600, collection=collection, **kwargs)
+
+class CountingCollection(object):
+    def __init__(self, collection, fail=False):
+        self.collection = collection
+        self.fail = fail
+        self.bulk_writes = 0
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def bulk_write(self, requests, **kwargs):
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.bulk_writes += 1
+        # mongomock can't run newer pymongo's ReplaceOne in a bulk write, apply them one by one
+        for r in requests:
+            self.collection.replace_one(r._filter, r._doc, upsert=r._upsert)
+
+@pytest.fixture
+def collection():
+    mongomock = pytest.importorskip('mongomock')
+    return CountingCollection(mongomock.MongoClient().db.game_model)
+
+def test_write_behind_coalesces_moves_into_one_write(tmp_path, collection):
+    store = write_behind(str(tmp_path / 'journal'), collection)
+    g = make_game()
+    store.create_game(g)
+    for column in (1, 2, 1, 2):
+        assert play(store, str(g.id), column)
+    assert collection.find_one({ '_id': g.id }) is None
+
+    assert store.flush() == 1
+    assert collection.bulk_writes == 1
+    stored = GameModel._from_son(collection.find_one({ '_id': g.id }))
+    assert stored.version == 4
+    assert [m.column for m in stored.moves] == [1, 2, 1, 2]
+    assert store.flush() == 0
+    store.close()
+
+def test_write_behind_replays_unflushed_moves_after_a_crash(tmp_path, collection):
+    path = str(tmp_path / 'journal')
+    store = write_behind(path, collection)
+    g = make_game()
+    store.create_game(g)
+    play(store, str(g.id), 1)
+    store.flush()
+    play(store, str(g.id), 2)
+    # crash: no close(), the last move is only in the journal
+
+    reopened = write_behind(path, collection)
+    game, board = reopened.get_live_game(str(g.id))
+    assert game.version == 2
+    assert board.board[1][0] == 2
+    reopened.flush()
+    assert collection.find_one({ '_id': g.id })['version'] == 2
+    reopened.close()
+
+def test_write_behind_skips_journaled_moves_already_flushed(tmp_path, collection):
+    path = str(tmp_path / 'journal')
+    store = write_behind(path, collection)
+    g = make_game()
+    store.create_game(g)
+    play(store, str(g.id), 1)
+    play(store, str(g.id), 2)
+    with open(path, 'rb') as f:
+        journal = f.read()
+    store.flush()
+    play(store, str(g.id), 3)
+    # crash after the write to MongoDB, before the rotated journal was removed
+    with open(f'{path}.1', 'wb') as f:
+        f.write(journal)
+
+    reopened = write_behind(path, collection)
+    game, _ = reopened.get_live_game(str(g.id))
+    assert game.version == 3
+    assert [m.column for m in game.moves] == [1, 2, 3]
+    reopened.close()
+    assert not (tmp_path / 'journal.1').exists()
+
+def test_write_behind_keeps_games_pending_when_the_database_is_down(tmp_path, collection):
+    store = write_behind(str(tmp_path / 'journal'), collection)
+    g = make_game()
+    store.create_game(g)
+    collection.fail = True
+    with pytest.raises(ConnectionError):
+        store.flush()
+    assert play(store, str(g.id), 1)
+    collection.fail = False
+    assert store.flush() == 1
+    assert collection.find_one({ '_id': g.id })['version'] == 1
+    store.close()
+
+def test_write_behind_lists_pending_games_when_the_database_is_down(tmp_path, collection):
+    store = write_behind(str(tmp_path / 'journal'), collection)
+    flushed, new = make_game(), make_game()
+    store.create_game(flushed)
+    store.flush()
+    play(store, str(flushed.id), 1)
+    store.create_game(new)
+    collection.fail = True
+    # served from memory where MongoDB is behind, no flush needed
+    assert store.list_game_ids(10) == [ str(flushed.id), str(new.id) ]
+    assert store.list_game_ids(1, after=flushed.id) == [ str(new.id) ]
+    assert store.list_game_ids(10, player='nobody') == []
+    assert sorted((str(g.id), g.version) for g in store.iter_games()) == sorted([ (str(flushed.id), 1), (str(new.id), 0) ])
+    assert collection.bulk_writes == 1
+    collection.fail = False
+    store.close()
+
+def test_write_behind_loads_and_evicts_games(tmp_path, collection):
+    store = write_behind(str(tmp_path / 'journal'), collection, idle_timeout=0)
+    g = make_game()
+    store.create_game(g)
+    play(store, str(g.id), 1)
+    store.flush()
+    # idle, flushed games are dropped from memory and read back from MongoDB
+    assert store._games == {}
+    assert store.get_live_game(str(g.id))[0].version == 1
+    assert play(store, str(g.id), 2)
+    assert store.list_game_ids(10) == [str(g.id)]
+    assert store.list_game_ids(10, state='DONE') == []
+    with pytest.raises(GameModel.DoesNotExist):
+        store.get_live_game(str(ObjectId()))
+    store.close()
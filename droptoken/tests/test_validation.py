@@ -0,0 +1,106 @@
+import pytest
+from flask import Flask
+from flask_restful import reqparse
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+
+from droptoken.resources.game import post_schema, list_get_schema, MAX_BOARD_SIZE
+from droptoken.resources.hint import hint_get_schema
+from droptoken.resources.moves import move_list_get_schema, moves_post_schema
+from droptoken.validation import Field, Invalid, Schema
+
+app = Flask(__name__)
+
+
+def request_parser(schema):
+    # the reqparse parser the schema replaced
+    parser = reqparse.RequestParser()
+    for f in schema.fields:
+        parser.add_argument(
+            f.name, type=f.type, required=f.required, default=f.default, choices=f.choices,
+            action='append' if f.many else 'store', location=schema.location, help=f.help,
+        )
+    return parser
+
+
+def outcome(parse):
+    try:
+        return 200, parse()
+    except HTTPException as e:
+        # flask's own 400s (malformed JSON) have no data
+        return e.code, getattr(e, 'data', e.description)
+
+
+def assert_same_as_reqparse(schema, **request):
+    with app.test_request_context('/', **request):
+        expected = outcome(request_parser(schema).parse_args)
+        assert outcome(schema.parse_request) == expected
+
+@pytest.mark.parametrize('body', [
+    { 'players': ['a', 'b'], 'columns': 4, 'rows': 4 },
+    { 'players': ['a', 'b'], 'columns': '7', 'rows': 6.9, 'engine': 'lines', 'ai_players': 'b' },
+    { 'players': [1, 2], 'columns': 4, 'rows': 4, 'ai_players': None },
+    { 'players': 'a', 'columns': 4, 'rows': 4 },
+    { 'players': ['a', 'b'], 'columns': 'x', 'rows': 4 },
+    { 'players': ['a', 'b'], 'columns': [4], 'rows': 4 },
+    { 'players': ['a', 'b'], 'columns': 4, 'rows': 4, 'engine': 'nope' },
+    { 'players': ['a', 'b'], 'columns': 4, 'rows': 4, 'engine': None },
+    { 'players': [], 'columns': 4, 'rows': 4 },
+    { 'columns': 4, 'rows': 4 },
+    { 'players': ['a', 'b'], 'rows': 4 },
+    {},
+    [],
+])
+def test_post_schema_matches_reqparse(body):
+    assert_same_as_reqparse(post_schema, json=body)
+
+@pytest.mark.parametrize('data', ['', '{', '{"column": "2"}'])
+def test_raw_json_bodies_match_reqparse(data):
+    assert_same_as_reqparse(moves_post_schema, data=data, content_type='application/json')
+
+@pytest.mark.parametrize('schema,query', [
+    (list_get_schema, ''),
+    (list_get_schema, 'limit=5&after=abc&state=DONE&player=p'),
+    (list_get_schema, 'limit=x'),
+    (list_get_schema, 'limit=1&limit=2'),
+    (list_get_schema, 'state=bad'),
+    (move_list_get_schema, 'start=2&until=x'),
+    (hint_get_schema, 'time_limit=0.5&deep=true'),
+    (hint_get_schema, 'time_limit=x'),
+    (hint_get_schema, 'deep=maybe'),
+])
+def test_query_schemas_match_reqparse(schema, query):
+    assert_same_as_reqparse(schema, query_string=query)
+
+@pytest.mark.parametrize('name,value,error', [
+    ('columns', 3, '3 is not between 4 and 64'),
+    ('rows', MAX_BOARD_SIZE + 1, '65 is not between 4 and 64'),
+    ('columns', None, 'None is not between 4 and 64'),
+])
+def test_board_size_is_bounded(name, value, error):
+    body = { 'players': ['a', 'b'], 'columns': 4, 'rows': 4, name: value }
+    with pytest.raises(Invalid) as e:
+        post_schema.parse(body)
+    assert e.value.message == { name: f'Number of {name} on the game board must be >= 4. Error: {error}' }
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf'])
+def test_hint_time_limit_is_finite(value):
+    with pytest.raises(Invalid) as e:
+        hint_get_schema.parse(MultiDict([('time_limit', value)]))
+    error = f"{float(value)} is not a finite number"
+    assert e.value.message == { 'time_limit': f'How long to search for a move, in seconds (max 5). Error: {error}' }
+
+def test_player_names_are_bounded():
+    with pytest.raises(Invalid) as e:
+        post_schema.parse({ 'players': ['a', 'b' * 51], 'columns': 4, 'rows': 4 })
+    assert 'is not a string of at most 50 characters' in e.value.message['players']
+
+def test_query_string_takes_the_first_value():
+    schema = Schema('args', Field('limit', type=int, default=10))
+    assert schema.parse(MultiDict([('limit', '1'), ('limit', '2')])) == { 'limit': 1 }
+    assert schema.parse(MultiDict()) == { 'limit': 10 }
+
+def test_list_defaults_are_not_shared():
+    schema = Schema('json', Field('names', many=True, default=[]))
+    schema.parse({})['names'].append('a')
+    assert schema.parse({}) == { 'names': [] }
@@ -0,0 +1,145 @@
+# Request argument validation, in place of flask_restful's reqparse.
+# A RequestParser copies every Argument, builds a Namespace and looks its source up again for
+# each argument on every request. A Schema is built once, at import, and parse() is a single
+# loop over its fields.
+# Values are converted and rejected the way reqparse does it, with the same 400 messages:
+# a value is converted with type(value), null is accepted as None, a `many` field takes
+# a list (or a single value, as a list of one), and the error body is
+# { name: help.format(error_msg=...) }, for the first bad argument.
+import math
+from collections.abc import Mapping, MutableSequence
+
+from flask import request
+from flask_restful import abort
+
+# how "Missing required parameter in ..." names each location
+LOCATIONS = {
+    'json': 'the JSON body',
+    'args': 'the query string',
+}
+
+
+class Invalid(Exception):
+    """
+        A request argument was rejected. `message` is the body of the 400, { name: error }.
+    """
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def between(low, high):
+    """
+        Check for a Field: the value is a number from low to high (inclusive).
+    """
+    def check(value):
+        if value is None or not low <= value <= high:
+            raise ValueError(f"{value} is not between {low} and {high}")
+    return check
+
+
+def max_length(length):
+    """
+        Check for a Field: the value is a string of at most `length` characters.
+    """
+    def check(value):
+        if value is None or len(value) > length:
+            raise ValueError(f"{value} is not a string of at most {length} characters")
+    return check
+
+
+def finite(value):
+    """
+        Check for a Field: the value is a number, and not nan or infinity.
+    """
+    if value is None or not math.isfinite(value):
+        raise ValueError(f"{value} is not a finite number")
+
+
+class Field(object):
+    """
+        One argument of a Schema.
+        type: called on the value (on each element of a `many` field), anything it raises rejects it
+        choices: the converted value must be one of these
+        check: called on the converted value, raises ValueError to reject it
+        default: used when the argument isn't given (a list is copied for every request)
+    """
+    __slots__ = ('name', 'type', 'required', 'default', 'choices', 'many', 'help', 'check')
+
+    def __init__(self, name, type=str, required=False, default=None, choices=None, many=False, help=None, check=None):
+        self.name = name
+        self.type = type
+        self.required = required
+        self.default = default
+        self.choices = tuple(choices) if choices is not None else None
+        self.many = many
+        self.help = help
+        self.check = check
+
+    def error(self, error):
+        return Invalid({ self.name: self.help.format(error_msg=str(error)) if self.help else str(error) })
+
+    def convert(self, value):
+        # like reqparse, null is a value (None) and skips the type
+        if value is not None:
+            try:
+                value = self.type(value)
+            except Exception as e:
+                raise self.error(e)
+        if self.choices is not None and value not in self.choices:
+            raise self.error(f"{value} is not a valid choice")
+        if self.check is not None:
+            try:
+                self.check(value)
+            except ValueError as e:
+                raise self.error(e)
+        return value
+
+
+class Schema(object):
+    """
+        The arguments of one endpoint, read from `location`: 'json' (the request body)
+        or 'args' (the query string).
+    """
+
+    def __init__(self, location, *fields):
+        self.location = location
+        self.fields = fields
+        self.missing = f"Missing required parameter in {LOCATIONS[location]}"
+
+    def parse(self, source):
+        """
+            Input: a dict (JSON body) or multi-dict (query string, anything with getlist())
+            Return: dict of field name -> value
+            Raises Invalid for the first bad or missing argument.
+        """
+        if not isinstance(source, Mapping):
+            source = {}
+        getlist = getattr(source, 'getlist', None)
+        args = {}
+        for f in self.fields:
+            if f.name in source:
+                if getlist is not None:
+                    values = getlist(f.name)
+                else:
+                    values = source[f.name]
+                    if not (f.many and isinstance(values, MutableSequence)):
+                        values = [values]
+                values = [ f.convert(v) for v in values ]
+                if values:
+                    args[f.name] = values if f.many else values[0]
+                    continue
+            if f.required:
+                raise f.error(self.missing)
+            args[f.name] = list(f.default) if isinstance(f.default, list) else f.default
+        return args
+
+    def parse_request(self):
+        """
+            Parse the current Flask request. Aborts with a 400 if an argument is rejected.
+        """
+        try:
+            return self.parse(request.json if self.location == 'json' else request.args)
+        except Invalid as e:
+            abort(400, message=e.message)